@@ -0,0 +1,36 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_user_is_disabled_by_login_limit_and_more'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedUser',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.BigIntegerField(verbose_name='ID del Usuario')),
+                ('username', models.CharField(max_length=150, verbose_name='Usuario')),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Fecha de Eliminación')),
+            ],
+            options={
+                'verbose_name': 'Usuario Eliminado',
+                'verbose_name_plural': 'Usuarios Eliminados',
+                'ordering': ['-deleted_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['updated_at'], name='accounts_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['last_login'], name='accounts_user_last_login_idx'),
+        ),
+    ]
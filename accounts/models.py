@@ -40,6 +40,11 @@ class User(AbstractUser):
     class Meta:
         verbose_name = 'Usuario'
         verbose_name_plural = 'Usuarios'
+        indexes = [
+            # Cambios desde la última sincronización de la tabla de usuarios
+            models.Index(fields=['updated_at'], name='accounts_user_updated_idx'),
+            models.Index(fields=['last_login'], name='accounts_user_last_login_idx'),
+        ]
 
     def __str__(self):
         return f"{self.username} ({self.get_user_type_display()})"
@@ -145,3 +150,18 @@ class LoginReactivationRequest(models.Model):
         self.processed_by = admin_user
         self.processed_at = timezone.now()
         self.save()
+
+
+class DeletedUser(models.Model):
+    """Registro de un usuario borrado, para quitarlo de las tablas que se sincronizan por cambios"""
+    user_id = models.BigIntegerField(verbose_name='ID del Usuario')
+    username = models.CharField(max_length=150, verbose_name='Usuario')
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Fecha de Eliminación')
+
+    class Meta:
+        verbose_name = 'Usuario Eliminado'
+        verbose_name_plural = 'Usuarios Eliminados'
+        ordering = ['-deleted_at']
+
+    def __str__(self):
+        return f"{self.username} (eliminado)"
@@ -0,0 +1,23 @@
+from axes.models import AccessAttempt
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .sync import record_deleted_user
+
+User = get_user_model()
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    record_deleted_user(instance)
+
+
+@receiver(post_save, sender=AccessAttempt)
+@receiver(post_delete, sender=AccessAttempt)
+def access_attempt_changed(sender, instance, **kwargs):
+    # Un intento fallido, el desbloqueo o el vencimiento cambian el estado
+    # de Axes que muestra la tabla de usuarios
+    if instance.username:
+        User.objects.filter(username=instance.username).update(updated_at=timezone.now())
@@ -0,0 +1,66 @@
+"""
+Sincronización por cambios de la tabla de usuarios (``get_users_data``).
+
+La tabla se actualiza cada 30 segundos. Cada respuesta lleva un token (la
+hora del servidor en microsegundos) y el navegador lo envía en la siguiente
+consulta (``?since=``). El servidor busca los usuarios que cambiaron desde
+entonces:
+
+- ``updated_at`` (cualquier ``save``; los intentos fallidos de Axes y su
+  desbloqueo lo actualizan desde ``accounts.signals``),
+- ``last_login`` (inicio de sesión) y los que pasaron a desconectados porque
+  su último acceso salió de ``ONLINE_WINDOW``,
+- los borrados (``DeletedUser``).
+
+Si no hay ninguno responde 304 sin consultar la página; si los hay, solo
+envía esos usuarios y los ids de la página para que el navegador quite o
+reordene filas. Con un token inválido o anterior a
+``USER_SYNC_TOMBSTONE_DAYS`` se envía la página completa.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import DeletedUser
+
+# Margen para no perder cambios guardados en transacciones que terminaron
+# justo después de generar el token anterior
+SYNC_OVERLAP = timedelta(seconds=5)
+
+
+def make_token(moment):
+    return str(int(moment.timestamp() * 1000000))
+
+
+def parse_token(token, now):
+    """Fecha del token, o None si es inválido, futuro o más antiguo que los registros de borrados"""
+    try:
+        moment = datetime.fromtimestamp(int(token) / 1000000, tz=dt_timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+    if moment > now or moment < now - timedelta(days=settings.USER_SYNC_TOMBSTONE_DAYS):
+        return None
+    return moment
+
+
+def changes_since(since, now, online_window):
+    """Devuelve ``(ids_cambiados, ids_borrados)`` desde ``since``"""
+    start = since - SYNC_OVERLAP
+    changed = get_user_model().objects.filter(
+        Q(updated_at__gt=start)
+        | Q(last_login__gt=start)
+        | Q(last_login__gt=start - online_window, last_login__lte=now - online_window)
+    ).values_list('id', flat=True)
+    deleted = DeletedUser.objects.filter(deleted_at__gt=start).values_list('user_id', flat=True)
+    return set(changed), set(deleted)
+
+
+def record_deleted_user(user):
+    """Registra el borrado y descarta los registros que ningún token vigente necesita"""
+    DeletedUser.objects.create(user_id=user.pk, username=user.username)
+    DeletedUser.objects.filter(
+        deleted_at__lt=timezone.now() - timedelta(days=settings.USER_SYNC_TOMBSTONE_DAYS)
+    ).delete()
@@ -1,3 +1,211 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from axes.models import AccessAttempt
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import DeletedUser, User
+from .sync import SYNC_OVERLAP, changes_since, make_token, parse_token
+from .views import ONLINE_WINDOW, users_with_status
+
+TEST_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+def access_attempt(username, failures=1, ip_address='127.0.0.1', **kwargs):
+    return AccessAttempt.objects.create(
+        username=username, ip_address=ip_address, user_agent='tests', http_accept='*/*',
+        path_info='/accounts/login/', get_data='', post_data='', failures_since_start=failures, **kwargs
+    )
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class UserTestCase(TestCase):
+    """Un administrador y un estudiante"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='x', user_type='admin')
+        cls.student = User.objects.create_user(username='alumno', password='x', user_type='student')
+
+    def create_student(self, username, **kwargs):
+        return User.objects.create_user(username=username, password='x', user_type='student', **kwargs)
+
+
+class UserListTests(UserTestCase):
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def usernames(self, response):
+        return [user_item.username for user_item in response.context['users']]
+
+    def test_status_annotations(self):
+        now = timezone.now()
+        User.objects.filter(pk=self.student.pk).update(last_login=now - timedelta(minutes=5))
+        offline = self.create_student('desconectado', last_login=now - ONLINE_WINDOW - timedelta(minutes=1))
+        access_attempt(self.student.username, failures=2)
+        latest = access_attempt(self.student.username, failures=4, ip_address='10.0.0.1')
+        AccessAttempt.objects.filter(pk=latest.pk).update(attempt_time=now + timedelta(seconds=1))
+
+        users = {user_item.pk: user_item for user_item in users_with_status(now)}
+        student = users[self.student.pk]
+        self.assertEqual((student.is_online, student.has_axes_attempts, student.axes_failures), (True, True, 4))
+        self.assertEqual((users[offline.pk].is_online, users[offline.pk].has_axes_attempts), (False, False))
+        self.assertEqual(users[offline.pk].axes_failures, 0)
+
+    def test_query_count_does_not_grow_with_users(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(reverse('accounts:user_list'), secure=True).status_code, 200)
+            with CaptureQueriesContext(connection) as data_queries:
+                self.assertEqual(self.client.get(reverse('accounts:get_users_data'), secure=True).status_code, 200)
+            return len(queries), len(data_queries)
+
+        baseline = count_queries()
+        for i in range(20):
+            access_attempt(self.create_student(f'alumno{i}').username)
+        self.assertEqual(count_queries(), baseline)
+
+    def test_status_filters(self):
+        now = timezone.now()
+        User.objects.filter(pk=self.student.pk).update(last_login=now)
+        self.create_student('desconectado')
+        access_attempt(self.create_student('bloqueado').username, failures=5)
+        self.create_student('limite', is_disabled_by_login_limit=True, is_active=False)
+        url = reverse('accounts:user_list')
+
+        cases = {
+            'online': ['alumno', 'admin'],
+            'offline': ['limite', 'bloqueado', 'desconectado'],
+            'axes': ['bloqueado'],
+            'limit': ['limite'],
+            'inactive': ['limite'],
+        }
+        for status, usernames in cases.items():
+            with self.subTest(status=status):
+                response = self.client.get(url, {'status': status}, secure=True)
+                self.assertEqual(self.usernames(response), usernames)
+
+        response = self.client.get(url, {'status': 'otro', 'type': 'admin'}, secure=True)
+        self.assertEqual(self.usernames(response), ['admin'])
+        self.assertEqual(response.context['filters'], {'q': '', 'type': 'admin', 'status': ''})
+        response = self.client.get(url, {'q': 'LIMI'}, secure=True)
+        self.assertEqual(self.usernames(response), ['limite'])
+
+    def test_pagination(self):
+        for i in range(3):
+            self.create_student(f'nuevo{i}')
+        url = reverse('accounts:user_list')
+        with mock.patch('accounts.views.USERS_PER_PAGE', 2):
+            first = self.client.get(url, {'type': 'student'}, secure=True)
+            self.assertEqual(self.usernames(first), ['nuevo2', 'nuevo1'])
+            self.assertEqual(first.context['page_obj'].count, 4)
+            cursor = first.context['page_obj'].next_cursor()
+            second = self.client.get(url, {'type': 'student', 'cursor': cursor}, secure=True)
+            self.assertEqual(self.usernames(second), ['nuevo0', 'alumno'])
+            self.assertFalse(second.context['page_obj'].has_next())
+
+            data = self.client.get(reverse('accounts:get_users_data'), {'type': 'student', 'cursor': cursor},
+                                   secure=True).json()
+            self.assertEqual(data['ids'], [user_item.pk for user_item in second.context['users']])
+            self.assertEqual(data['count'], 4)
+
+    def test_requires_admin(self):
+        self.client.force_login(self.student)
+        self.assertRedirects(self.client.get(reverse('accounts:user_list'), secure=True),
+                             reverse('accounts:dashboard'), fetch_redirect_response=False)
+        self.assertEqual(self.client.get(reverse('accounts:get_users_data'), secure=True).status_code, 403)
+
+
+class UserSyncTests(UserTestCase):
+    def setUp(self):
+        self.client.force_login(self.admin)
+        # Nada cambió en la última hora
+        self.hour_ago = timezone.now() - timedelta(hours=1)
+        User.objects.update(updated_at=self.hour_ago, last_login=self.hour_ago)
+        self.url = reverse('accounts:get_users_data')
+
+    def poll(self, since, **params):
+        return self.client.get(self.url, dict(params, since=since), secure=True)
+
+    def test_token_round_trip(self):
+        now = timezone.now()
+        moment = (now - timedelta(minutes=1)).replace(microsecond=0)
+        self.assertEqual(parse_token(make_token(moment), now), moment)
+        for token in (None, '', 'abc', '1e9', '9' * 400, make_token(now + timedelta(seconds=1)),
+                      make_token(now - timedelta(days=8))):
+            with self.subTest(token=token):
+                self.assertIsNone(parse_token(token, now))
+        with override_settings(USER_SYNC_TOMBSTONE_DAYS=10):
+            self.assertIsNotNone(parse_token(make_token(now - timedelta(days=8)), now))
+
+    def test_unchanged_returns_304(self):
+        token = self.client.get(reverse('accounts:user_list'), secure=True).context['sync_token']
+        self.assertEqual(self.poll(token).status_code, 304)
+
+    def test_invalid_token_returns_full_page(self):
+        for token in ('', 'abc', make_token(timezone.now() - timedelta(days=30))):
+            with self.subTest(token=token):
+                data = self.poll(token).json()
+                self.assertTrue(data['full'])
+                self.assertEqual([row['username'] for row in data['users']], ['alumno', 'admin'])
+                self.assertNotIn('deleted', data)
+
+    def test_delta_contains_changed_and_deleted_users(self):
+        gone = self.create_student('borrado')
+        User.objects.filter(pk=gone.pk).update(updated_at=self.hour_ago)
+        token = make_token(timezone.now() - SYNC_OVERLAP)
+        self.assertEqual(self.poll(token).status_code, 304)
+
+        self.student.first_name = 'Ana'
+        self.student.save()
+        gone_id = gone.pk
+        gone.delete()
+        data = self.poll(token).json()
+        self.assertFalse(data['full'])
+        self.assertEqual(data['ids'], [self.student.pk, self.admin.pk])
+        self.assertEqual(data['count'], 2)
+        self.assertEqual([row['full_name'] for row in data['users']], ['Ana'])
+        self.assertEqual(data['deleted'], [gone_id])
+        self.assertIsNotNone(parse_token(data['token'], timezone.now()))
+
+    def test_delta_only_sends_changed_rows_of_the_page(self):
+        token = make_token(timezone.now() - SYNC_OVERLAP)
+        self.student.save()
+        data = self.poll(token, type='admin').json()
+        # El estudiante cambió pero no está en la página filtrada
+        self.assertEqual((data['ids'], data['users']), ([self.admin.pk], []))
+
+    def test_axes_attempts_touch_user(self):
+        token = make_token(timezone.now() - SYNC_OVERLAP)
+        attempt = access_attempt(self.student.username, failures=3)
+        data = self.poll(token).json()
+        self.assertEqual([(row['id'], row['axes_failures']) for row in data['users']], [(self.student.pk, 3)])
+
+        User.objects.update(updated_at=self.hour_ago)
+        self.assertEqual(self.poll(token).status_code, 304)
+        attempt.delete()
+        data = self.poll(token).json()
+        self.assertEqual([(row['id'], row['has_axes_attempts']) for row in data['users']], [(self.student.pk, False)])
+
+    def test_users_going_offline_are_changes(self):
+        now = timezone.now()
+        since = now - timedelta(seconds=30)
+        User.objects.filter(pk=self.student.pk).update(last_login=now - ONLINE_WINDOW - timedelta(seconds=10))
+        self.assertEqual(changes_since(since, now, ONLINE_WINDOW), ({self.student.pk}, set()))
+        # Ya estaba desconectado en la consulta anterior
+        User.objects.filter(pk=self.student.pk).update(last_login=now - ONLINE_WINDOW - timedelta(minutes=5))
+        self.assertEqual(changes_since(since, now, ONLINE_WINDOW), (set(), set()))
+
+    def test_deleted_user_tombstones(self):
+        old = DeletedUser.objects.create(user_id=999, username='antiguo')
+        DeletedUser.objects.filter(pk=old.pk).update(deleted_at=timezone.now() - timedelta(days=8))
+        student_id = self.student.pk
+        self.student.delete()
+        self.assertEqual(list(DeletedUser.objects.values_list('user_id', 'username')), [(student_id, 'alumno')])
@@ -6,10 +6,80 @@ from django.contrib.auth import get_user_model
 from django_ratelimit.decorators import ratelimit
 from .models import LoginReactivationRequest
 from django.utils import timezone
-from django.http import JsonResponse
+from django.http import HttpResponseNotModified, JsonResponse
+from django.db.models import BooleanField, Case, Exists, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils.http import urlencode
+from datetime import timedelta
+from exams.conditional import conditional_page, dashboard_etag, dashboard_last_modified
+from exams.pagination import KeysetPaginator
+from .sync import changes_since, make_token, parse_token
 
 User = get_user_model()
 
+# Un usuario está en línea si su último acceso fue hace menos de esto
+ONLINE_WINDOW = timedelta(minutes=15)
+USERS_PER_PAGE = 50
+USER_STATUS_FILTERS = {
+    'online': Q(is_online=True),
+    'offline': Q(is_online=False),
+    'axes': Q(has_axes_attempts=True),
+    'limit': Q(is_disabled_by_login_limit=True),
+    'inactive': Q(is_active=False),
+}
+
+
+def users_with_status(now=None):
+    """
+    Usuarios anotados en la misma consulta con su estado en línea
+    (``is_online``) y sus intentos fallidos en Axes (``has_axes_attempts`` y
+    ``axes_failures`` del intento más reciente), sin una consulta por usuario.
+    """
+    from axes.models import AccessAttempt
+
+    now = now or timezone.now()
+    attempts = AccessAttempt.objects.filter(username=OuterRef('username'))
+    return User.objects.annotate(
+        is_online=Case(
+            When(last_login__gte=now - ONLINE_WINDOW, then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        ),
+        has_axes_attempts=Exists(attempts),
+        axes_failures=Coalesce(
+            Subquery(attempts.order_by('-attempt_time').values('failures_since_start')[:1]), 0
+        ),
+    )
+
+
+def _user_list_page(request):
+    """Página de usuarios según los filtros de la URL (búsqueda, tipo y estado)"""
+    filters = {
+        'q': request.GET.get('q', '').strip()[:100],
+        'type': request.GET.get('type', ''),
+        'status': request.GET.get('status', ''),
+    }
+    users = users_with_status()
+    if filters['q']:
+        term = filters['q']
+        users = users.filter(
+            Q(username__icontains=term) | Q(first_name__icontains=term)
+            | Q(last_name__icontains=term) | Q(email__icontains=term)
+        )
+    if filters['type'] in dict(User.USER_TYPE_CHOICES):
+        users = users.filter(user_type=filters['type'])
+    else:
+        filters['type'] = ''
+    if filters['status'] in USER_STATUS_FILTERS:
+        users = users.filter(USER_STATUS_FILTERS[filters['status']])
+    else:
+        filters['status'] = ''
+
+    # Los usuarios más recientes primero (el id sigue el orden de registro)
+    paginator = KeysetPaginator(users, USERS_PER_PAGE, ordering=('-id',))
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    return page_obj, filters
+
 @ratelimit(key='ip', rate='10/m', method='POST', block=True)
 def login_view(request):
     if request.user.is_authenticated:
@@ -70,6 +140,7 @@ def logout_view(request):
 
 
 @login_required
+@conditional_page(dashboard_etag, dashboard_last_modified)
 def dashboard_view(request):
     user = request.user
     context = {
@@ -82,23 +153,19 @@ def dashboard_view(request):
         context['pending_reactivation_count'] = pending_reactivation_count
         return render(request, 'accounts/dashboard_admin.html', context)
     else:
+        from exams.media_urls import file_url
         from exams.models import CourseEnrollment
-        enrollments = CourseEnrollment.objects.filter(student=user).select_related('course')
+        enrollments = list(CourseEnrollment.objects.filter(
+            student=user, course__is_active=True, course__deleted_at__isnull=True
+        ).select_related('course'))
 
-        # Verificar si hay problemas con las imágenes de Cloudinary
-        safe_enrollments = []
+        # Si Cloudinary no da la URL de la imagen el curso se muestra sin ella
+        # (el error queda en la caché de URL y no se reintenta en cada visita)
         for enrollment in enrollments:
-            try:
-                # Intentar acceder a la URL de la imagen para detectar errores de Cloudinary
-                if enrollment.course.image and enrollment.course.image.name:
-                    _ = enrollment.course.image.url
-                safe_enrollments.append(enrollment)
-            except Exception:
-                # Si hay error con Cloudinary, agregar sin la imagen
+            if enrollment.course.image and file_url(enrollment.course.image) is None:
                 enrollment.course.image = None
-                safe_enrollments.append(enrollment)
 
-        context['enrollments'] = safe_enrollments
+        context['enrollments'] = enrollments
         return render(request, 'accounts/dashboard_student.html', context)
 
 
@@ -122,7 +189,7 @@ def student_assign_courses(request, student_id):
     from exams.models import Course, CourseEnrollment
 
     student = get_object_or_404(User, pk=student_id, user_type='student')
-    all_courses = Course.objects.filter(is_active=True)
+    all_courses = Course.objects.active()
     enrolled_courses = CourseEnrollment.objects.filter(student=student).values_list('course_id', flat=True)
 
     if request.method == 'POST':
@@ -153,38 +220,16 @@ def user_list(request):
         messages.error(request, 'No tienes permisos para acceder a esta página.')
         return redirect('accounts:dashboard')
 
-    from django.utils import timezone
-    from datetime import timedelta
-    from axes.models import AccessAttempt
-
-    users = User.objects.all().order_by('-date_joined')
-
-    # Calcular si cada usuario está en línea (último acceso hace menos de 15 minutos)
-    # y verificar si está bloqueado por Axes
-    now = timezone.now()
-    for user in users:
-        if user.last_login:
-            time_diff = now - user.last_login
-            user.is_online = time_diff < timedelta(minutes=15)
-        else:
-            user.is_online = False
-
-        # Verificar si el usuario tiene intentos fallidos en Axes
-        try:
-            attempts = AccessAttempt.objects.filter(username=user.username)
-            if attempts.exists():
-                # Si tiene intentos registrados, verificar si está bloqueado
-                latest_attempt = attempts.order_by('-attempt_time').first()
-                user.has_axes_attempts = True
-                user.axes_failures = latest_attempt.failures_since_start if latest_attempt else 0
-            else:
-                user.has_axes_attempts = False
-                user.axes_failures = 0
-        except:
-            user.has_axes_attempts = False
-            user.axes_failures = 0
-
-    context = {'users': users}
+    sync_token = make_token(timezone.now())
+    page_obj, filters = _user_list_page(request)
+    context = {
+        'users': page_obj,
+        'sync_token': sync_token,
+        'page_obj': page_obj,
+        'filters': filters,
+        'filter_query': urlencode({name: value for name, value in filters.items() if value}),
+        'user_type_choices': User.USER_TYPE_CHOICES,
+    }
     return render(request, 'accounts/user_list.html', context)
 
 
@@ -495,57 +540,57 @@ def reset_axes_for_user(request, user_id):
     return redirect('accounts:user_list')
 
 
+def _user_row(user_item, request):
+    return {
+        'id': user_item.id,
+        'username': user_item.username,
+        'full_name': user_item.get_full_name() or '-',
+        'email': user_item.email or '-',
+        'user_type': user_item.user_type,
+        'user_type_display': 'Administrador' if user_item.user_type == 'admin' else 'Estudiante',
+        'is_student': user_item.is_student(),
+        'login_count': user_item.login_count,
+        'max_logins_allowed': user_item.max_logins_allowed,
+        'is_disabled_by_login_limit': user_item.is_disabled_by_login_limit,
+        'date_joined': user_item.date_joined.strftime('%d/%m/%Y %H:%M'),
+        'last_login': user_item.last_login.strftime('%d/%m/%Y %H:%M') if user_item.last_login else None,
+        'is_online': user_item.is_online,
+        'is_active': user_item.is_active,
+        'has_axes_attempts': user_item.has_axes_attempts,
+        'axes_failures': user_item.axes_failures,
+        'is_current_user': user_item.id == request.user.id
+    }
+
+
 @login_required
 def get_users_data(request):
-    """API endpoint para obtener datos actualizados de usuarios en tiempo real"""
+    """
+    API endpoint para obtener datos actualizados de usuarios en tiempo real.
+    Con ``since`` (el token de la respuesta anterior) responde 304 si nada
+    cambió, o solo los usuarios cambiados de la página (ver accounts.sync).
+    """
     if not request.user.is_admin():
         return JsonResponse({'error': 'No autorizado'}, status=403)
 
-    from django.utils import timezone
-    from datetime import timedelta
-    from axes.models import AccessAttempt
-
-    users = User.objects.all().order_by('-date_joined')
     now = timezone.now()
-
-    users_data = []
-    for user_item in users:
-        # Calcular estado en línea
-        is_online = False
-        if user_item.last_login:
-            time_diff = now - user_item.last_login
-            is_online = time_diff < timedelta(minutes=15)
-
-        # Verificar intentos de Axes
-        has_axes_attempts = False
-        axes_failures = 0
-        try:
-            attempts = AccessAttempt.objects.filter(username=user_item.username)
-            if attempts.exists():
-                latest_attempt = attempts.order_by('-attempt_time').first()
-                has_axes_attempts = True
-                axes_failures = latest_attempt.failures_since_start if latest_attempt else 0
-        except:
-            pass
-
-        users_data.append({
-            'id': user_item.id,
-            'username': user_item.username,
-            'full_name': user_item.get_full_name() or '-',
-            'email': user_item.email or '-',
-            'user_type': user_item.user_type,
-            'user_type_display': 'Administrador' if user_item.user_type == 'admin' else 'Estudiante',
-            'is_student': user_item.is_student(),
-            'login_count': user_item.login_count,
-            'max_logins_allowed': user_item.max_logins_allowed,
-            'is_disabled_by_login_limit': user_item.is_disabled_by_login_limit,
-            'date_joined': user_item.date_joined.strftime('%d/%m/%Y %H:%M'),
-            'last_login': user_item.last_login.strftime('%d/%m/%Y %H:%M') if user_item.last_login else None,
-            'is_online': is_online,
-            'is_active': user_item.is_active,
-            'has_axes_attempts': has_axes_attempts,
-            'axes_failures': axes_failures,
-            'is_current_user': user_item.id == request.user.id
-        })
-
-    return JsonResponse({'users': users_data})
+    since = parse_token(request.GET.get('since'), now)
+    if since is not None:
+        changed, deleted = changes_since(since, now, ONLINE_WINDOW)
+        if not changed and not deleted:
+            return HttpResponseNotModified()
+
+    # Misma página y filtros que la tabla que se está viendo
+    page_obj, filters = _user_list_page(request)
+    rows = list(page_obj)
+    data = {
+        'full': since is None,
+        'token': make_token(now),
+        'ids': [user_item.id for user_item in rows],
+        'count': page_obj.count,
+    }
+    if since is None:
+        data['users'] = [_user_row(user_item, request) for user_item in rows]
+    else:
+        data['users'] = [_user_row(user_item, request) for user_item in rows if user_item.id in changed]
+        data['deleted'] = sorted(deleted)
+    return JsonResponse(data)
@@ -40,6 +40,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'cloudinary_storage',
     'cloudinary',
     'axes',
@@ -102,6 +103,59 @@ else:
     }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='exam-system'),
+    }
+}
+
+# Caché de fragmentos de las páginas de preguntas (alias de CACHES y duración en segundos)
+EXAM_FRAGMENT_CACHE = config('EXAM_FRAGMENT_CACHE', default='default')
+EXAM_FRAGMENT_CACHE_TIMEOUT = config('EXAM_FRAGMENT_CACHE_TIMEOUT', default=3600, cast=int)
+
+# Snapshot JSON de cada tema (URL versionada por revisión, cacheable como inmutable).
+# Solo debe ser público si el CDN no se comparte con usuarios sin acceso al curso.
+EXAM_SNAPSHOT_MAX_AGE = config('EXAM_SNAPSHOT_MAX_AGE', default=31536000, cast=int)
+EXAM_SNAPSHOT_PUBLIC = config('EXAM_SNAPSHOT_PUBLIC', default=False, cast=bool)
+
+# Caché por proceso de las URL de los archivos subidos (ver exams.media_urls):
+# número de entradas y duración en segundos de las URL y de los errores
+MEDIA_URL_CACHE_SIZE = config('MEDIA_URL_CACHE_SIZE', default=4096, cast=int)
+MEDIA_URL_CACHE_TIMEOUT = config('MEDIA_URL_CACHE_TIMEOUT', default=3600, cast=int)
+MEDIA_URL_NEGATIVE_TIMEOUT = config('MEDIA_URL_NEGATIVE_TIMEOUT', default=300, cast=int)
+
+# Caché privada (segundos) del PDF de cada tema; la URL cambia al subir otro PDF
+PDF_CACHE_MAX_AGE = config('PDF_CACHE_MAX_AGE', default=2592000, cast=int)
+
+# Subidas por partes (ver exams.uploads): tamaño de cada parte, máximos por
+# tipo y horas tras las que se descarta una subida sin terminar
+UPLOAD_CHUNK_SIZE = config('UPLOAD_CHUNK_SIZE', default=1048576, cast=int)
+UPLOAD_MAX_PDF_SIZE = config('UPLOAD_MAX_PDF_SIZE', default=104857600, cast=int)
+UPLOAD_MAX_IMAGE_SIZE = config('UPLOAD_MAX_IMAGE_SIZE', default=5242880, cast=int)
+UPLOAD_SESSION_TTL_HOURS = config('UPLOAD_SESSION_TTL_HOURS', default=24, cast=int)
+
+# Días que se guardan los usuarios borrados para la sincronización por cambios
+# de la tabla de usuarios (ver accounts.sync); un token más antiguo recibe la página completa
+USER_SYNC_TOMBSTONE_DAYS = config('USER_SYNC_TOMBSTONE_DAYS', default=7, cast=int)
+
+# Se incluye en los ETag de las páginas de estudiantes para invalidarlos en cada despliegue
+# (Render define RENDER_GIT_COMMIT con el commit desplegado)
+CONDITIONAL_GET_SALT = config('RENDER_GIT_COMMIT', default='')
+
+# Cola de tareas en segundo plano (tabla exams_job, ver `manage.py runworker`)
+JOB_WORKER_CONCURRENCY = config('JOB_WORKER_CONCURRENCY', default=2, cast=int)
+JOB_POLL_INTERVAL = config('JOB_POLL_INTERVAL', default=2.0, cast=float)
+# El worker renueva el latido de la tarea en ejecución cada JOB_HEARTBEAT_INTERVAL
+# segundos; sin latido durante JOB_STALE_AFTER la tarea se considera abandonada
+# (worker caído) y vuelve a la cola
+JOB_HEARTBEAT_INTERVAL = config('JOB_HEARTBEAT_INTERVAL', default=30, cast=int)
+JOB_STALE_AFTER = config('JOB_STALE_AFTER', default=300, cast=int)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -140,10 +194,28 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Almacenamiento de los archivos subidos: 'cloudinary' (producción) o 'local'
+# (MEDIA_ROOT direccionado por contenido, sin red; ver exams.storage)
+MEDIA_STORAGE = config('MEDIA_STORAGE', default='cloudinary')
+MEDIA_STORAGE_BACKENDS = {
+    'cloudinary': 'cloudinary_storage.storage.MediaCloudinaryStorage',
+    'local': 'exams.storage.ContentAddressedStorage',
+}
+# Archivos sin URL pública (PDF de los temas), entregados solo por sus vistas
+PRIVATE_STORAGE_BACKENDS = {
+    'cloudinary': 'cloudinary_storage.storage.MediaCloudinaryStorage',
+    'local': 'exams.storage.PrivateContentAddressedStorage',
+}
+PRIVATE_MEDIA_ROOT = config('PRIVATE_MEDIA_ROOT', default=str(BASE_DIR / 'private_media'))
+
 # WhiteNoise configuration
 STORAGES = {
     "default": {
-        "BACKEND": "cloudinary_storage.storage.MediaCloudinaryStorage",
+        "BACKEND": MEDIA_STORAGE_BACKENDS[MEDIA_STORAGE],
+    },
+    "private": {
+        "BACKEND": PRIVATE_STORAGE_BACKENDS[MEDIA_STORAGE],
+        "OPTIONS": {"location": PRIVATE_MEDIA_ROOT} if MEDIA_STORAGE == 'local' else {},
     },
     "staticfiles": {
         "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
@@ -157,9 +229,12 @@ CLOUDINARY_STORAGE = {
     'API_SECRET': config('CLOUDINARY_API_SECRET', default=''),
 }
 
-# Media files (uploaded files) - Cloudinary
+# Media files (uploaded files) - Cloudinary, o MEDIA_ROOT con MEDIA_STORAGE=local
 MEDIA_URL = '/media/'
-DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
+MEDIA_ROOT = config('MEDIA_ROOT', default=str(BASE_DIR / 'media'))
+# serve_media (exams.storage) entrega MEDIA_ROOT con MEDIA_STORAGE=local; en
+# producción los archivos deberían servirse desde un CDN o el servidor web
+SERVE_MEDIA = config('SERVE_MEDIA', default=DEBUG, cast=bool)
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -15,7 +15,7 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.views.generic import RedirectView
 from django.conf import settings
 from django.conf.urls.static import static
@@ -27,6 +27,14 @@ urlpatterns = [
     path('', RedirectView.as_view(url='/accounts/login/', permanent=False)),
 ]
 
+# Archivos subidos del almacenamiento local (MEDIA_STORAGE=local), solo con SERVE_MEDIA
+if settings.MEDIA_STORAGE == 'local' and settings.SERVE_MEDIA:
+    from exams.storage import serve_media
+
+    urlpatterns += [
+        re_path(r'^%s(?P<name>.+)$' % settings.MEDIA_URL.lstrip('/'), serve_media, name='media'),
+    ]
+
 # Servir archivos media en desarrollo
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
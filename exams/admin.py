@@ -1,11 +1,12 @@
 from django.contrib import admin
-from .models import Course, Exam, ExamResult, Question, Answer, StudentAnswer, CourseEnrollment
+from .jobs import enqueue, retry_jobs
+from .models import Course, Exam, ExamResult, Question, Answer, StudentAnswer, CourseEnrollment, Job, UploadSession
 
 
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
-    list_display = ('name', 'is_active', 'created_by', 'created_at')
-    list_filter = ('is_active', 'created_at')
+    list_display = ('name', 'is_active', 'deleted_at', 'created_by', 'created_at')
+    list_filter = ('is_active', 'deleted_at', 'created_at')
     search_fields = ('name', 'description')
     readonly_fields = ('created_at', 'updated_at')
 
@@ -13,10 +14,11 @@ class CourseAdmin(admin.ModelAdmin):
 @admin.register(Exam)
 class ExamAdmin(admin.ModelAdmin):
     list_display = ('title', 'subject', 'exam_date', 'total_marks', 'passing_marks', 'is_active', 'created_by')
-    list_filter = ('is_active', 'subject', 'exam_date', 'created_at')
+    list_filter = ('is_active', 'deleted_at', 'subject', 'exam_date', 'created_at')
     search_fields = ('title', 'subject', 'description')
     date_hierarchy = 'exam_date'
     readonly_fields = ('created_at', 'updated_at')
+    actions = ['grade_submissions', 'regrade_submissions']
 
     fieldsets = (
         ('Información del Examen', {
@@ -29,7 +31,7 @@ class ExamAdmin(admin.ModelAdmin):
             'fields': ('exam_date', 'duration_minutes')
         }),
         ('Estado', {
-            'fields': ('is_active', 'created_by')
+            'fields': ('is_active', 'deleted_at', 'shuffle_questions', 'created_by')
         }),
         ('Fechas de Registro', {
             'fields': ('created_at', 'updated_at'),
@@ -37,10 +39,26 @@ class ExamAdmin(admin.ModelAdmin):
         }),
     )
 
+    def _grade(self, request, queryset, regrade):
+        for exam in queryset:
+            enqueue(
+                'exams.grade_exam', key=f'grade_exam:{exam.pk}:{int(regrade)}', created_by=request.user,
+                exam_id=exam.pk, regrade=regrade, graded_by_id=request.user.pk,
+            )
+        self.message_user(request, f'Calificación de {len(queryset)} tema(s) encolada; se ejecutará en segundo plano.')
+
+    @admin.action(description='Calificar envíos pendientes')
+    def grade_submissions(self, request, queryset):
+        self._grade(request, queryset, regrade=False)
+
+    @admin.action(description='Recalificar todos los envíos')
+    def regrade_submissions(self, request, queryset):
+        self._grade(request, queryset, regrade=True)
+
 
 @admin.register(ExamResult)
 class ExamResultAdmin(admin.ModelAdmin):
-    list_display = ('student', 'exam', 'marks_obtained', 'status', 'submitted_at', 'graded_at')
+    list_display = ('student', 'exam', 'marks_obtained', 'percentage_display', 'passed_display', 'status', 'submitted_at', 'graded_at')
     list_filter = ('status', 'exam', 'graded_at', 'submitted_at')
     search_fields = ('student__username', 'student__email', 'exam__title')
     readonly_fields = ('created_at', 'updated_at')
@@ -61,6 +79,18 @@ class ExamResultAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        # El __str__ del tema usa el curso
+        return super().get_queryset(request).with_scores().select_related('exam__course')
+
+    @admin.display(description='Porcentaje', ordering='percentage')
+    def percentage_display(self, obj):
+        return f'{obj.percentage:.2f}%'
+
+    @admin.display(description='Aprobado', boolean=True, ordering='passed')
+    def passed_display(self, obj):
+        return obj.passed
+
 
 class AnswerInline(admin.TabularInline):
     model = Answer
@@ -71,6 +101,7 @@ class AnswerInline(admin.TabularInline):
 @admin.register(Question)
 class QuestionAdmin(admin.ModelAdmin):
     list_display = ('exam', 'question_text_short', 'question_type', 'marks', 'order')
+    list_select_related = ('exam__course',)
     list_filter = ('question_type', 'exam')
     search_fields = ('question_text', 'exam__title')
     inlines = [AnswerInline]
@@ -83,6 +114,7 @@ class QuestionAdmin(admin.ModelAdmin):
 @admin.register(Answer)
 class AnswerAdmin(admin.ModelAdmin):
     list_display = ('question', 'answer_text_short', 'is_correct', 'order')
+    list_select_related = ('question__exam',)
     list_filter = ('is_correct', 'question__exam')
     search_fields = ('answer_text', 'question__question_text')
 
@@ -95,12 +127,52 @@ class AnswerAdmin(admin.ModelAdmin):
 class StudentAnswerAdmin(admin.ModelAdmin):
     list_display = ('exam_result', 'question', 'is_correct', 'marks_obtained')
     list_filter = ('is_correct', 'exam_result__exam')
+    # __str__ de exam_result y question usan el estudiante y el tema
+    list_select_related = ('exam_result__student', 'exam_result__exam__course', 'question__exam')
     search_fields = ('exam_result__student__username', 'question__question_text')
 
 
 @admin.register(CourseEnrollment)
 class CourseEnrollmentAdmin(admin.ModelAdmin):
     list_display = ('student', 'course', 'enrolled_at')
+    list_select_related = ('student', 'course')
     list_filter = ('course', 'enrolled_at')
     search_fields = ('student__username', 'student__email', 'course__name')
     date_hierarchy = 'enrolled_at'
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'max_attempts', 'run_at', 'started_at', 'finished_at', 'worker', 'created_by')
+    list_select_related = ('created_by',)
+    list_filter = ('status', 'name', 'created_at')
+    search_fields = ('name', 'key', 'last_error')
+    date_hierarchy = 'created_at'
+    readonly_fields = (
+        'name', 'payload', 'key', 'status', 'attempts', 'max_attempts', 'started_at', 'finished_at',
+        'worker', 'result', 'last_error', 'created_by', 'created_at', 'updated_at',
+    )
+    actions = ['retry_failed']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description='Reintentar tareas fallidas')
+    def retry_failed(self, request, queryset):
+        retried = retry_jobs(queryset)
+        self.message_user(request, f'{retried} tarea(s) devuelta(s) a la cola.')
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ('filename', 'kind', 'size', 'status', 'target_model', 'target_id', 'created_by', 'created_at')
+    list_select_related = ('created_by',)
+    list_filter = ('status', 'kind', 'created_at')
+    search_fields = ('filename', 'stored_name')
+    readonly_fields = (
+        'kind', 'filename', 'size', 'chunk_size', 'content_type', 'status', 'target_model', 'target_id',
+        'target_field', 'stored_name', 'created_by', 'created_at', 'updated_at',
+    )
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,152 @@
+"""
+Análisis de ítems de un tema sobre los envíos calificados.
+
+Las respuestas de los estudiantes se cargan en una sola consulta y se
+convierten en una matriz estudiante × pregunta (1 = correcta, 0 = incorrecta
+u omitida) con NumPy. Sobre esa matriz se calculan:
+
+- ``p_value``: proporción de estudiantes que acertó (dificultad).
+- ``discrimination``: correlación punto-biserial entre el ítem y el puntaje
+  del resto de la prueba (sin el propio ítem).
+- ``kr20``: confiabilidad Kuder-Richardson 20 del tema.
+- Distractores: por opción, cuántos la eligieron y el puntaje promedio de
+  quienes la eligieron (un distractor elegido por los mejores puntajes
+  suele indicar una pregunta ambigua).
+
+Los resultados se guardan en ``ExamAnalysis`` y ``QuestionAnalysis``.
+"""
+import math
+from collections import defaultdict
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Answer, ExamAnalysis, QuestionAnalysis, StudentAnswer
+
+
+def _float(value, digits=4):
+    value = float(value)
+    return None if math.isnan(value) or math.isinf(value) else round(value, digits)
+
+
+def load_matrix(exam, question_ids):
+    """
+    Devuelve (matriz de aciertos, respuestas por pregunta, filas, opciones).
+
+    La matriz es ``uint8`` de estudiantes × preguntas en el orden de
+    ``question_ids``; los dos últimos arreglos tienen una posición por cada
+    respuesta con opción seleccionada (fila del estudiante y opción).
+    """
+    rows = list(
+        StudentAnswer.objects.filter(
+            exam_result__exam=exam, exam_result__status='graded', question__exam=exam
+        ).values_list('exam_result_id', 'question_id', 'is_correct', 'selected_answer_id')
+    )
+    if not rows:
+        empty = np.array([], dtype=np.int64)
+        return np.zeros((0, len(question_ids)), dtype=np.uint8), np.zeros(len(question_ids), dtype=np.int64), empty, empty
+
+    result_col, question_col, correct_col, selected_col = zip(*rows)
+    _, student_index = np.unique(np.array(result_col, dtype=np.int64), return_inverse=True)
+    column_of = {question_id: column for column, question_id in enumerate(question_ids)}
+    question_index = np.fromiter((column_of[pk] for pk in question_col), dtype=np.int64, count=len(rows))
+
+    matrix = np.zeros((student_index.max() + 1, len(question_ids)), dtype=np.uint8)
+    matrix[student_index, question_index] = np.array(correct_col, dtype=np.uint8)
+
+    selected = np.array([pk or 0 for pk in selected_col], dtype=np.int64)
+    has_selection = selected > 0
+    responses = np.bincount(question_index, minlength=len(question_ids))
+    return matrix, responses, student_index[has_selection], selected[has_selection]
+
+
+def item_statistics(matrix):
+    """Devuelve (p_values, discriminación, puntajes totales, kr20) de la matriz"""
+    students, items = matrix.shape
+    scored = matrix.astype(np.float64)
+    totals = scored.sum(axis=1)
+    if not students:
+        return np.full(items, np.nan), np.full(items, np.nan), totals, np.nan
+    p_values = scored.mean(axis=0)
+
+    # Correlación de cada ítem con el puntaje del resto (sin el ítem)
+    rest = totals[:, None] - scored
+    with np.errstate(invalid='ignore', divide='ignore'):
+        covariance = ((scored - p_values) * (rest - rest.mean(axis=0))).mean(axis=0)
+        discrimination = covariance / (scored.std(axis=0) * rest.std(axis=0))
+
+    kr20 = np.nan
+    variance = totals.var()
+    if items > 1 and variance > 0:
+        kr20 = items / (items - 1) * (1 - (p_values * (1 - p_values)).sum() / variance)
+    return p_values, discrimination, totals, kr20
+
+
+def distractor_statistics(answers, totals, student_index, selected):
+    """Devuelve {question_id: [estadísticas por opción]} para las opciones del tema"""
+    counts = {}
+    mean_scores = {}
+    if len(selected):
+        answer_ids, inverse = np.unique(selected, return_inverse=True)
+        chosen = np.bincount(inverse)
+        score_sums = np.bincount(inverse, weights=totals[student_index])
+        counts = dict(zip(answer_ids.tolist(), chosen.tolist()))
+        mean_scores = dict(zip(answer_ids.tolist(), (score_sums / chosen).tolist()))
+
+    students = len(totals)
+    stats = defaultdict(list)
+    for answer_id, question_id, is_correct in answers:
+        count = counts.get(answer_id, 0)
+        stats[question_id].append({
+            'answer': answer_id,
+            'is_correct': is_correct,
+            'count': count,
+            'proportion': _float(count / students) if students else None,
+            'mean_score': _float(mean_scores[answer_id], 2) if count else None,
+        })
+    return stats
+
+
+def analyze_exam(exam):
+    """Calcula y guarda el análisis de ítems del tema; devuelve el ExamAnalysis"""
+    now = timezone.now()
+    question_ids = list(exam.questions.order_by('order', 'id').values_list('id', flat=True))
+    answers = list(
+        Answer.objects.filter(question__exam=exam)
+        .order_by('question_id', 'order', 'id')
+        .values_list('id', 'question_id', 'is_correct')
+    )
+
+    matrix, responses, student_index, selected = load_matrix(exam, question_ids)
+    p_values, discrimination, totals, kr20 = item_statistics(matrix)
+    distractors = distractor_statistics(answers, totals, student_index, selected)
+    students = matrix.shape[0]
+
+    with transaction.atomic():
+        analysis, _ = ExamAnalysis.objects.update_or_create(exam=exam, defaults={
+            'students': students,
+            'questions': len(question_ids),
+            'mean_score': _float(totals.mean(), 2) if students else None,
+            'score_std': _float(totals.std(), 2) if students else None,
+            'kr20': _float(kr20),
+            'computed_at': now,
+        })
+        QuestionAnalysis.objects.bulk_create(
+            [
+                QuestionAnalysis(
+                    question_id=question_id,
+                    responses=int(responses[column]),
+                    p_value=_float(p_values[column]),
+                    discrimination=_float(discrimination[column]),
+                    distractors=distractors.get(question_id, []),
+                    computed_at=now,
+                )
+                for column, question_id in enumerate(question_ids)
+            ],
+            update_conflicts=True,
+            unique_fields=['question'],
+            update_fields=['responses', 'p_value', 'discrimination', 'distractors', 'computed_at'],
+            batch_size=500,
+        )
+    return analysis
@@ -0,0 +1,148 @@
+"""
+Intentos de examen: guardado automático de las respuestas del estudiante.
+
+El navegador agrupa los cambios (debounce) y envía un lote de deltas
+``{"question": id, "answer": id|null, "text": "..."}``. Cada delta lleva el
+valor completo actual de la pregunta, no un cambio relativo, así que repetir
+un lote después de un error de red deja el mismo estado (idempotente).
+
+El lote se valida con una sola consulta (preguntas y opciones del tema) y se
+escribe con un único ``INSERT ... ON CONFLICT (exam_result_id, question_id)
+DO UPDATE`` (``bulk_create(update_conflicts=True)``) sobre la restricción
+única de ``StudentAnswer``.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ExamResult, StudentAnswer
+
+MAX_DELTAS = 500
+MAX_TEXT_LENGTH = 5000
+# Margen para los guardados que salen justo antes de que termine el tiempo
+DEADLINE_GRACE = timedelta(seconds=30)
+
+
+class AttemptClosed(Exception):
+    """El intento ya fue enviado o se terminó el tiempo"""
+
+
+def attempt_deadline(exam_result):
+    """Devuelve la hora límite del intento o None si el tema no tiene duración"""
+    minutes = exam_result.exam.duration_minutes
+    if not minutes or minutes <= 0:
+        return None
+    return exam_result.created_at + timedelta(minutes=minutes)
+
+
+def remaining_seconds(exam_result, now=None):
+    deadline = attempt_deadline(exam_result)
+    if deadline is None:
+        return None
+    return max(0, int((deadline - (now or timezone.now())).total_seconds()))
+
+
+def clean_deltas(exam, items):
+    """
+    Valida los deltas y devuelve {question_id: (answer_id, texto)}.
+
+    Si una pregunta aparece varias veces gana el último delta. Lanza
+    ValueError si el lote no es válido.
+    """
+    if not isinstance(items, list) or not items:
+        raise ValueError('Debes enviar la lista "answers".')
+    if len(items) > MAX_DELTAS:
+        raise ValueError(f'No se pueden guardar más de {MAX_DELTAS} respuestas a la vez.')
+
+    deltas = {}
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError('Cada respuesta debe ser un objeto.')
+        try:
+            question_id = int(item['question'])
+            answer_id = item.get('answer')
+            answer_id = int(answer_id) if answer_id not in (None, '') else None
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('Cada respuesta debe indicar "question" y un "answer" válido.')
+        text = item.get('text') or ''
+        if not isinstance(text, str):
+            raise ValueError('El texto de la respuesta no es válido.')
+        deltas[question_id] = (answer_id, text.strip()[:MAX_TEXT_LENGTH] or None)
+
+    # Una sola consulta: las opciones de las preguntas del lote (con LEFT JOIN
+    # para incluir las preguntas sin opciones)
+    options = {}
+    for question_id, answer_id in exam.questions.filter(pk__in=deltas).values_list('id', 'answers__id'):
+        options.setdefault(question_id, set()).add(answer_id)
+    if len(options) != len(deltas):
+        raise ValueError('Algunas preguntas no pertenecen a este tema.')
+    for question_id, (answer_id, _) in deltas.items():
+        if answer_id is not None and answer_id not in options[question_id]:
+            raise ValueError('La respuesta seleccionada no pertenece a la pregunta.')
+    return deltas
+
+
+def save_answers(exam_result, deltas, now=None):
+    """
+    Guarda los deltas del intento con un solo upsert; devuelve cuántas
+    respuestas se escribieron. Lanza AttemptClosed si el intento ya no acepta
+    cambios.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        # Bloquea el intento para que un guardado no se cruce con el envío
+        status = (
+            ExamResult.objects.select_for_update()
+            .filter(pk=exam_result.pk).values_list('status', flat=True).first()
+        )
+        if status != 'pending':
+            raise AttemptClosed('El examen ya fue enviado.')
+        deadline = attempt_deadline(exam_result)
+        if deadline is not None and now > deadline + DEADLINE_GRACE:
+            raise AttemptClosed('El tiempo del examen terminó.')
+
+        StudentAnswer.objects.bulk_create(
+            [
+                StudentAnswer(
+                    exam_result=exam_result,
+                    question_id=question_id,
+                    selected_answer_id=answer_id,
+                    text_answer=text,
+                )
+                for question_id, (answer_id, text) in deltas.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['exam_result', 'question'],
+            update_fields=['selected_answer', 'text_answer', 'updated_at'],
+        )
+    return len(deltas)
+
+
+def submit_attempt(exam_result, deltas=None, now=None):
+    """Guarda las últimas respuestas y marca el intento como enviado"""
+    now = now or timezone.now()
+    with transaction.atomic():
+        if deltas:
+            try:
+                save_answers(exam_result, deltas, now=now)
+            except AttemptClosed:
+                # Fuera de tiempo se envía lo que ya estaba guardado
+                pass
+        updated = ExamResult.objects.filter(pk=exam_result.pk, status='pending').update(
+            status='completed', submitted_at=now, updated_at=now
+        )
+    if not updated:
+        raise AttemptClosed('El examen ya fue enviado.')
+    exam_result.status = 'completed'
+    exam_result.submitted_at = now
+
+
+def saved_answers(exam_result):
+    """Devuelve {question_id: (answer_id, texto)} con lo guardado del intento"""
+    return {
+        question_id: (answer_id, text)
+        for question_id, answer_id, text in exam_result.student_answers.values_list(
+            'question_id', 'selected_answer_id', 'text_answer'
+        )
+    }
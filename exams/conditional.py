@@ -0,0 +1,151 @@
+"""
+GET condicional (ETag y Last-Modified) para las páginas de estudiantes.
+
+El estado de cada página se obtiene con una sola consulta agregada (fechas de
+actualización del curso, del tema y de su contenido, e inscripciones del
+estudiante). Si el navegador ya tiene la versión actual se responde 304 sin
+ejecutar la vista ni renderizar la plantilla.
+
+Los validadores son ``None`` (la vista se ejecuta normalmente) para
+administradores, cuando hay mensajes pendientes de mostrar o cuando el
+estudiante no tiene acceso, para que la vista decida la respuesta.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.db.models import Count, Exists, Max, OuterRef
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+
+def _applies(request):
+    user = request.user
+    if not user.is_authenticated or not user.is_student():
+        return False
+    # Los mensajes se muestran una sola vez: si hay pendientes hay que renderizar
+    return not len(get_messages(request))
+
+
+def _memoize(request, key, compute):
+    """Calcula el estado una sola vez por petición (lo usan el ETag y el Last-Modified)"""
+    state = request.__dict__.setdefault('_conditional_state', {})
+    if key not in state:
+        state[key] = compute() if _applies(request) else None
+    return state[key]
+
+
+def _make_etag(request, *parts):
+    user = request.user
+    values = (settings.CONDITIONAL_GET_SALT, user.pk, user.updated_at.isoformat(),
+              request.META.get('QUERY_STRING', '')) + parts
+    return hashlib.md5(':'.join(str(value) for value in values).encode()).hexdigest()
+
+
+def _latest(request, *dates):
+    return max([date for date in dates if date is not None] + [request.user.updated_at])
+
+
+# Dashboard del estudiante: cursos inscritos
+
+def _dashboard_state(request):
+    from .models import CourseEnrollment
+
+    return _memoize(request, 'dashboard', lambda: CourseEnrollment.objects.filter(
+        student=request.user, course__is_active=True, course__deleted_at__isnull=True
+    ).aggregate(
+        courses=Count('id'),
+        enrolled=Max('enrolled_at'),
+        updated=Max('course__updated_at'),
+    ))
+
+
+def dashboard_etag(request):
+    state = _dashboard_state(request)
+    if state is None:
+        return None
+    return _make_etag(request, 'dashboard', state['courses'], state['enrolled'], state['updated'])
+
+
+def dashboard_last_modified(request):
+    state = _dashboard_state(request)
+    if state is None:
+        return None
+    return _latest(request, state['enrolled'], state['updated'])
+
+
+# Temas de un curso
+
+def _course_exams_state(request, course_id):
+    from .models import Course, CourseEnrollment
+
+    def compute():
+        enrolled = CourseEnrollment.objects.filter(course=OuterRef('pk'), student=request.user)
+        state = Course.objects.active().filter(pk=course_id).annotate(
+            enrolled=Exists(enrolled),
+            exams_count=Count('exams'),
+            exams_updated=Max('exams__updated_at'),
+        ).values('updated_at', 'enrolled', 'exams_count', 'exams_updated').first()
+        if state is None or not state['enrolled']:
+            return None
+        return state
+
+    return _memoize(request, ('course_exams', course_id), compute)
+
+
+def course_exams_etag(request, course_id):
+    state = _course_exams_state(request, course_id)
+    if state is None:
+        return None
+    return _make_etag(request, 'course', course_id, state['updated_at'],
+                      state['exams_count'], state['exams_updated'])
+
+
+def course_exams_last_modified(request, course_id):
+    state = _course_exams_state(request, course_id)
+    if state is None:
+        return None
+    return _latest(request, state['updated_at'], state['exams_updated'])
+
+
+# Preguntas de un tema
+
+def _take_exam_state(request, exam_id):
+    from .models import CourseEnrollment, Exam
+
+    def compute():
+        enrolled = CourseEnrollment.objects.filter(course=OuterRef('course'), student=request.user)
+        state = Exam.objects.active().filter(pk=exam_id).annotate(
+            enrolled=Exists(enrolled),
+        ).values('content_revision', 'content_updated_at', 'course__updated_at', 'enrolled').first()
+        if state is None or not state['enrolled']:
+            return None
+        return state
+
+    return _memoize(request, ('take_exam', exam_id), compute)
+
+
+def take_exam_etag(request, exam_id):
+    state = _take_exam_state(request, exam_id)
+    if state is None:
+        return None
+    return _make_etag(request, 'exam', exam_id, state['content_revision'],
+                      state['content_updated_at'], state['course__updated_at'])
+
+
+def take_exam_last_modified(request, exam_id):
+    state = _take_exam_state(request, exam_id)
+    if state is None:
+        return None
+    return _latest(request, state['content_updated_at'], state['course__updated_at'])
+
+
+def conditional_page(etag_func, last_modified_func):
+    """
+    Aplica los validadores a una vista y obliga al navegador a revalidar
+    (``no-cache``) para que un cambio se vea en la siguiente visita.
+    """
+    def decorator(view_func):
+        view_func = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view_func)
+        return cache_control(private=True, no_cache=True)(view_func)
+    return decorator
@@ -0,0 +1,172 @@
+"""
+Entrega de archivos subidos (el PDF de cada tema) a través de la aplicación.
+
+En lugar de enlazar la URL del almacenamiento, la vista entrega los bytes
+después de comprobar el acceso, con:
+
+- peticiones de rango (``Range: bytes=a-b``, respuesta 206): el visor de PDF
+  del navegador pide primero el inicio y el índice del archivo y luego solo
+  las páginas que muestra, así que un PDF linealizado se ve sin descargarlo
+  completo,
+- ETag a partir del nombre del archivo (cada subida tiene un nombre distinto)
+  y caché privada larga; la URL lleva la versión (``?v=``) para que un PDF
+  nuevo no quede tapado por el anterior,
+- lectura por bloques de ``CHUNK_SIZE``: del disco con ``seek`` o, si el
+  almacenamiento es remoto (Cloudinary), pidiendo el mismo rango por HTTP, sin
+  cargar el archivo en memoria.
+
+Solo se atiende un rango por petición; con varios se entrega el archivo
+completo (permitido por RFC 9110).
+"""
+import hashlib
+import re
+
+import requests
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import parse_etags
+
+CHUNK_SIZE = 256 * 1024
+REMOTE_TIMEOUT = 30
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def file_version(file):
+    """Versión corta del archivo para la URL (cambia con cada subida)"""
+    return hashlib.md5(file.name.encode()).hexdigest()[:12]
+
+
+def file_etag(file):
+    return f'"{hashlib.md5(file.name.encode()).hexdigest()}"'
+
+
+def file_size(file):
+    """Tamaño del archivo; se cachea porque en Cloudinary cuesta una petición HEAD"""
+    cache = caches[settings.EXAM_FRAGMENT_CACHE]
+    key = f'file_size:{hashlib.md5(file.name.encode()).hexdigest()}'
+    size = cache.get(key)
+    if size is None:
+        size = file.storage.size(file.name)
+        cache.set(key, size, None)
+    return size
+
+
+def parse_range(header, size):
+    """
+    Devuelve ``(inicio, fin)`` (inclusivos) del encabezado Range, o None si
+    hay que entregar el archivo completo. Lanza RangeNotSatisfiable si el
+    rango queda fuera del archivo.
+    """
+    match = _RANGE_RE.match(header.replace(' ', '')) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if size == 0:
+        # Un archivo vacío no tiene ningún byte que entregar por rango
+        raise RangeNotSatisfiable(header)
+    if not first:
+        # Sufijo: los últimos N bytes
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        raise RangeNotSatisfiable(header)
+    return start, end
+
+
+def _remote_url(file):
+    """URL absoluta del archivo si el almacenamiento no es local (Cloudinary)"""
+    try:
+        file.storage.path(file.name)
+        return None
+    except NotImplementedError:
+        url = file.storage.url(file.name)
+        return url if url.startswith(('http://', 'https://')) else None
+
+
+def iter_file_range(file, start, end, chunk_size=CHUNK_SIZE):
+    """Genera los bytes ``start..end`` (inclusivos) del archivo por bloques"""
+    remaining = end - start + 1
+    url = _remote_url(file)
+    if url:
+        response = requests.get(
+            url, headers={'Range': f'bytes={start}-{end}'}, stream=True, timeout=REMOTE_TIMEOUT
+        )
+        try:
+            response.raise_for_status()
+            # Si el servidor ignora el rango (200) se descartan los bytes anteriores
+            skip = start if response.status_code == 200 else 0
+            for chunk in response.iter_content(chunk_size):
+                if skip:
+                    dropped = min(skip, len(chunk))
+                    chunk, skip = chunk[dropped:], skip - dropped
+                chunk = chunk[:remaining]
+                if chunk:
+                    remaining -= len(chunk)
+                    yield chunk
+                if remaining <= 0:
+                    return
+        finally:
+            response.close()
+        return
+
+    handle = file.storage.open(file.name, 'rb')
+    try:
+        handle.seek(start)
+        while remaining > 0:
+            chunk = handle.read(min(chunk_size, remaining))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        handle.close()
+
+
+def ranged_file_response(request, file, content_type, max_age):
+    """Respuesta con el archivo completo (200), un rango (206), 304 o 416"""
+    etag = file_etag(file)
+    cache_control = f'private, max-age={max_age}'
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        response['Cache-Control'] = cache_control
+        return response
+
+    size = file_size(file)
+    header = request.headers.get('Range', '')
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != etag:
+        # El navegador tiene otra versión: se entrega el archivo completo
+        header = ''
+    try:
+        requested = parse_range(header, size)
+    except RangeNotSatisfiable:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    start, end = requested or (0, size - 1)
+    if request.method == 'HEAD' or size == 0:
+        response = HttpResponse(content_type=content_type)
+    else:
+        response = StreamingHttpResponse(iter_file_range(file, start, end), content_type=content_type)
+    if requested:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = str(end - start + 1 if size else 0)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    response['Content-Disposition'] = 'inline'
+    return response
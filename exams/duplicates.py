@@ -0,0 +1,306 @@
+"""
+Detección de preguntas casi duplicadas con MinHash y LSH.
+
+El texto de cada pregunta se normaliza (minúsculas, sin acentos ni
+puntuación) y se divide en shingles de ``SHINGLE_SIZE`` caracteres. La firma
+MinHash (``NUM_PERM`` mínimos de funciones hash ``(a·x + b) mod p``) estima la
+similitud de Jaccard entre dos textos como la fracción de posiciones iguales.
+
+La firma se divide en ``BANDS`` bandas de ``ROWS`` valores; cada banda se
+guarda como una cubeta (``QuestionBucket``). Dos preguntas con similitud
+``s`` comparten al menos una cubeta con probabilidad ``1 - (1 - s^ROWS)^BANDS``
+(≈ 0.99 para s = 0.8), así que los candidatos salen de un índice por cubeta en
+lugar de comparar todos los pares. Los candidatos se confirman con la
+similitud estimada de la firma completa.
+
+El índice se actualiza al guardar cada pregunta (señal ``post_save``) y al
+importar; ``index_queryset`` completa las preguntas anteriores desde el
+comando ``index_duplicates`` o la tarea ``exams.index_duplicates``, que el
+reporte encola si encuentra preguntas sin firma. El reporte solo usa las
+firmas ya guardadas.
+"""
+import hashlib
+import re
+import zlib
+from collections import defaultdict
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Question, QuestionBucket, QuestionSignature
+from .text import normalize_text
+
+SHINGLE_SIZE = 4
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+# Similitud estimada mínima para considerar dos preguntas duplicadas
+THRESHOLD = 0.8
+# Una cubeta con más preguntas suele ser un texto genérico ("Defina...");
+# se ignora para no volver cuadrático el reporte
+MAX_BUCKET_SIZE = 200
+MAX_CANDIDATES = 500
+MAX_GROUP_QUESTIONS = 20
+INDEX_BATCH_SIZE = 1000
+_SCORE_CHUNK = 100000
+_PAIR_SHIFT = 1 << 32
+
+# Primo menor que 2^32: (a·x + b) con a, b < p y x < 2^32 cabe en uint64
+PRIME = 4294967291
+# Semilla fija: las firmas guardadas deben coincidir entre procesos y despliegues
+_rng = np.random.default_rng(20240611)
+_A = _rng.integers(1, PRIME, NUM_PERM, dtype=np.uint64)[:, None]
+_B = _rng.integers(0, PRIME, NUM_PERM, dtype=np.uint64)[:, None]
+
+
+def shingles(text):
+    """Devuelve el conjunto de shingles de caracteres del texto normalizado"""
+    text = re.sub(r'\W+', ' ', normalize_text(text)).strip()
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[index:index + SHINGLE_SIZE] for index in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def signature(text):
+    """Firma MinHash (uint32[NUM_PERM]) del texto, o None si no tiene contenido"""
+    values = shingles(text)
+    if not values:
+        return None
+    hashes = np.fromiter((zlib.crc32(value.encode()) for value in values), dtype=np.uint64, count=len(values))
+    return ((_A * hashes + _B) % PRIME).min(axis=1).astype(np.uint32)
+
+
+def buckets(sig):
+    """Devuelve las BANDS cubetas (enteros de 64 bits con signo) de la firma"""
+    return [
+        int.from_bytes(
+            hashlib.blake2b(bytes([band]) + sig[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size=8).digest(),
+            'big', signed=True,
+        )
+        for band in range(BANDS)
+    ]
+
+
+def similarity(sig_a, sig_b):
+    """Similitud de Jaccard estimada entre dos firmas"""
+    return float(np.count_nonzero(sig_a == sig_b)) / NUM_PERM
+
+
+def _load(data):
+    return np.frombuffer(bytes(data), dtype=np.uint32)
+
+
+def index_questions(questions):
+    """
+    Actualiza la firma y las cubetas de las preguntas (lista de
+    ``(id, texto)``); solo escribe las que cambiaron.
+    """
+    questions = dict(questions)
+    if not questions:
+        return 0
+    stored = dict(QuestionSignature.objects.filter(question_id__in=questions).values_list('question_id', 'signature'))
+
+    changed = {}
+    removed = []
+    for question_id, text in questions.items():
+        sig = signature(text)
+        if sig is None:
+            if question_id in stored:
+                removed.append(question_id)
+        elif question_id not in stored or bytes(stored[question_id]) != sig.tobytes():
+            changed[question_id] = sig
+    if not changed and not removed:
+        return 0
+
+    with transaction.atomic():
+        QuestionBucket.objects.filter(question_id__in=list(changed) + removed).delete()
+        QuestionSignature.objects.filter(question_id__in=removed).delete()
+        QuestionSignature.objects.bulk_create(
+            [QuestionSignature(question_id=pk, signature=sig.tobytes()) for pk, sig in changed.items()],
+            update_conflicts=True,
+            unique_fields=['question'],
+            update_fields=['signature', 'updated_at'],
+            batch_size=INDEX_BATCH_SIZE,
+        )
+        QuestionBucket.objects.bulk_create(
+            [
+                QuestionBucket(question_id=pk, bucket=bucket)
+                for pk, sig in changed.items()
+                for bucket in buckets(sig)
+            ],
+            batch_size=INDEX_BATCH_SIZE,
+        )
+    return len(changed) + len(removed)
+
+
+def index_queryset(questions, missing_only=True):
+    """Indexa las preguntas del queryset (por defecto solo las que no tienen firma)"""
+    if missing_only:
+        questions = questions.filter(signature__isnull=True)
+    indexed = 0
+    batch = []
+    for row in questions.order_by().values_list('id', 'question_text').iterator(chunk_size=INDEX_BATCH_SIZE):
+        batch.append(row)
+        if len(batch) == INDEX_BATCH_SIZE:
+            indexed += index_questions(batch)
+            batch = []
+    return indexed + index_questions(batch)
+
+
+def find_similar(question, limit=5):
+    """
+    Devuelve ``[(pregunta, similitud)]`` con las preguntas del mismo curso
+    parecidas a ``question``, de la más a la menos parecida.
+    """
+    return find_similar_many([question], limit).get(question.pk, [])
+
+
+def find_similar_many(questions, limit=5):
+    """
+    Como ``find_similar`` para varias preguntas a la vez: devuelve
+    ``{question.pk: [(pregunta, similitud)]}`` solo con las que tienen
+    parecidas. Las cubetas de todas las preguntas se buscan en una consulta,
+    las firmas de los candidatos en otra y las preguntas encontradas en una
+    tercera, sin importar cuántas preguntas se revisen.
+    """
+    pending = []
+    for question in questions:
+        sig = signature(question.question_text)
+        if sig is not None:
+            pending.append((question, sig, buckets(sig)))
+    if not pending:
+        return {}
+
+    members = defaultdict(set)
+    rows = QuestionBucket.objects.filter(
+        bucket__in={bucket for _, _, question_buckets in pending for bucket in question_buckets},
+        question__exam__course_id__in={question.exam.course_id for question, _, _ in pending},
+        question__exam__deleted_at__isnull=True,
+    ).values_list('bucket', 'question__exam__course_id', 'question_id')
+    for bucket, course_id, question_id in rows:
+        members[bucket, course_id].add(question_id)
+
+    candidates = []
+    for question, sig, question_buckets in pending:
+        found = set().union(*(members[bucket, question.exam.course_id] for bucket in question_buckets))
+        found.discard(question.pk)
+        candidates.append((question, sig, sorted(found)[:MAX_CANDIDATES]))
+
+    stored = {
+        pk: _load(data)
+        for pk, data in QuestionSignature.objects.filter(
+            question_id__in={pk for _, _, ids in candidates for pk in ids}
+        ).values_list('question_id', 'signature')
+    }
+    matches = {}
+    for question, sig, ids in candidates:
+        scores = ((pk, similarity(sig, stored[pk])) for pk in ids if pk in stored)
+        ranked = sorted(
+            ((pk, score) for pk, score in scores if score >= THRESHOLD),
+            key=lambda item: (-item[1], item[0]),
+        )[:limit]
+        if ranked:
+            matches[question.pk] = ranked
+
+    found = Question.objects.select_related('exam').in_bulk(
+        {pk for ranked in matches.values() for pk, _ in ranked}
+    )
+    return {
+        question_id: [(found[pk], score) for pk, score in ranked if pk in found]
+        for question_id, ranked in matches.items()
+    }
+
+
+def _candidate_pairs(members):
+    """Pares únicos (i, j) con i < j de posiciones que comparten alguna cubeta"""
+    codes = []
+    for positions in members.values():
+        positions = np.sort(np.asarray(positions, dtype=np.int64))
+        first, second = np.triu_indices(len(positions), k=1)
+        codes.append(positions[first] * _PAIR_SHIFT + positions[second])
+    codes = np.unique(np.concatenate(codes))
+    return codes // _PAIR_SHIFT, codes % _PAIR_SHIFT
+
+
+def _components(size, first, second):
+    """Etiqueta de componente conexa (la menor posición) de cada nodo del grafo"""
+    labels = np.arange(size)
+    while True:
+        previous = labels.copy()
+        np.minimum.at(labels, first, labels[second])
+        np.minimum.at(labels, second, labels[first])
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            return labels
+
+
+def duplicate_groups(questions, limit=None):
+    """
+    Agrupa las preguntas casi duplicadas del queryset.
+
+    Devuelve una lista de grupos ``{'questions': [...], 'size': n,
+    'similarity': s}`` (s es la menor similitud confirmada dentro del grupo;
+    de cada grupo se incluyen hasta MAX_GROUP_QUESTIONS preguntas), de los más
+    grandes a los más pequeños, hasta ``limit`` grupos. Solo se comparan las preguntas
+    que comparten cubeta, así que el costo crece con el número de preguntas y
+    no con el de pares. Las preguntas sin firma no se incluyen.
+    """
+    question_ids = questions.order_by().values('pk')
+
+    # Cubetas compartidas por más de una pregunta (agrupadas en la base de datos)
+    shared = (
+        QuestionBucket.objects.filter(question_id__in=question_ids)
+        .values('bucket').annotate(size=Count('id'))
+        .filter(size__gt=1, size__lte=MAX_BUCKET_SIZE).values('bucket')
+    )
+    rows = list(
+        QuestionBucket.objects.filter(question_id__in=question_ids, bucket__in=shared)
+        .values_list('bucket', 'question_id')
+    )
+    if not rows:
+        return []
+
+    involved = sorted({question_id for _, question_id in rows})
+    position = {pk: index for index, pk in enumerate(involved)}
+    members = defaultdict(list)
+    for bucket, question_id in rows:
+        members[bucket].append(position[question_id])
+
+    matrix = np.zeros((len(involved), NUM_PERM), dtype=np.uint32)
+    for pk, data in QuestionSignature.objects.filter(question_id__in=involved).values_list('question_id', 'signature'):
+        matrix[position[pk]] = _load(data)
+
+    first, second = _candidate_pairs(members)
+    scores = np.empty(len(first))
+    for start in range(0, len(first), _SCORE_CHUNK):
+        chunk = slice(start, start + _SCORE_CHUNK)
+        scores[chunk] = np.count_nonzero(matrix[first[chunk]] == matrix[second[chunk]], axis=1) / NUM_PERM
+    confirmed = scores >= THRESHOLD
+    if not confirmed.any():
+        return []
+    first, second, scores = first[confirmed], second[confirmed], scores[confirmed]
+
+    labels = _components(len(involved), first, second)
+    lowest = np.ones(len(involved))
+    np.minimum.at(lowest, labels[first], scores)
+    roots = np.unique(labels[first])
+    groups = defaultdict(list)
+    for index in np.flatnonzero(np.isin(labels, roots)):
+        groups[int(labels[index])].append(involved[index])
+    ranked = sorted(groups.items(), key=lambda item: (-len(item[1]), -lowest[item[0]], item[1][0]))[:limit]
+
+    # De cada grupo se cargan las primeras MAX_GROUP_QUESTIONS preguntas
+    shown = {root: sorted(ids)[:MAX_GROUP_QUESTIONS] for root, ids in ranked}
+    found = (
+        Question.objects.select_related('exam').only('id', 'question_text', 'exam_id', 'exam__title')
+        .in_bulk([pk for ids in shown.values() for pk in ids])
+    )
+    return [
+        {
+            'questions': sorted((found[pk] for pk in shown[root] if pk in found), key=lambda q: (q.exam_id, q.pk)),
+            'size': len(ids),
+            'similarity': float(lowest[root]),
+        }
+        for root, ids in ranked
+    ]
@@ -0,0 +1,74 @@
+"""
+Exportación de bancos de preguntas a CSV y JSONL.
+
+Las filas se leen con ``.iterator(chunk_size=...)`` y la respuesta principal
+se obtiene en la misma consulta, así que la memoria usada no depende del
+tamaño del banco. Las columnas son las que entiende ``exams.importers``.
+"""
+import csv
+import json
+
+from django.db.models import OuterRef, Subquery
+
+from .models import Answer
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+EXPORT_COLUMNS = ('question_text', 'answer_text', 'explanation', 'marks', 'order')
+CHUNK_SIZE = 2000
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def export_rows(questions, include_exam=False):
+    """Genera un dict por pregunta con las columnas de exportación"""
+    primary_answer = Answer.objects.filter(question=OuterRef('pk')).order_by('order', 'id')
+    fields = ['question_text', 'answer_text', 'explanation', 'marks', 'order']
+    if include_exam:
+        fields.insert(0, 'exam__title')
+
+    rows = (
+        questions
+        .annotate(answer_text=Subquery(primary_answer.values('answer_text')[:1]))
+        .order_by('exam_id', 'order', 'id')
+        .values_list(*fields)
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    columns = (('exam',) if include_exam else ()) + EXPORT_COLUMNS
+    for values in rows:
+        row = dict(zip(columns, values))
+        row['answer_text'] = row['answer_text'] or ''
+        row['explanation'] = row['explanation'] or ''
+        row['marks'] = str(row['marks'])
+        yield row
+
+
+class _Echo:
+    """Objeto tipo archivo que devuelve lo escrito (para csv.writer en streaming)"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows, columns):
+    writer = csv.DictWriter(_Echo(), fieldnames=columns)
+    # BOM para que Excel detecte UTF-8
+    yield '\ufeff' + writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_jsonl(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def stream_export(questions, file_format, include_exam=False):
+    """Devuelve un generador de texto con la exportación en el formato indicado"""
+    rows = export_rows(questions, include_exam=include_exam)
+    if file_format == 'csv':
+        columns = (('exam',) if include_exam else ()) + EXPORT_COLUMNS
+        return stream_csv(rows, columns)
+    return stream_jsonl(rows)
@@ -0,0 +1,158 @@
+"""
+Calificación automática de los envíos de un tema.
+
+La clave de respuestas del tema se carga una sola vez en memoria
+(pregunta -> puntuación, ids de respuestas correctas y textos correctos
+normalizados). Las respuestas de los estudiantes se recorren con
+``values_list().iterator()`` y solo se escriben las filas cuyo resultado
+cambia, agrupadas por valor nuevo: como hay pocos valores distintos
+(correcta/incorrecta y la puntuación de cada pregunta) cada grupo es un
+``UPDATE ... WHERE id IN (...)`` por lote, mucho más rápido que el ``CASE``
+por fila de ``bulk_update``. Lo mismo para los ``ExamResult``.
+
+Una respuesta es correcta si la opción seleccionada es correcta o si el texto
+escrito coincide (sin distinguir mayúsculas, acentos ni espacios) con el de
+una respuesta correcta.
+"""
+import time
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Answer, ExamResult, StudentAnswer
+from .text import normalize_text
+
+ZERO = Decimal('0.00')
+DEFAULT_BATCH_SIZE = 1000
+
+AnswerKey = namedtuple('AnswerKey', ['marks', 'answer_ids', 'texts'])
+
+
+def build_answer_key(exam):
+    """Devuelve {question_id: AnswerKey} con las respuestas correctas del tema"""
+    key = {
+        question_id: AnswerKey(marks or ZERO, set(), set())
+        for question_id, marks in exam.questions.values_list('id', 'marks')
+    }
+    correct_answers = Answer.objects.filter(
+        question__exam=exam, is_correct=True
+    ).values_list('question_id', 'id', 'answer_text')
+    for question_id, answer_id, answer_text in correct_answers:
+        key[question_id].answer_ids.add(answer_id)
+        text = normalize_text(answer_text)
+        if text:
+            key[question_id].texts.add(text)
+    return key
+
+
+class GradingReport:
+    def __init__(self, regrade=False):
+        self.regrade = regrade
+        self.results = 0
+        self.results_updated = 0
+        self.answers = 0
+        self.answers_updated = 0
+        self.timings = {}
+
+    @property
+    def elapsed(self):
+        return sum(self.timings.values())
+
+
+class ExamGrader:
+    """
+    Califica los envíos de un tema.
+
+    Por defecto solo se califican los resultados enviados (``completed``);
+    con ``regrade`` también se recalculan los ya calificados, por ejemplo
+    después de corregir la clave de respuestas.
+    """
+
+    def __init__(self, exam, regrade=False, graded_by=None, batch_size=DEFAULT_BATCH_SIZE):
+        self.exam = exam
+        self.regrade = regrade
+        self.graded_by = graded_by
+        self.batch_size = batch_size
+
+    @property
+    def statuses(self):
+        return ('completed', 'graded') if self.regrade else ('completed',)
+
+    def run(self):
+        report = GradingReport(regrade=self.regrade)
+        now = timezone.now()
+
+        with transaction.atomic():
+            started = time.monotonic()
+            key = build_answer_key(self.exam)
+            results = {
+                pk: (marks, status)
+                for pk, marks, status in ExamResult.objects.filter(
+                    exam=self.exam, status__in=self.statuses
+                ).values_list('id', 'marks_obtained', 'status')
+            }
+            report.results = len(results)
+            report.timings['key'] = time.monotonic() - started
+            if not results:
+                return report
+
+            started = time.monotonic()
+            totals = self._grade_answers(key, results, report, now)
+            report.timings['answers'] = time.monotonic() - started
+
+            started = time.monotonic()
+            self._grade_results(results, totals, report, now)
+            report.timings['results'] = time.monotonic() - started
+        return report
+
+    def _grade_answers(self, key, results, report, now):
+        totals = dict.fromkeys(results, ZERO)
+        changed = defaultdict(list)
+        rows = StudentAnswer.objects.filter(
+            exam_result__exam=self.exam, exam_result__status__in=self.statuses
+        ).values_list(
+            'id', 'exam_result_id', 'question_id', 'selected_answer_id',
+            'text_answer', 'is_correct', 'marks_obtained'
+        ).order_by().iterator(chunk_size=self.batch_size)
+
+        for pk, result_id, question_id, selected_id, text, was_correct, old_marks in rows:
+            report.answers += 1
+            entry = key.get(question_id)
+            correct = entry is not None and (
+                selected_id in entry.answer_ids
+                or (bool(text) and normalize_text(text) in entry.texts)
+            )
+            marks = entry.marks if correct else ZERO
+            totals[result_id] += marks
+            if correct != was_correct or marks != old_marks:
+                changed[(correct, marks)].append(pk)
+
+        for (correct, marks), pks in changed.items():
+            self._update(StudentAnswer.objects, pks, is_correct=correct, marks_obtained=marks, updated_at=now)
+            report.answers_updated += len(pks)
+        return totals
+
+    def _grade_results(self, results, totals, report, now):
+        changed = defaultdict(list)
+        for pk, (marks, status) in results.items():
+            if marks != totals[pk] or status != 'graded':
+                changed[totals[pk]].append(pk)
+
+        for marks, pks in changed.items():
+            self._update(
+                ExamResult.objects, pks,
+                marks_obtained=marks, status='graded', graded_at=now,
+                graded_by=self.graded_by, updated_at=now,
+            )
+            report.results_updated += len(pks)
+
+    def _update(self, queryset, pks, **values):
+        for start in range(0, len(pks), self.batch_size):
+            queryset.filter(pk__in=pks[start:start + self.batch_size]).update(**values)
+
+
+def grade_exam(exam, regrade=False, graded_by=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Califica los envíos del tema y devuelve un GradingReport"""
+    return ExamGrader(exam, regrade=regrade, graded_by=graded_by, batch_size=batch_size).run()
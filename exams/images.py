@@ -0,0 +1,136 @@
+"""
+Variantes reducidas de las imágenes de cursos, temas y preguntas.
+
+Las imágenes se suben tal cual (hasta 5 MB) y las plantillas las muestran a
+45-350 px. Al guardar un objeto con imagen nueva se encola la tarea
+``exams.image_variants``, que genera con Pillow fuera de la petición:
+
+- ``thumb``: WebP de hasta ``VARIANT_SIZES['thumb']`` px (miniaturas y tarjetas
+  pequeñas, con densidad 2x),
+- ``medium``: WebP de hasta ``VARIANT_SIZES['medium']`` px (tarjetas y el modal),
+- ``placeholder``: WebP diminuto como data URI, que se muestra de fondo
+  mientras carga la imagen.
+
+El resultado se guarda en ``image_variants``::
+
+    {"source": "questions/a.png", "width": 1200, "height": 800,
+     "thumb": {"name": "variants/questions/a.thumb.webp", "width": 160, "height": 107},
+     "medium": {...}, "placeholder": "data:image/webp;base64,..."}
+
+``source`` es el nombre de la imagen original: si no coincide con el actual
+las variantes están desactualizadas y las plantillas usan la original.
+"""
+import base64
+import io
+import logging
+import os
+
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .jobs import enqueue
+from .media_urls import forget_url
+
+logger = logging.getLogger(__name__)
+
+VARIANT_SIZES = {'thumb': 160, 'medium': 800}
+PLACEHOLDER_SIZE = 16
+WEBP_QUALITY = 80
+VARIANTS_PREFIX = 'variants'
+
+
+def variants_are_current(instance, field='image'):
+    """Indica si las variantes guardadas corresponden a la imagen actual"""
+    image = getattr(instance, field)
+    return bool(image) and (instance.image_variants or {}).get('source') == image.name
+
+
+def _webp(image, size, quality=WEBP_QUALITY):
+    copy = image.copy()
+    copy.thumbnail((size, size), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    copy.save(buffer, 'WEBP', quality=quality, method=4)
+    return buffer.getvalue(), copy.size
+
+
+def build_variants(storage, name):
+    """Genera y guarda las variantes de la imagen ``name``; devuelve el dict de image_variants"""
+    with storage.open(name, 'rb') as source:
+        image = Image.open(source)
+        # Solo el primer cuadro de un GIF animado
+        image.seek(0)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P', 'PA') else 'RGB')
+
+    base = os.path.splitext(name)[0]
+    variants = {'source': name, 'width': image.width, 'height': image.height}
+    for variant, size in VARIANT_SIZES.items():
+        data, (width, height) = _webp(image, size)
+        saved = storage.save(f'{VARIANTS_PREFIX}/{base}.{variant}.webp', ContentFile(data))
+        variants[variant] = {'name': saved, 'width': width, 'height': height}
+
+    data, _ = _webp(image, PLACEHOLDER_SIZE, quality=30)
+    variants['placeholder'] = 'data:image/webp;base64,' + base64.b64encode(data).decode('ascii')
+    return variants
+
+
+def delete_variants(storage, variants):
+    """Borra los archivos de unas variantes que ya no se usan"""
+    for variant in VARIANT_SIZES:
+        name = (variants or {}).get(variant, {}).get('name')
+        if name:
+            forget_url(storage, name, variant)
+            try:
+                storage.delete(name)
+            except Exception:
+                logger.warning('No se pudo borrar la variante %s', name, exc_info=True)
+
+
+def generate_image_variants(model, pk, field='image', force=False):
+    """
+    Genera las variantes del objeto si su imagen cambió (o siempre, con
+    ``force``, p. ej. al cambiar VARIANT_SIZES). Devuelve el dict
+    guardado, o None si el objeto ya no existe o no tiene imagen.
+    """
+    instance = model.objects.filter(pk=pk).only('pk', field, 'image_variants').first()
+    if instance is None:
+        return None
+    image = getattr(instance, field)
+    previous = instance.image_variants or {}
+    if not image:
+        if previous:
+            delete_variants(image.storage, previous)
+            model.objects.filter(pk=pk).update(image_variants={})
+        return None
+    if previous.get('source') == image.name and not force:
+        return previous
+
+    variants = build_variants(image.storage, image.name)
+    # Solo si la imagen no volvió a cambiar mientras se generaban
+    updated = model.objects.filter(pk=pk, **{field: image.name}).update(
+        image_variants=variants, updated_at=timezone.now()
+    )
+    if not updated:
+        delete_variants(image.storage, variants)
+        return None
+    delete_variants(image.storage, previous)
+    return variants
+
+
+def queue_image_variants(instance, field='image', force=False):
+    """Encola la generación de variantes si la imagen del objeto cambió"""
+    image = getattr(instance, field)
+    if not image and not instance.image_variants:
+        return None
+    if image and variants_are_current(instance, field) and not force:
+        return None
+    return enqueue(
+        'exams.image_variants',
+        key=f'image_variants:{instance._meta.label_lower}:{instance.pk}',
+        model=instance._meta.label_lower,
+        pk=instance.pk,
+        field=field,
+        force=force,
+    )
@@ -0,0 +1,350 @@
+"""
+Importación masiva de preguntas desde CSV, JSON/JSONL o XLSX.
+
+Los archivos se leen fila por fila, cada fila se valida y las filas válidas
+se insertan por lotes con ``bulk_create`` dentro de una sola transacción.
+Las columnas reconocidas son las mismas que genera ``exams.exporters``:
+``question_text``, ``answer_text``, ``explanation`` y ``marks`` (más ``exam``
+al importar un curso completo); el resto se ignora.
+"""
+import codecs
+import csv
+import json
+import os
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.db import transaction
+
+from .duplicates import index_questions
+from .images import queue_image_variants
+from .models import Answer, Exam, Question
+from .ordering import ORDER_GAP, next_question_order
+from .search import refresh_search_vectors
+from .signals import exam_content_changed
+
+IMPORT_FORMATS = ('csv', 'json', 'jsonl', 'xlsx')
+DEFAULT_BATCH_SIZE = 500
+
+
+class ImportFormatError(Exception):
+    """El archivo no se puede leer en el formato indicado"""
+
+
+def detect_format(filename):
+    extension = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    if extension not in IMPORT_FORMATS:
+        raise ImportFormatError(
+            f'Formato no soportado: "{extension or filename}". Usa uno de: {", ".join(IMPORT_FORMATS)}.'
+        )
+    return extension
+
+
+def _text_lines(fileobj):
+    """
+    Decodifica el archivo línea por línea en UTF-8 (con o sin BOM). Un archivo
+    en otra codificación (Excel en español guarda el CSV en Latin-1) se
+    rechaza indicando la línea.
+    """
+    for line_number, raw in enumerate(fileobj, start=1):
+        if line_number == 1 and raw.startswith(codecs.BOM_UTF8):
+            raw = raw[len(codecs.BOM_UTF8):]
+        try:
+            yield raw.decode('utf-8')
+        except UnicodeDecodeError:
+            raise ImportFormatError(
+                f'La línea {line_number} no está en UTF-8. Guarda el archivo con codificación UTF-8 (en Excel: "CSV UTF-8").'
+            )
+
+
+def _read_csv(fileobj):
+    reader = csv.DictReader(_text_lines(fileobj))
+    # La fila 1 es la cabecera
+    try:
+        for line_number, row in enumerate(reader, start=2):
+            yield line_number, row
+    except csv.Error as e:
+        raise ImportFormatError(f'CSV inválido en la línea {reader.line_num + 1}: {e}')
+
+
+def _read_jsonl(fileobj):
+    for line_number, line in enumerate(_text_lines(fileobj), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError as e:
+            yield line_number, ImportFormatError(f'JSON inválido: {e}')
+
+
+def _read_json(fileobj):
+    # Un arreglo JSON no se puede leer por partes sin dependencias adicionales;
+    # para archivos grandes se recomienda JSONL (un objeto por línea)
+    try:
+        data = json.load(codecs.getreader('utf-8-sig')(fileobj))
+    except ValueError as e:
+        raise ImportFormatError(f'JSON inválido: {e}')
+    if isinstance(data, dict):
+        data = data.get('questions', [])
+    if not isinstance(data, list):
+        raise ImportFormatError('El JSON debe ser una lista de preguntas.')
+    for index, row in enumerate(data, start=1):
+        yield index, row
+
+
+def _read_xlsx(fileobj):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFormatError('Para importar archivos XLSX se necesita instalar openpyxl.')
+
+    try:
+        workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    except Exception as e:
+        raise ImportFormatError(f'No se pudo leer el archivo XLSX: {e}')
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if not header:
+            return
+        header = [str(cell).strip() if cell is not None else '' for cell in header]
+        for line_number, values in enumerate(rows, start=2):
+            if values is None or all(value is None for value in values):
+                continue
+            yield line_number, dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+READERS = {
+    'csv': _read_csv,
+    'json': _read_json,
+    'jsonl': _read_jsonl,
+    'xlsx': _read_xlsx,
+}
+
+
+def read_rows(fileobj, file_format):
+    """Genera (número_de_fila, dict) para cada fila del archivo"""
+    return READERS[file_format](fileobj)
+
+
+def _text(row, name):
+    value = row.get(name)
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+def clean_row(row):
+    """Valida una fila y devuelve los datos limpios; lanza ValueError si es inválida"""
+    if isinstance(row, Exception):
+        raise ValueError(str(row))
+    if not isinstance(row, dict):
+        raise ValueError('La fila debe ser un objeto con columnas.')
+
+    question_text = _text(row, 'question_text')
+    if not question_text:
+        raise ValueError('La columna "question_text" es obligatoria.')
+
+    marks = _text(row, 'marks') or '1'
+    try:
+        marks = Decimal(marks)
+    except InvalidOperation:
+        raise ValueError(f'Puntuación inválida: "{marks}".')
+    if marks < 0 or marks >= 1000:
+        raise ValueError(f'La puntuación debe estar entre 0 y 999.99: "{marks}".')
+
+    return {
+        'question_text': question_text,
+        'answer_text': _text(row, 'answer_text'),
+        'explanation': _text(row, 'explanation') or None,
+        'marks': marks.quantize(Decimal('0.01')),
+        'image': _clean_image(row.get('image')),
+    }
+
+
+class StoredImage(str):
+    """Nombre de una imagen ya validada y guardada con store_image"""
+
+
+def store_image(image):
+    """
+    Guarda la imagen de una pregunta en el almacenamiento y devuelve su nombre.
+    Se llama antes de ``transaction.atomic``: la subida a Cloudinary no debe
+    ocurrir mientras next_question_order tiene bloqueado el tema.
+    """
+    field = Question._meta.get_field('image')
+    name = field.generate_filename(None, image.name)
+    return StoredImage(field.storage.save(name, image, max_length=field.max_length))
+
+
+def _clean_image(image):
+    # Solo el formulario de carga por lotes envía imágenes (archivos subidos);
+    # en los archivos de importación la columna se ignora
+    if isinstance(image, StoredImage):
+        return image
+    if not isinstance(image, File):
+        return None
+    try:
+        Question._meta.get_field('image').run_validators(image)
+    except ValidationError as e:
+        raise ValueError(' '.join(e.messages))
+    return image
+
+
+class ImportReport:
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.total_rows = 0
+        self.created = 0
+        self.errors = []
+        self.elapsed = 0.0
+
+    @property
+    def valid_rows(self):
+        return self.total_rows - len(self.errors)
+
+    def add_error(self, line_number, message):
+        self.errors.append((line_number, message))
+
+
+class QuestionImporter:
+    """
+    Inserta preguntas con su respuesta en un examen.
+
+    Con ``dry_run`` solo se validan las filas. Las filas inválidas se omiten
+    y quedan registradas en el reporte.
+    """
+
+    def __init__(self, exam, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+        self.exam = exam
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+
+    def run(self, rows):
+        report = ImportReport(dry_run=self.dry_run)
+        started = time.monotonic()
+
+        if self.dry_run:
+            for line_number, row in rows:
+                report.total_rows += 1
+                try:
+                    clean_row(row)
+                    self.validate_target(row)
+                except ValueError as e:
+                    report.add_error(line_number, str(e))
+        else:
+            with transaction.atomic():
+                self._import(rows, report)
+
+        report.elapsed = time.monotonic() - started
+        return report
+
+    def validate_target(self, row):
+        """Valida los datos de la fila que determinan el examen destino"""
+
+    def get_target(self, row):
+        """Devuelve el examen en el que se inserta la fila"""
+        return self.exam
+
+    def _import(self, rows, report):
+        # Por cada examen destino: siguiente orden y lote pendiente
+        next_orders = {}
+        batches = {}
+        created = {}
+        for line_number, row in rows:
+            report.total_rows += 1
+            try:
+                data = clean_row(row)
+                exam = self.get_target(row)
+            except ValueError as e:
+                report.add_error(line_number, str(e))
+                continue
+
+            if exam.pk not in next_orders:
+                next_orders[exam.pk] = next_question_order(exam)
+                batches[exam.pk] = (exam, [])
+                created[exam.pk] = 0
+            data['order'] = next_orders[exam.pk]
+            next_orders[exam.pk] += ORDER_GAP
+
+            batch = batches[exam.pk][1]
+            batch.append(data)
+            if len(batch) >= self.batch_size:
+                created[exam.pk] += self._insert(exam, batch)
+                batches[exam.pk] = (exam, [])
+
+        for exam, batch in batches.values():
+            if batch:
+                created[exam.pk] += self._insert(exam, batch)
+
+        for exam_id, count in created.items():
+            if count:
+                exam_content_changed([exam_id], question_delta=count)
+        report.created = sum(created.values())
+
+    def _insert(self, exam, batch):
+        questions = Question.objects.bulk_create([
+            Question(
+                exam=exam,
+                question_text=data['question_text'],
+                question_type='multiple_choice',
+                marks=data['marks'],
+                explanation=data['explanation'],
+                image=data['image'],
+                order=data['order'],
+            )
+            for data in batch
+        ], batch_size=self.batch_size)
+        Answer.objects.bulk_create([
+            Answer(question=question, answer_text=data['answer_text'], is_correct=True, order=1)
+            for question, data in zip(questions, batch)
+            if data['answer_text']
+        ], batch_size=self.batch_size)
+        refresh_search_vectors([question.pk for question in questions])
+        index_questions([(question.pk, question.question_text) for question in questions])
+        for question in questions:
+            if question.image:
+                queue_image_variants(question)
+        return len(questions)
+
+
+class CourseImporter(QuestionImporter):
+    """
+    Importa un banco de un curso completo (formato de la exportación por curso).
+
+    Cada fila indica su tema en la columna ``exam``; los temas que no existen
+    en el curso se crean con ``created_by`` como autor.
+    """
+
+    def __init__(self, course, created_by, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+        super().__init__(None, batch_size=batch_size, dry_run=dry_run)
+        self.course = course
+        self.created_by = created_by
+        self._exams = {}
+
+    def validate_target(self, row):
+        title = _text(row, 'exam')
+        if not title:
+            raise ValueError('La columna "exam" es obligatoria al importar un curso.')
+        if len(title) > Exam._meta.get_field('title').max_length:
+            raise ValueError('El título del tema es demasiado largo.')
+        return title
+
+    def get_target(self, row):
+        title = self.validate_target(row)
+        if title not in self._exams:
+            exam = self.course.exams.filter(title=title, deleted_at__isnull=True).order_by('id').first()
+            if exam is None:
+                exam = Exam.objects.create(
+                    course=self.course,
+                    title=title,
+                    subject=title[:Exam._meta.get_field('subject').max_length],
+                    created_by=self.created_by
+                )
+            self._exams[title] = exam
+        return self._exams[title]
@@ -0,0 +1,193 @@
+"""
+Cola de tareas en segundo plano guardada en la base de datos.
+
+No necesita un broker externo: las tareas son filas de ``Job`` y los
+workers (``manage.py runworker``) las toman con
+``SELECT ... FOR UPDATE SKIP LOCKED``, así que varios procesos e hilos pueden
+trabajar a la vez sin tomar dos veces la misma tarea. En bases sin
+``SKIP LOCKED`` (SQLite en desarrollo) la tarea se reclama con un ``UPDATE``
+condicional sobre el estado.
+
+Las tareas se registran con ``@task('nombre')`` y se encolan con
+``enqueue('nombre', **parámetros)``; los parámetros deben ser serializables
+como JSON. Como la tarea se guarda en la misma transacción que la petición,
+solo se ejecuta si la petición se confirma. Una tarea que falla se reintenta
+con espera exponencial hasta ``max_attempts`` veces.
+
+Mientras ejecuta una tarea el worker renueva ``Job.heartbeat_at`` cada
+``JOB_HEARTBEAT_INTERVAL`` segundos; solo se devuelven a la cola las tareas
+cuyo latido lleva más de ``JOB_STALE_AFTER`` detenido (worker caído), no las
+que simplemente tardan. Dos tareas con la misma clave nunca se ejecutan a la
+vez.
+"""
+import logging
+import random
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_BASE = 10
+BACKOFF_MAX = 3600
+
+_registry = {}
+
+
+def task(name, max_attempts=5):
+    """Registra una función como tarea en segundo plano"""
+    def decorator(func):
+        func.task_name = name
+        func.max_attempts = max_attempts
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def get_task(name):
+    try:
+        return _registry[name]
+    except KeyError:
+        raise LookupError(f'La tarea "{name}" no está registrada.')
+
+
+def enqueue(name, key='', priority=0, run_at=None, created_by=None, **payload):
+    """
+    Encola una tarea y devuelve el Job.
+
+    Si se indica ``key`` y ya hay una tarea en cola con esa clave se
+    devuelve la existente en lugar de encolar otra. Si la de esa clave está en
+    ejecución se encola una nueva, que no se toma hasta que la primera termine
+    (así un cambio hecho durante la ejecución también se procesa).
+    """
+    func = get_task(name)
+    if key:
+        existing = Job.objects.filter(key=key, status='queued').first()
+        if existing is not None:
+            return existing
+    return Job.objects.create(
+        name=name,
+        payload=payload,
+        key=key,
+        priority=priority,
+        max_attempts=func.max_attempts,
+        run_at=run_at or timezone.now(),
+        created_by=created_by,
+    )
+
+
+def backoff(attempts):
+    """Segundos de espera antes del siguiente intento (exponencial con variación)"""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** max(attempts - 1, 0))
+    return delay + random.uniform(0, delay / 10)
+
+
+def claim_job(worker):
+    """Toma la siguiente tarea lista para ejecutarse, o devuelve None"""
+    now = timezone.now()
+    with transaction.atomic():
+        # Se saltan las tareas cuya clave tiene otra tarea en ejecución
+        running = Job.objects.filter(key=OuterRef('key'), status='running').exclude(key='')
+        queryset = Job.objects.filter(status='queued', run_at__lte=now).exclude(Exists(running)).order_by(
+            '-priority', 'run_at', 'id'
+        )
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        job = queryset.first()
+        if job is None:
+            return None
+        claimed = Job.objects.filter(pk=job.pk, status='queued').update(
+            status='running', attempts=F('attempts') + 1, worker=worker,
+            started_at=now, heartbeat_at=now, finished_at=None, updated_at=now,
+        )
+        if not claimed:
+            # Otro worker la tomó primero (solo pasa sin SKIP LOCKED)
+            return None
+    job.status = 'running'
+    job.attempts += 1
+    job.worker = worker
+    job.started_at = now
+    job.heartbeat_at = now
+    return job
+
+
+@contextmanager
+def heartbeat(job, interval=None):
+    """Renueva ``heartbeat_at`` de la tarea desde otro hilo mientras dura el bloque"""
+    interval = settings.JOB_HEARTBEAT_INTERVAL if interval is None else interval
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(interval):
+                now = timezone.now()
+                Job.objects.filter(pk=job.pk, status='running', worker=job.worker).update(
+                    heartbeat_at=now, updated_at=now
+                )
+        except Exception:
+            logger.exception('No se pudo renovar el latido de la tarea %s (#%s)', job.name, job.pk)
+        finally:
+            # Conexión propia del hilo
+            connection.close()
+
+    thread = threading.Thread(target=beat, name=f'heartbeat-{job.pk}', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run_job(job):
+    """Ejecuta una tarea ya reclamada y guarda el resultado; devuelve True si terminó bien"""
+    # Solo se guarda el resultado si la tarea sigue siendo de este worker
+    owned = Job.objects.filter(pk=job.pk, status='running', worker=job.worker)
+    try:
+        with heartbeat(job):
+            result = get_task(job.name)(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception('La tarea %s (#%s) falló en el intento %s', job.name, job.pk, job.attempts)
+        now = timezone.now()
+        if job.attempts < job.max_attempts:
+            values = {'status': 'queued', 'run_at': now + timedelta(seconds=backoff(job.attempts))}
+        else:
+            values = {'status': 'failed', 'finished_at': now}
+        owned.update(last_error=error, worker='', updated_at=now, **values)
+        return False
+
+    now = timezone.now()
+    owned.update(status='done', result=result, finished_at=now, worker='', updated_at=now)
+    return True
+
+
+def requeue_stale_jobs(stale_after):
+    """Vuelve a encolar las tareas en ejecución cuyo worker dejó de renovar el latido"""
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=stale_after)
+    stale = Job.objects.filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff), status='running'
+    )
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', finished_at=now, worker='', updated_at=now,
+        last_error='El worker dejó de responder durante la ejecución.',
+    )
+    queued = stale.update(status='queued', run_at=now, worker='', updated_at=now)
+    return queued + failed
+
+
+def retry_jobs(queryset):
+    """Vuelve a encolar tareas fallidas con los intentos en cero"""
+    now = timezone.now()
+    return queryset.filter(status='failed').update(
+        status='queued', attempts=0, run_at=now, finished_at=None, updated_at=now
+    )
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from exams.analytics import analyze_exam
+from exams.models import Exam
+
+
+class Command(BaseCommand):
+    help = 'Calcula el análisis de ítems (dificultad, discriminación y KR-20) de los temas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_ids', nargs='+', type=int, help='IDs de los temas')
+
+    def handle(self, *args, **options):
+        exams = Exam.objects.filter(pk__in=options['exam_ids']).order_by('pk')
+        missing = set(options['exam_ids']) - {exam.pk for exam in exams}
+        if missing:
+            raise CommandError(f'Temas inexistentes: {", ".join(map(str, sorted(missing)))}')
+
+        for exam in exams:
+            started = time.monotonic()
+            analysis = analyze_exam(exam)
+            kr20 = f'{analysis.kr20:.3f}' if analysis.kr20 is not None else '-'
+            self.stdout.write(self.style.SUCCESS(
+                f'Tema {exam.pk}: {analysis.students} estudiante(s), {analysis.questions} pregunta(s), '
+                f'KR-20 {kr20} en {time.monotonic() - started:.2f} s'
+            ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from exams.images import queue_image_variants
+from exams.models import Course, Exam, Question
+
+
+class Command(BaseCommand):
+    help = 'Encola la generación de variantes (miniaturas WebP) de las imágenes que aún no las tienen'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Regenerar también las variantes existentes')
+
+    def handle(self, *args, **options):
+        queued = 0
+        for model in (Course, Exam, Question):
+            objects = model.objects.exclude(image='').exclude(image__isnull=True).only('pk', 'image', 'image_variants')
+            for instance in objects.iterator(chunk_size=1000):
+                if queue_image_variants(instance, force=options['rebuild']) is not None:
+                    queued += 1
+        self.stdout.write(self.style.SUCCESS(f'{queued} imagen(es) encolada(s); las procesa runworker'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from exams.models import Exam
+from exams.ordering import ORDER_GAP, compact_question_order
+
+
+class Command(BaseCommand):
+    help = f'Renumera el orden de las preguntas de los temas con huecos de {ORDER_GAP}'
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_ids', nargs='*', type=int, help='IDs de los temas (por defecto todos)')
+
+    def handle(self, *args, **options):
+        exams = Exam.objects.order_by('pk')
+        if options['exam_ids']:
+            exams = exams.filter(pk__in=options['exam_ids'])
+            missing = set(options['exam_ids']) - set(exams.values_list('pk', flat=True))
+            if missing:
+                raise CommandError(f'Temas inexistentes: {", ".join(map(str, sorted(missing)))}')
+
+        total = 0
+        for exam in exams.iterator():
+            changed = compact_question_order(exam)
+            total += changed
+            if changed:
+                self.stdout.write(f'Tema {exam.pk}: {changed} pregunta(s) renumerada(s)')
+        self.stdout.write(self.style.SUCCESS(f'{total} pregunta(s) renumerada(s) en total'))
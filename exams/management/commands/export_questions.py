@@ -0,0 +1,33 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from exams.exporters import EXPORT_FORMATS, stream_export
+from exams.models import Course, Exam, Question
+
+
+class Command(BaseCommand):
+    help = 'Exporta las preguntas de un tema (o de un curso completo) a CSV o JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('target_id', type=int, help='ID del tema (o del curso con --course)')
+        parser.add_argument('--course', action='store_true', help='Exportar un curso completo')
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--output', help='Archivo de salida (por defecto la salida estándar)')
+
+    def handle(self, *args, **options):
+        model = Course if options['course'] else Exam
+        if not model.objects.filter(pk=options['target_id']).exists():
+            raise CommandError(f'{model._meta.verbose_name} {options["target_id"]} no existe')
+
+        if options['course']:
+            questions = Question.objects.filter(exam__course_id=options['target_id'])
+        else:
+            questions = Question.objects.filter(exam_id=options['target_id'])
+        chunks = stream_export(questions, options['format'], include_exam=options['course'])
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(chunks)
+        else:
+            sys.stdout.writelines(chunks)
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from exams.grading import DEFAULT_BATCH_SIZE, grade_exam
+from exams.models import Exam
+
+
+class Command(BaseCommand):
+    help = 'Califica los envíos de un tema (o los recalifica con --regrade)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_ids', nargs='+', type=int, help='IDs de los temas')
+        parser.add_argument('--regrade', action='store_true', help='Recalificar también los resultados ya calificados')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        exams = Exam.objects.filter(pk__in=options['exam_ids']).order_by('pk')
+        missing = set(options['exam_ids']) - {exam.pk for exam in exams}
+        if missing:
+            raise CommandError(f'Temas inexistentes: {", ".join(map(str, sorted(missing)))}')
+
+        for exam in exams:
+            report = grade_exam(exam, regrade=options['regrade'], batch_size=options['batch_size'])
+            timings = ', '.join(f'{name} {seconds:.2f} s' for name, seconds in report.timings.items())
+            self.stdout.write(self.style.SUCCESS(
+                f'Tema {exam.pk}: {report.results} resultado(s), {report.results_updated} actualizado(s); '
+                f'{report.answers} respuesta(s), {report.answers_updated} actualizada(s) '
+                f'en {report.elapsed:.2f} s ({timings})'
+            ))
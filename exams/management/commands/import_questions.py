@@ -0,0 +1,61 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from exams.importers import (
+    DEFAULT_BATCH_SIZE, IMPORT_FORMATS, CourseImporter, ImportFormatError, QuestionImporter,
+    detect_format, read_rows
+)
+from exams.models import Course, Exam
+
+
+class Command(BaseCommand):
+    help = 'Importa preguntas a un tema (o a un curso completo) desde un archivo CSV, JSON, JSONL o XLSX'
+
+    def add_arguments(self, parser):
+        parser.add_argument('target_id', type=int, help='ID del tema destino (o del curso con --course)')
+        parser.add_argument('path', help='Ruta del archivo a importar')
+        parser.add_argument('--course', action='store_true',
+                            help='Importar un curso completo; cada fila indica su tema en la columna "exam"')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help='Formato (por defecto según la extensión)')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Filas por INSERT')
+        parser.add_argument('--dry-run', action='store_true', help='Solo validar, sin guardar nada')
+
+    def handle(self, *args, **options):
+        if options['course']:
+            try:
+                course = Course.objects.not_deleted().get(pk=options['target_id'])
+            except Course.DoesNotExist:
+                raise CommandError(f'El curso {options["target_id"]} no existe')
+            target_name = course.name
+            importer = CourseImporter(
+                course, course.created_by, batch_size=options['batch_size'], dry_run=options['dry_run']
+            )
+        else:
+            try:
+                exam = Exam.objects.not_deleted().get(pk=options['target_id'])
+            except Exam.DoesNotExist:
+                raise CommandError(f'El tema {options["target_id"]} no existe')
+            target_name = exam.title
+            importer = QuestionImporter(exam, batch_size=options['batch_size'], dry_run=options['dry_run'])
+
+        try:
+            file_format = options['format'] or detect_format(options['path'])
+            with open(options['path'], 'rb') as fileobj:
+                report = importer.run(read_rows(fileobj, file_format))
+        except (OSError, UnicodeDecodeError, csv.Error, ImportFormatError) as e:
+            raise CommandError(str(e))
+
+        for line_number, message in report.errors:
+            self.stderr.write(f'Fila {line_number}: {message}')
+
+        if report.dry_run:
+            self.stdout.write(self.style.SUCCESS(
+                f'Validación completada: {report.valid_rows} de {report.total_rows} filas válidas '
+                f'({report.elapsed:.2f}s)'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'{report.created} preguntas importadas en "{target_name}" '
+                f'({len(report.errors)} filas con errores, {report.elapsed:.2f}s)'
+            ))
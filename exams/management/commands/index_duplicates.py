@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from exams.duplicates import index_queryset
+from exams.models import Question
+
+
+class Command(BaseCommand):
+    help = 'Construye el índice de preguntas duplicadas (firmas MinHash) de las preguntas sin indexar'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Recalcular también las preguntas ya indexadas')
+
+    def handle(self, *args, **options):
+        indexed = index_queryset(Question.objects.all(), missing_only=not options['rebuild'])
+        self.stdout.write(self.style.SUCCESS(f'{indexed} pregunta(s) indexada(s)'))
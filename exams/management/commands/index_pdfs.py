@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from exams.models import Exam
+from exams.pdf_index import queue_pdf_index
+
+
+class Command(BaseCommand):
+    help = 'Encola la extracción del texto de los PDF de los temas que aún no están indexados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Volver a extraer también los PDF ya indexados')
+
+    def handle(self, *args, **options):
+        queued = 0
+        exams = Exam.objects.exclude(pdf_file='').exclude(pdf_file__isnull=True).only('pk', 'pdf_file', 'pdf_index')
+        for exam in exams.iterator(chunk_size=1000):
+            if queue_pdf_index(exam, force=options['rebuild']) is not None:
+                queued += 1
+        self.stdout.write(self.style.SUCCESS(f'{queued} PDF(s) encolado(s); los procesa runworker'))
@@ -0,0 +1,75 @@
+import os
+import signal
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from exams.jobs import claim_job, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta las tareas en segundo plano de la cola (exams_job)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=settings.JOB_WORKER_CONCURRENCY,
+                            help='Número de hilos que ejecutan tareas')
+        parser.add_argument('--poll-interval', type=float, default=settings.JOB_POLL_INTERVAL,
+                            help='Segundos de espera cuando la cola está vacía')
+        parser.add_argument('--once', action='store_true',
+                            help='Terminar cuando no queden tareas listas')
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        signal.signal(signal.SIGTERM, self._shutdown)
+        signal.signal(signal.SIGINT, self._shutdown)
+
+        name = f'{socket.gethostname()}:{os.getpid()}'
+        requeued = requeue_stale_jobs(settings.JOB_STALE_AFTER)
+        if requeued:
+            self.stdout.write(f'{requeued} tarea(s) abandonada(s) devuelta(s) a la cola.')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Worker {name} con {options["concurrency"]} hilo(s) esperando tareas.'
+        ))
+        threads = [
+            threading.Thread(
+                target=self._loop, args=(f'{name}/{index}', options['poll_interval'], options['once']),
+                daemon=True,
+            )
+            for index in range(max(options['concurrency'], 1))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            # join con timeout para que las señales se atiendan en el hilo principal
+            while thread.is_alive():
+                thread.join(timeout=1)
+        self.stdout.write('Worker detenido.')
+
+    def _shutdown(self, signum, frame):
+        self.stdout.write('Deteniendo el worker al terminar las tareas en curso...')
+        self.stop.set()
+
+    def _loop(self, worker, poll_interval, once):
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                job = claim_job(worker)
+                if job is None:
+                    if once:
+                        return
+                    self.stop.wait(poll_interval)
+                    continue
+
+                started = time.monotonic()
+                ok = run_job(job)
+                self.stdout.write(
+                    f'[{worker}] {job.name} #{job.pk} intento {job.attempts}: '
+                    f'{"ok" if ok else "error"} en {time.monotonic() - started:.2f} s'
+                )
+        finally:
+            connection.close()
@@ -0,0 +1,105 @@
+"""
+Caché en memoria de las URL de los archivos subidos.
+
+Con ``cloudinary_storage`` cada ``.url`` arma la URL firmada (y a veces
+consulta la API), y las páginas de cursos, temas y preguntas lo hacen por cada
+fila. Los nombres de archivo no se reutilizan (cada subida y cada variante
+tiene su nombre), así que la URL de ``(almacenamiento, nombre, variante)`` se
+puede guardar en una caché LRU por proceso con duración ``MEDIA_URL_CACHE_TIMEOUT``.
+
+Los errores también se guardan (caché negativa, ``MEDIA_URL_NEGATIVE_TIMEOUT``):
+una imagen rota en Cloudinary devuelve None sin volver a intentarlo en cada
+página hasta que vence la entrada.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_FAILED = object()
+
+
+class URLCache:
+    """Caché LRU con vencimiento, segura entre hilos"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Devuelve el valor guardado o None si no está o venció"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_cache = URLCache(settings.MEDIA_URL_CACHE_SIZE)
+
+
+def storage_url(storage, name, variant='original'):
+    """
+    URL del archivo ``name`` del almacenamiento, o None si no tiene nombre o el
+    almacenamiento falla.
+    """
+    if not name:
+        return None
+    key = (storage, name, variant)
+    url = _cache.get(key)
+    if url is _FAILED:
+        return None
+    if url is not None:
+        return url
+    try:
+        url = storage.url(name)
+    except Exception:
+        logger.warning('No se pudo obtener la URL de %s', name, exc_info=True)
+        _cache.set(key, _FAILED, settings.MEDIA_URL_NEGATIVE_TIMEOUT)
+        return None
+    _cache.set(key, url, settings.MEDIA_URL_CACHE_TIMEOUT)
+    return url
+
+
+def file_url(file, variant='original'):
+    """URL de un FieldFile (``obj.image``) con la caché de storage_url"""
+    if not file:
+        return None
+    return storage_url(file.storage, file.name, variant)
+
+
+def forget_url(storage, name, variant='original'):
+    """Quita de la caché la URL de un archivo borrado"""
+    _cache.delete((storage, name, variant))
+
+
+def clear_url_cache():
+    _cache.clear()
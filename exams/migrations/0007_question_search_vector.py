@@ -0,0 +1,82 @@
+# Generated by Django 5.1.3 on 2026-10-18 05:30
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension, UnaccentExtension
+from django.db import migrations
+
+SEARCH_SETUP_SQL = [
+    # Configuración en español que ignora acentos
+    "DROP TEXT SEARCH CONFIGURATION IF EXISTS exam_spanish",
+    "CREATE TEXT SEARCH CONFIGURATION exam_spanish (COPY = spanish)",
+    "ALTER TEXT SEARCH CONFIGURATION exam_spanish "
+    "ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem",
+    # Índice de texto completo
+    "CREATE INDEX IF NOT EXISTS exams_question_search_vector_gin "
+    "ON exams_question USING gin (search_vector)",
+    # Índices trigram para búsquedas parciales (icontains usa UPPER(...) LIKE)
+    "CREATE INDEX IF NOT EXISTS exams_question_text_trgm "
+    "ON exams_question USING gin (UPPER(question_text) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS exams_question_explanation_trgm "
+    "ON exams_question USING gin (UPPER(explanation) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS exams_answer_text_trgm "
+    "ON exams_answer USING gin (UPPER(answer_text) gin_trgm_ops)",
+]
+
+# Copia de exams.search.UPDATE_SEARCH_VECTOR_SQL al crear la migración
+UPDATE_SEARCH_VECTOR_SQL = """
+    UPDATE exams_question AS q
+    SET search_vector =
+        setweight(to_tsvector('exam_spanish', coalesce(q.question_text, '')), 'A') ||
+        setweight(to_tsvector('exam_spanish', coalesce((
+            SELECT string_agg(a.answer_text, ' ')
+            FROM exams_answer AS a
+            WHERE a.question_id = q.id
+        ), '')), 'B') ||
+        setweight(to_tsvector('exam_spanish', coalesce(q.explanation, '')), 'C')
+    WHERE q.id = ANY(%s)
+"""
+
+SEARCH_TEARDOWN_SQL = [
+    "DROP INDEX IF EXISTS exams_answer_text_trgm",
+    "DROP INDEX IF EXISTS exams_question_explanation_trgm",
+    "DROP INDEX IF EXISTS exams_question_text_trgm",
+    "DROP INDEX IF EXISTS exams_question_search_vector_gin",
+    "DROP TEXT SEARCH CONFIGURATION IF EXISTS exam_spanish",
+]
+
+
+def setup_search(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in SEARCH_SETUP_SQL:
+        schema_editor.execute(sql)
+
+    Question = apps.get_model('exams', 'Question')
+    question_ids = list(Question.objects.values_list('id', flat=True))
+    for start in range(0, len(question_ids), 5000):
+        schema_editor.execute(UPDATE_SEARCH_VECTOR_SQL, [question_ids[start:start + 5000]])
+
+
+def teardown_search(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in SEARCH_TEARDOWN_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0006_alter_course_image_alter_exam_image_and_more'),
+    ]
+
+    operations = [
+        UnaccentExtension(),
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='question',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(setup_search, teardown_search),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.3 on 2026-10-18 05:31
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_question_count(apps, schema_editor):
+    Exam = apps.get_model('exams', 'Exam')
+    Question = apps.get_model('exams', 'Question')
+    counts = (
+        Question.objects.filter(exam=OuterRef('pk'))
+        .order_by()
+        .values('exam')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    Exam.objects.update(question_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0007_question_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam',
+            name='question_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Número de Preguntas'),
+        ),
+        migrations.RunPython(fill_question_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 05:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0008_exam_question_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam',
+            name='content_revision',
+            field=models.PositiveIntegerField(default=1, editable=False, verbose_name='Revisión del Contenido'),
+        ),
+    ]
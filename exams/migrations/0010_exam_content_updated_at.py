@@ -0,0 +1,47 @@
+# Generated by Django 5.1.3 on 2026-10-18 07:12
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+
+def fill_content_updated_at(apps, schema_editor):
+    Exam = apps.get_model('exams', 'Exam')
+    Question = apps.get_model('exams', 'Question')
+    Answer = apps.get_model('exams', 'Answer')
+    last_question = (
+        Question.objects.filter(exam=OuterRef('pk'))
+        .order_by()
+        .values('exam')
+        .annotate(last=Max('updated_at'))
+        .values('last')
+    )
+    last_answer = (
+        Answer.objects.filter(question__exam=OuterRef('pk'))
+        .order_by()
+        .values('question__exam')
+        .annotate(last=Max('updated_at'))
+        .values('last')
+    )
+    Exam.objects.update(content_updated_at=Greatest(
+        F('updated_at'),
+        Coalesce(Subquery(last_question), F('updated_at')),
+        Coalesce(Subquery(last_answer), F('updated_at')),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0009_exam_content_revision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam',
+            name='content_updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Última Modificación del Contenido'),
+        ),
+        migrations.RunPython(fill_content_updated_at, migrations.RunPython.noop),
+    ]
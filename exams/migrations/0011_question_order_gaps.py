@@ -0,0 +1,36 @@
+# Generated by Django 5.1.3 on 2026-10-18 08:02
+
+from django.db import migrations, models
+
+ORDER_GAP = 1024
+
+
+def spread_question_order(apps, schema_editor):
+    """Renumera las preguntas de cada tema por (order, id) con huecos de ORDER_GAP"""
+    Exam = apps.get_model('exams', 'Exam')
+    Question = apps.get_model('exams', 'Question')
+    for exam_id in Exam.objects.values_list('pk', flat=True).iterator():
+        changed = [
+            Question(pk=pk, order=position * ORDER_GAP)
+            for position, (pk, order) in enumerate(
+                Question.objects.filter(exam_id=exam_id).order_by('order', 'id').values_list('pk', 'order'),
+                start=1
+            )
+            if order != position * ORDER_GAP
+        ]
+        Question.objects.bulk_update(changed, ['order'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0010_exam_content_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['exam', 'order', 'id'], name='question_exam_order_idx'),
+        ),
+        migrations.RunPython(spread_question_order, migrations.RunPython.noop),
+    ]
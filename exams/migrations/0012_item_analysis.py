@@ -0,0 +1,47 @@
+# Generated by Django 5.1.3 on 2026-10-18 05:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0011_question_order_gaps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamAnalysis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('students', models.PositiveIntegerField(default=0, verbose_name='Estudiantes')),
+                ('questions', models.PositiveIntegerField(default=0, verbose_name='Preguntas')),
+                ('mean_score', models.FloatField(blank=True, null=True, verbose_name='Puntaje Promedio')),
+                ('score_std', models.FloatField(blank=True, null=True, verbose_name='Desviación Estándar')),
+                ('kr20', models.FloatField(blank=True, null=True, verbose_name='Confiabilidad (KR-20)')),
+                ('computed_at', models.DateTimeField(verbose_name='Fecha de Cálculo')),
+                ('exam', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='analysis', to='exams.exam', verbose_name='Tema')),
+            ],
+            options={
+                'verbose_name': 'Análisis de Tema',
+                'verbose_name_plural': 'Análisis de Temas',
+            },
+        ),
+        migrations.CreateModel(
+            name='QuestionAnalysis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('responses', models.PositiveIntegerField(default=0, verbose_name='Respuestas')),
+                ('p_value', models.FloatField(blank=True, null=True, verbose_name='Índice de Dificultad (p)')),
+                ('discrimination', models.FloatField(blank=True, null=True, verbose_name='Discriminación')),
+                ('distractors', models.JSONField(blank=True, default=list, verbose_name='Distractores')),
+                ('computed_at', models.DateTimeField(verbose_name='Fecha de Cálculo')),
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='analysis', to='exams.question', verbose_name='Pregunta')),
+            ],
+            options={
+                'verbose_name': 'Análisis de Pregunta',
+                'verbose_name_plural': 'Análisis de Preguntas',
+            },
+        ),
+    ]
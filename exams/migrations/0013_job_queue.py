@@ -0,0 +1,45 @@
+# Generated by Django 5.1.3 on 2026-10-18 05:53
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0012_item_analysis'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Tarea')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='Parámetros')),
+                ('key', models.CharField(blank=True, default='', max_length=200, verbose_name='Clave')),
+                ('status', models.CharField(choices=[('queued', 'En cola'), ('running', 'En ejecución'), ('done', 'Completada'), ('failed', 'Fallida')], default='queued', max_length=20, verbose_name='Estado')),
+                ('priority', models.SmallIntegerField(default=0, verbose_name='Prioridad')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Intentos')),
+                ('max_attempts', models.PositiveSmallIntegerField(default=5, verbose_name='Máximo de Intentos')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Ejecutar Desde')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Inicio')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Fin')),
+                ('worker', models.CharField(blank=True, default='', max_length=100, verbose_name='Worker')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='Resultado')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='Último Error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha de Actualización')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='jobs', to=settings.AUTH_USER_MODEL, verbose_name='Creada por')),
+            ],
+            options={
+                'verbose_name': 'Tarea en Segundo Plano',
+                'verbose_name_plural': 'Tareas en Segundo Plano',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(condition=models.Q(('status', 'queued')), fields=['-priority', 'run_at', 'id'], name='job_queue_idx'), models.Index(condition=models.Q(('status__in', ['queued', 'running'])), fields=['key'], name='job_pending_key_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.3 on 2026-10-18 05:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0013_job_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionSignature',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='exams.question', verbose_name='Pregunta')),
+                ('signature', models.BinaryField(verbose_name='Firma')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha de Actualización')),
+            ],
+            options={
+                'verbose_name': 'Firma de Pregunta',
+                'verbose_name_plural': 'Firmas de Preguntas',
+            },
+        ),
+        migrations.CreateModel(
+            name='QuestionBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.BigIntegerField(db_index=True, verbose_name='Cubeta')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lsh_buckets', to='exams.question', verbose_name='Pregunta')),
+            ],
+            options={
+                'verbose_name': 'Cubeta LSH',
+                'verbose_name_plural': 'Cubetas LSH',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0014_question_duplicate_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam',
+            name='shuffle_questions',
+            field=models.BooleanField(default=False, verbose_name='Orden Aleatorio de Preguntas'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0015_exam_shuffle_questions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Variantes de la Imagen'),
+        ),
+        migrations.AddField(
+            model_name='exam',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Variantes de la Imagen'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Variantes de la Imagen'),
+        ),
+    ]
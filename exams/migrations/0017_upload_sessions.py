@@ -0,0 +1,62 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:10
+
+import django.core.validators
+import django.db.models.deletion
+import exams.models
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0016_image_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exam',
+            name='pdf_file',
+            field=models.FileField(blank=True, null=True, upload_to='exams/pdfs/', validators=[django.core.validators.FileExtensionValidator(['pdf']), exams.models.validate_pdf_size], verbose_name='Archivo PDF'),
+        ),
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('pdf', 'PDF'), ('image', 'Imagen')], max_length=10, verbose_name='Tipo')),
+                ('filename', models.CharField(max_length=255, verbose_name='Nombre del Archivo')),
+                ('size', models.PositiveBigIntegerField(verbose_name='Tamaño')),
+                ('chunk_size', models.PositiveIntegerField(verbose_name='Tamaño de cada Parte')),
+                ('content_type', models.CharField(blank=True, default='', max_length=100, verbose_name='Tipo de Contenido')),
+                ('status', models.CharField(choices=[('uploading', 'Subiendo'), ('complete', 'Completa'), ('stored', 'Guardada'), ('failed', 'Fallida'), ('expired', 'Vencida')], default='uploading', max_length=20, verbose_name='Estado')),
+                ('target_model', models.CharField(blank=True, default='', max_length=100, verbose_name='Modelo Destino')),
+                ('target_id', models.PositiveBigIntegerField(blank=True, null=True, verbose_name='Id Destino')),
+                ('target_field', models.CharField(blank=True, default='', max_length=50, verbose_name='Campo Destino')),
+                ('stored_name', models.CharField(blank=True, default='', max_length=255, verbose_name='Archivo Guardado')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha de Actualización')),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL, verbose_name='Subido por')),
+            ],
+            options={
+                'verbose_name': 'Subida por Partes',
+                'verbose_name_plural': 'Subidas por Partes',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='UploadChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField(verbose_name='Número de Parte')),
+                ('data', models.BinaryField(verbose_name='Datos')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='exams.uploadsession', verbose_name='Subida')),
+            ],
+            options={
+                'verbose_name': 'Parte de Subida',
+                'verbose_name_plural': 'Partes de Subidas',
+                'unique_together': {('session', 'index')},
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:12
+
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+PDF_SEARCH_SETUP_SQL = [
+    "CREATE INDEX IF NOT EXISTS exams_exampdfpage_search_vector_gin "
+    "ON exams_exampdfpage USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS exams_exampdfpage_text_trgm "
+    "ON exams_exampdfpage USING gin (UPPER(text) gin_trgm_ops)",
+]
+
+PDF_SEARCH_TEARDOWN_SQL = [
+    "DROP INDEX IF EXISTS exams_exampdfpage_text_trgm",
+    "DROP INDEX IF EXISTS exams_exampdfpage_search_vector_gin",
+]
+
+
+def setup_pdf_search(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in PDF_SEARCH_SETUP_SQL:
+        schema_editor.execute(sql)
+
+
+def teardown_pdf_search(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in PDF_SEARCH_TEARDOWN_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0017_upload_sessions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam',
+            name='pdf_index',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Índice del PDF'),
+        ),
+        migrations.CreateModel(
+            name='ExamPdfPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page', models.PositiveIntegerField(verbose_name='Página')),
+                ('text', models.TextField(blank=True, default='', verbose_name='Texto')),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(editable=False, null=True)),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pdf_pages', to='exams.exam', verbose_name='Tema')),
+            ],
+            options={
+                'verbose_name': 'Página de PDF',
+                'verbose_name_plural': 'Páginas de PDF',
+                'ordering': ['exam', 'page'],
+                'unique_together': {('exam', 'page')},
+            },
+        ),
+        migrations.RunPython(setup_pdf_search, teardown_pdf_search),
+    ]
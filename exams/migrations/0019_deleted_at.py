@@ -0,0 +1,36 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:57
+
+from django.db import migrations, models
+
+
+def mark_pending_deletions(apps, schema_editor):
+    # Antes el borrado en segundo plano solo dejaba el curso o tema inactivo:
+    # se marcan los que tienen su tarea de borrado pendiente
+    Job = apps.get_model('exams', 'Job')
+    pending = Job.objects.filter(status__in=('queued', 'running'))
+    for model_name, task, field in (('Course', 'exams.delete_course', 'course_id'),
+                                    ('Exam', 'exams.delete_exam', 'exam_id')):
+        model = apps.get_model('exams', model_name)
+        for payload, created_at in pending.filter(name=task).values_list('payload', 'created_at'):
+            model.objects.filter(pk=payload.get(field), deleted_at__isnull=True).update(deleted_at=created_at)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0018_exam_pdf_pages'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, help_text='Se borrará en segundo plano. Vaciar el campo cancela el borrado.', null=True, verbose_name='Fecha de Eliminación'),
+        ),
+        migrations.AddField(
+            model_name='exam',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, help_text='Se borrará en segundo plano. Vaciar el campo cancela el borrado.', null=True, verbose_name='Fecha de Eliminación'),
+        ),
+        migrations.RunPython(mark_pending_deletions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 07:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0019_deleted_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Último Latido'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.3 on 2026-10-18 07:08
+
+import os
+
+import django.core.validators
+import exams.models
+import exams.storage
+from django.conf import settings
+from django.core.files.storage import storages
+from django.db import migrations, models
+
+
+def move_local_pdfs(apps, schema_editor):
+    # Con MEDIA_STORAGE=local los PDF estaban en MEDIA_ROOT, que serve_media
+    # entrega sin revisar la inscripción: se pasan al almacenamiento privado
+    if settings.MEDIA_STORAGE != 'local':
+        return
+    Exam = apps.get_model('exams', 'Exam')
+    public, private = storages['default'], storages['private']
+    names = Exam.objects.exclude(pdf_file='').exclude(pdf_file__isnull=True).values_list('pdf_file', flat=True)
+    for name in set(names):
+        if private.exists(name) or not public.exists(name):
+            continue
+        with public.open(name, 'rb') as source:
+            stored = private.save(name, source)
+        if stored != name:
+            Exam.objects.filter(pdf_file=name).update(pdf_file=stored)
+        os.remove(public.path(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0020_job_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exam',
+            name='pdf_file',
+            field=models.FileField(blank=True, null=True, storage=exams.storage.get_private_storage, upload_to='exams/pdfs/', validators=[django.core.validators.FileExtensionValidator(['pdf']), exams.models.validate_pdf_size], verbose_name='Archivo PDF'),
+        ),
+        migrations.RunPython(move_local_pdfs, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,13 @@
+import uuid
+
 from django.db import models
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import FileExtensionValidator
 from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from .storage import get_private_storage
 
 
 def validate_file_size(file):
@@ -12,6 +18,24 @@ def validate_file_size(file):
     return file
 
 
+def validate_pdf_size(file):
+    """Valida que el PDF no exceda UPLOAD_MAX_PDF_SIZE (los PDF grandes se suben por partes)"""
+    max_size_mb = settings.UPLOAD_MAX_PDF_SIZE / (1024 * 1024)
+    if file.size > settings.UPLOAD_MAX_PDF_SIZE:
+        raise ValidationError(f'El PDF no debe exceder {max_size_mb:.0f}MB. Tamaño actual: {file.size / (1024 * 1024):.2f}MB')
+    return file
+
+
+class CourseQuerySet(models.QuerySet):
+    def not_deleted(self):
+        """Cursos sin borrar (uno borrado queda marcado hasta que la tarea lo elimina)"""
+        return self.filter(deleted_at__isnull=True)
+
+    def active(self):
+        """Cursos visibles para los estudiantes: activos y sin borrar"""
+        return self.filter(is_active=True, deleted_at__isnull=True)
+
+
 class Course(models.Model):
     name = models.CharField(max_length=200, verbose_name='Nombre del Curso')
     description = models.TextField(verbose_name='Descripción', blank=True, null=True)
@@ -25,7 +49,14 @@ class Course(models.Model):
             validate_file_size
         ]
     )
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name='Variantes de la Imagen')
     is_active = models.BooleanField(default=True, verbose_name='Activo')
+    # Borrado pendiente de la tarea exams.delete_course; vaciarlo antes de que
+    # se ejecute cancela el borrado
+    deleted_at = models.DateTimeField(
+        null=True, blank=True, verbose_name='Fecha de Eliminación',
+        help_text='Se borrará en segundo plano. Vaciar el campo cancela el borrado.'
+    )
     created_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -35,6 +66,8 @@ class Course(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Fecha de Actualización')
 
+    objects = CourseQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Curso'
         verbose_name_plural = 'Cursos'
@@ -44,6 +77,18 @@ class Course(models.Model):
         return self.name
 
 
+class ExamQuerySet(models.QuerySet):
+    def not_deleted(self):
+        """Temas sin borrar de un curso sin borrar"""
+        return self.filter(deleted_at__isnull=True, course__deleted_at__isnull=True)
+
+    def active(self):
+        """Temas visibles para los estudiantes: activos y de un curso activo"""
+        return self.filter(
+            is_active=True, deleted_at__isnull=True, course__is_active=True, course__deleted_at__isnull=True
+        )
+
+
 class Exam(models.Model):
     course = models.ForeignKey(
         Course,
@@ -65,22 +110,38 @@ class Exam(models.Model):
             validate_file_size
         ]
     )
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name='Variantes de la Imagen')
+    # Sin URL pública: solo se entrega con la vista student_pdf_file
     pdf_file = models.FileField(
         upload_to='exams/pdfs/',
+        storage=get_private_storage,
         verbose_name='Archivo PDF',
         blank=True,
         null=True,
         validators=[
             FileExtensionValidator(['pdf']),
-            validate_file_size
+            validate_pdf_size
         ]
     )
+    # Archivo y hash SHA-256 del PDF cuyo texto está en ExamPdfPage (ver exams.pdf_index)
+    pdf_index = models.JSONField(default=dict, blank=True, editable=False, verbose_name='Índice del PDF')
     subject = models.CharField(max_length=100, verbose_name='Materia')
     total_marks = models.DecimalField(max_digits=5, decimal_places=2, verbose_name='Puntuación Total', default=0, null=True, blank=True)
     passing_marks = models.DecimalField(max_digits=5, decimal_places=2, verbose_name='Puntuación Mínima', default=0, null=True, blank=True)
     duration_minutes = models.IntegerField(verbose_name='Duración (minutos)', default=0, null=True, blank=True)
     exam_date = models.DateTimeField(verbose_name='Fecha del Tema', null=True, blank=True)
     is_active = models.BooleanField(default=True, verbose_name='Activo')
+    # Borrado pendiente de la tarea exams.delete_exam (ver Course.deleted_at)
+    deleted_at = models.DateTimeField(
+        null=True, blank=True, verbose_name='Fecha de Eliminación',
+        help_text='Se borrará en segundo plano. Vaciar el campo cancela el borrado.'
+    )
+    # Cada estudiante ve las preguntas en un orden propio (ver exams.shuffle)
+    shuffle_questions = models.BooleanField(default=False, verbose_name='Orden Aleatorio de Preguntas')
+    # Contadores mantenidos por exams.signals con actualizaciones F()
+    question_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Número de Preguntas')
+    content_revision = models.PositiveIntegerField(default=1, editable=False, verbose_name='Revisión del Contenido')
+    content_updated_at = models.DateTimeField(default=timezone.now, editable=False, verbose_name='Última Modificación del Contenido')
     created_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -90,6 +151,11 @@ class Exam(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Fecha de Actualización')
 
+    # Campos que solo se modifican desde exams.signals y exams.tasks
+    COUNTER_FIELDS = ('question_count', 'content_revision', 'content_updated_at', 'image_variants', 'pdf_index')
+
+    objects = ExamQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Tema'
         verbose_name_plural = 'Temas'
@@ -98,6 +164,42 @@ class Exam(models.Model):
     def __str__(self):
         return f"{self.title} - {self.course.name}"
 
+    def save(self, *args, **kwargs):
+        # Una instancia cargada antes de un cambio no debe sobrescribir los contadores
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+
+class ExamResultQuerySet(models.QuerySet):
+    def with_scores(self):
+        """
+        Une el tema y el estudiante y anota ``percentage`` y ``passed``
+        calculados en la base de datos (ver ExamResult.get_percentage/is_passed).
+        """
+        scored = models.Q(marks_obtained__isnull=False)
+        return self.select_related('exam', 'student').annotate(
+            percentage=models.Case(
+                models.When(
+                    scored & models.Q(exam__total_marks__gt=0),
+                    then=models.F('marks_obtained') * 100 / models.F('exam__total_marks'),
+                ),
+                default=models.Value(0),
+                output_field=models.DecimalField(max_digits=7, decimal_places=2),
+            ),
+            passed=models.Case(
+                models.When(
+                    scored & models.Q(marks_obtained__gte=models.F('exam__passing_marks')),
+                    then=models.Value(True),
+                ),
+                default=models.Value(False),
+                output_field=models.BooleanField(),
+            ),
+        )
+
 
 class ExamResult(models.Model):
     STATUS_CHOICES = (
@@ -146,6 +248,8 @@ class ExamResult(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Fecha de Actualización')
 
+    objects = ExamResultQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Resultado de Examen'
         verbose_name_plural = 'Resultados de Exámenes'
@@ -156,16 +260,33 @@ class ExamResult(models.Model):
         return f"{self.student.username} - {self.exam.title}"
 
     def is_passed(self):
+        # Calculado en la consulta por with_scores()
+        if hasattr(self, 'passed'):
+            return self.passed
         if self.marks_obtained is not None:
             return self.marks_obtained >= self.exam.passing_marks
         return False
 
     def get_percentage(self):
+        if hasattr(self, 'percentage'):
+            return self.percentage
         if self.marks_obtained is not None and self.exam.total_marks > 0:
             return (self.marks_obtained / self.exam.total_marks) * 100
         return 0
 
 
+class QuestionQuerySet(models.QuerySet):
+    def with_answers(self):
+        """Precarga las respuestas ordenadas (ver Question.primary_answer)"""
+        return self.prefetch_related(
+            models.Prefetch(
+                'answers',
+                queryset=Answer.objects.order_by('order', 'id'),
+                to_attr='prefetched_answers'
+            )
+        )
+
+
 class Question(models.Model):
     QUESTION_TYPE_CHOICES = (
         ('multiple_choice', 'Opción Múltiple'),
@@ -190,6 +311,7 @@ class Question(models.Model):
             validate_file_size
         ]
     )
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name='Variantes de la Imagen')
     question_type = models.CharField(
         max_length=20,
         choices=QUESTION_TYPE_CHOICES,
@@ -199,17 +321,32 @@ class Question(models.Model):
     marks = models.DecimalField(max_digits=5, decimal_places=2, verbose_name='Puntuación', default=1.0)
     order = models.IntegerField(verbose_name='Orden', default=0)
     explanation = models.TextField(verbose_name='Comentario/Explicación', blank=True, null=True)
+    # Índice de búsqueda (pregunta, respuestas y explicación), mantenido por exams.search
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Fecha de Actualización')
 
+    objects = QuestionQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Pregunta'
         verbose_name_plural = 'Preguntas'
         ordering = ['exam', 'order']
+        indexes = [
+            # Orden del tema y paginación por cursor sobre (order, id)
+            models.Index(fields=['exam', 'order', 'id'], name='question_exam_order_idx'),
+        ]
 
     def __str__(self):
         return f"{self.exam.title} - Pregunta {self.order}"
 
+    @property
+    def primary_answer(self):
+        """Respuesta principal de la pregunta; usa la precarga de with_answers() si existe"""
+        if hasattr(self, 'prefetched_answers'):
+            return self.prefetched_answers[0] if self.prefetched_answers else None
+        return self.answers.order_by('order', 'id').first()
+
 
 class Answer(models.Model):
     question = models.ForeignKey(
@@ -297,3 +434,258 @@ class CourseEnrollment(models.Model):
 
     def __str__(self):
         return f"{self.student.username} - {self.course.name}"
+
+
+class ExamAnalysis(models.Model):
+    """Resumen del análisis de ítems de un tema (ver exams.analytics)"""
+    exam = models.OneToOneField(
+        Exam,
+        on_delete=models.CASCADE,
+        related_name='analysis',
+        verbose_name='Tema'
+    )
+    students = models.PositiveIntegerField(default=0, verbose_name='Estudiantes')
+    questions = models.PositiveIntegerField(default=0, verbose_name='Preguntas')
+    mean_score = models.FloatField(null=True, blank=True, verbose_name='Puntaje Promedio')
+    score_std = models.FloatField(null=True, blank=True, verbose_name='Desviación Estándar')
+    kr20 = models.FloatField(null=True, blank=True, verbose_name='Confiabilidad (KR-20)')
+    computed_at = models.DateTimeField(verbose_name='Fecha de Cálculo')
+
+    class Meta:
+        verbose_name = 'Análisis de Tema'
+        verbose_name_plural = 'Análisis de Temas'
+
+    def __str__(self):
+        return f"Análisis - {self.exam.title}"
+
+
+class QuestionAnalysis(models.Model):
+    """Estadísticas de una pregunta sobre los envíos calificados del tema"""
+    question = models.OneToOneField(
+        Question,
+        on_delete=models.CASCADE,
+        related_name='analysis',
+        verbose_name='Pregunta'
+    )
+    responses = models.PositiveIntegerField(default=0, verbose_name='Respuestas')
+    # Proporción de estudiantes que respondieron correctamente (dificultad)
+    p_value = models.FloatField(null=True, blank=True, verbose_name='Índice de Dificultad (p)')
+    # Correlación punto-biserial con el puntaje del resto de la prueba
+    discrimination = models.FloatField(null=True, blank=True, verbose_name='Discriminación')
+    # [{"answer": id, "count": n, "proportion": x, "mean_score": y, "is_correct": bool}, ...]
+    distractors = models.JSONField(default=list, blank=True, verbose_name='Distractores')
+    computed_at = models.DateTimeField(verbose_name='Fecha de Cálculo')
+
+    # Umbrales para marcar preguntas a revisar
+    EASY_THRESHOLD = 0.9
+    HARD_THRESHOLD = 0.2
+    LOW_DISCRIMINATION = 0.1
+
+    class Meta:
+        verbose_name = 'Análisis de Pregunta'
+        verbose_name_plural = 'Análisis de Preguntas'
+
+    def __str__(self):
+        return f"Análisis - {self.question}"
+
+    @property
+    def flag(self):
+        """Motivo para revisar la pregunta, o None"""
+        if self.p_value is None:
+            return None
+        if self.p_value >= self.EASY_THRESHOLD:
+            return 'Muy fácil'
+        if self.p_value <= self.HARD_THRESHOLD:
+            return 'Muy difícil'
+        if self.discrimination is not None and self.discrimination < self.LOW_DISCRIMINATION:
+            return 'Discrimina poco'
+        return None
+
+
+class Job(models.Model):
+    """Tarea en segundo plano (ver exams.jobs y el comando runworker)"""
+    STATUS_CHOICES = (
+        ('queued', 'En cola'),
+        ('running', 'En ejecución'),
+        ('done', 'Completada'),
+        ('failed', 'Fallida'),
+    )
+
+    name = models.CharField(max_length=100, verbose_name='Tarea')
+    payload = models.JSONField(default=dict, blank=True, verbose_name='Parámetros')
+    # Evita encolar dos veces la misma tarea mientras la primera sigue pendiente
+    key = models.CharField(max_length=200, blank=True, default='', verbose_name='Clave')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued', verbose_name='Estado')
+    priority = models.SmallIntegerField(default=0, verbose_name='Prioridad')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='Intentos')
+    max_attempts = models.PositiveSmallIntegerField(default=5, verbose_name='Máximo de Intentos')
+    run_at = models.DateTimeField(default=timezone.now, verbose_name='Ejecutar Desde')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='Inicio')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Fin')
+    # El worker lo renueva mientras ejecuta la tarea; si deja de hacerlo por
+    # más de JOB_STALE_AFTER la tarea se considera abandonada
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name='Último Latido')
+    worker = models.CharField(max_length=100, blank=True, default='', verbose_name='Worker')
+    result = models.JSONField(null=True, blank=True, verbose_name='Resultado')
+    last_error = models.TextField(blank=True, default='', verbose_name='Último Error')
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        related_name='jobs',
+        verbose_name='Creada por',
+        null=True,
+        blank=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Fecha de Actualización')
+
+    class Meta:
+        verbose_name = 'Tarea en Segundo Plano'
+        verbose_name_plural = 'Tareas en Segundo Plano'
+        ordering = ['-created_at']
+        indexes = [
+            # Índice parcial con solo las tareas en cola, en el orden en que se toman
+            models.Index(
+                fields=['-priority', 'run_at', 'id'],
+                name='job_queue_idx',
+                condition=models.Q(status='queued'),
+            ),
+            models.Index(
+                fields=['key'],
+                name='job_pending_key_idx',
+                condition=models.Q(status__in=['queued', 'running']),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.get_status_display()})"
+
+
+class QuestionSignature(models.Model):
+    """Firma MinHash del texto de una pregunta (ver exams.duplicates)"""
+    question = models.OneToOneField(
+        Question,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='signature',
+        verbose_name='Pregunta'
+    )
+    # NUM_PERM enteros uint32 empaquetados
+    signature = models.BinaryField(verbose_name='Firma')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Fecha de Actualización')
+
+    class Meta:
+        verbose_name = 'Firma de Pregunta'
+        verbose_name_plural = 'Firmas de Preguntas'
+
+    def __str__(self):
+        return f"Firma - {self.question_id}"
+
+
+class QuestionBucket(models.Model):
+    """Cubeta LSH de una banda de la firma: preguntas en la misma cubeta son candidatas a duplicado"""
+    question = models.ForeignKey(
+        Question,
+        on_delete=models.CASCADE,
+        related_name='lsh_buckets',
+        verbose_name='Pregunta'
+    )
+    bucket = models.BigIntegerField(db_index=True, verbose_name='Cubeta')
+
+    class Meta:
+        verbose_name = 'Cubeta LSH'
+        verbose_name_plural = 'Cubetas LSH'
+
+    def __str__(self):
+        return f"{self.question_id} - {self.bucket}"
+
+
+class ExamPdfPage(models.Model):
+    """Texto de una página del PDF de un tema, para la búsqueda por curso"""
+    exam = models.ForeignKey(
+        Exam,
+        on_delete=models.CASCADE,
+        related_name='pdf_pages',
+        verbose_name='Tema'
+    )
+    page = models.PositiveIntegerField(verbose_name='Página')
+    text = models.TextField(blank=True, default='', verbose_name='Texto')
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        verbose_name = 'Página de PDF'
+        verbose_name_plural = 'Páginas de PDF'
+        ordering = ['exam', 'page']
+        unique_together = ('exam', 'page')
+
+    def __str__(self):
+        return f"{self.exam.title} - página {self.page}"
+
+
+class UploadSession(models.Model):
+    """Subida por partes (reanudable) de un PDF o una imagen (ver exams.uploads)"""
+    KIND_CHOICES = (
+        ('pdf', 'PDF'),
+        ('image', 'Imagen'),
+    )
+    STATUS_CHOICES = (
+        ('uploading', 'Subiendo'),
+        ('complete', 'Completa'),
+        ('stored', 'Guardada'),
+        ('failed', 'Fallida'),
+        ('expired', 'Vencida'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, verbose_name='Tipo')
+    filename = models.CharField(max_length=255, verbose_name='Nombre del Archivo')
+    size = models.PositiveBigIntegerField(verbose_name='Tamaño')
+    chunk_size = models.PositiveIntegerField(verbose_name='Tamaño de cada Parte')
+    # Tipo detectado por los primeros bytes del archivo (no el que declara el navegador)
+    content_type = models.CharField(max_length=100, blank=True, default='', verbose_name='Tipo de Contenido')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading', verbose_name='Estado')
+    # Objeto y campo que reciben el archivo al terminar (p. ej. exams.exam, 12, pdf_file)
+    target_model = models.CharField(max_length=100, blank=True, default='', verbose_name='Modelo Destino')
+    target_id = models.PositiveBigIntegerField(null=True, blank=True, verbose_name='Id Destino')
+    target_field = models.CharField(max_length=50, blank=True, default='', verbose_name='Campo Destino')
+    stored_name = models.CharField(max_length=255, blank=True, default='', verbose_name='Archivo Guardado')
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions',
+        verbose_name='Subido por'
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Fecha de Actualización')
+
+    class Meta:
+        verbose_name = 'Subida por Partes'
+        verbose_name_plural = 'Subidas por Partes'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.filename} ({self.get_status_display()})"
+
+    @property
+    def chunk_count(self):
+        return max((self.size + self.chunk_size - 1) // self.chunk_size, 1)
+
+
+class UploadChunk(models.Model):
+    """Parte recibida de una subida; se borran al guardar el archivo en el almacenamiento"""
+    session = models.ForeignKey(
+        UploadSession,
+        on_delete=models.CASCADE,
+        related_name='chunks',
+        verbose_name='Subida'
+    )
+    index = models.PositiveIntegerField(verbose_name='Número de Parte')
+    data = models.BinaryField(verbose_name='Datos')
+
+    class Meta:
+        verbose_name = 'Parte de Subida'
+        verbose_name_plural = 'Partes de Subidas'
+        unique_together = ('session', 'index')
+
+    def __str__(self):
+        return f"{self.session_id} - {self.index}"
@@ -0,0 +1,181 @@
+"""
+Orden de las preguntas de un tema con huecos (``ORDER_GAP``).
+
+Las preguntas nuevas se agregan al final con ``último orden + ORDER_GAP`` bajo
+un bloqueo de la fila del tema, así que dos administradores que agregan
+preguntas a la vez no generan órdenes repetidos. Al reordenar, las preguntas
+que no se movieron conservan su orden y las movidas reciben un valor dentro
+del hueco entre sus vecinas: mover una pregunta actualiza una sola fila.
+Cuando un hueco se agota, o el grupo tiene órdenes repetidos, primero se
+vuelve a espaciar todo el tema (``compact_question_order``, también como
+comando).
+"""
+from bisect import bisect_left
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q
+
+from .models import Exam, Question
+from .signals import exam_content_changed
+
+ORDER_GAP = 1024
+MAX_REORDER = 500
+
+
+def _lock_exam(exam):
+    # En SQLite select_for_update no hace nada: las escrituras ya son serializadas
+    Exam.objects.select_for_update().filter(pk=exam.pk).values_list('pk').first()
+
+
+def next_question_order(exam):
+    """
+    Devuelve el orden para una pregunta nueva al final del tema.
+
+    Debe llamarse dentro de ``transaction.atomic``: bloquea el tema hasta
+    el final de la transacción para que el orden no se repita.
+    """
+    _lock_exam(exam)
+    last = exam.questions.aggregate(last=Max('order'))['last']
+    return (last or 0) + ORDER_GAP
+
+
+def _stable_positions(orders):
+    """Índices de la subsecuencia creciente más larga de ``orders`` (las filas que no se mueven)"""
+    tails = []
+    tails_index = []
+    previous = [None] * len(orders)
+    for index, value in enumerate(orders):
+        position = bisect_left(tails, value)
+        if position == len(tails):
+            tails.append(value)
+            tails_index.append(index)
+        else:
+            tails[position] = value
+            tails_index[position] = index
+        previous[index] = tails_index[position - 1] if position else None
+
+    stable = set()
+    index = tails_index[-1] if tails_index else None
+    while index is not None:
+        stable.add(index)
+        index = previous[index]
+    return stable
+
+
+def _interpolate(orders, stable, low, high):
+    """
+    Asigna a las filas movidas valores entre sus vecinas estables.
+
+    ``low`` y ``high`` son los límites exclusivos del grupo. Devuelve la
+    lista de órdenes nuevos o None si algún hueco no alcanza.
+    """
+    new_orders = list(orders)
+    index = 0
+    while index < len(orders):
+        if index in stable:
+            index += 1
+            continue
+        start = index
+        while index < len(orders) and index not in stable:
+            index += 1
+        lower = new_orders[start - 1] if start > 0 else low
+        upper = orders[index] if index < len(orders) else high
+        count = index - start
+        span = upper - lower
+        if span <= count:
+            return None
+        for offset in range(count):
+            new_orders[start + offset] = lower + (offset + 1) * span // (count + 1)
+    return new_orders
+
+
+def _group_orders(exam, question_ids):
+    """
+    Órdenes actuales del grupo y, en una consulta, las preguntas de fuera del
+    grupo dentro de su rango (``inside``), con su mismo orden en los extremos
+    (``ties``) y las vecinas (``before`` y ``after``).
+    """
+    current = dict(exam.questions.filter(pk__in=question_ids).values_list('pk', 'order'))
+    if len(current) != len(question_ids):
+        raise ValueError('Algunas preguntas no pertenecen a este tema.')
+    first, last = min(current.values()), max(current.values())
+    around = exam.questions.exclude(pk__in=question_ids).aggregate(
+        inside=Count('pk', filter=Q(order__gt=first, order__lt=last)),
+        ties=Count('pk', filter=Q(order__in=(first, last))),
+        before=Max('order', filter=Q(order__lt=first)),
+        after=Min('order', filter=Q(order__gt=last)),
+    )
+    return current, around
+
+
+def _new_orders(question_ids, current, around):
+    """Órdenes nuevos del grupo dentro de los huecos, o None si alguno no alcanza"""
+    orders = [current[pk] for pk in question_ids]
+    # Límites del grupo: las preguntas vecinas fuera de él (o un hueco
+    # completo si el grupo está al principio o al final del tema)
+    low = around['before'] if around['before'] is not None else min(orders) - ORDER_GAP
+    high = around['after'] if around['after'] is not None else max(orders) + ORDER_GAP
+    return _interpolate(orders, _stable_positions(orders), low, high)
+
+
+def reorder_questions(exam, question_ids):
+    """
+    Reordena un grupo de preguntas del tema según ``question_ids``.
+
+    El grupo debe ser contiguo (normalmente la página visible) y sigue
+    ocupando el mismo rango de posiciones, así que el resto del tema no
+    cambia. Devuelve el número de preguntas actualizadas; lanza ValueError
+    si los ids no son válidos o el grupo no es contiguo.
+    """
+    question_ids = [int(pk) for pk in question_ids]
+    if len(set(question_ids)) != len(question_ids):
+        raise ValueError('La lista contiene preguntas repetidas.')
+    if len(question_ids) > MAX_REORDER:
+        raise ValueError(f'No se pueden reordenar más de {MAX_REORDER} preguntas a la vez.')
+
+    with transaction.atomic():
+        _lock_exam(exam)
+        compacted = 0
+        current, around = _group_orders(exam, question_ids)
+        if around['ties'] or len(set(current.values())) != len(current):
+            # Con órdenes repetidos el grupo no tiene posiciones propias: se
+            # numera el tema según el orden visible (order, id)
+            compacted = compact_question_order(exam)
+            current, around = _group_orders(exam, question_ids)
+        if around['inside']:
+            raise ValueError('Las preguntas a reordenar deben ser consecutivas en el tema.')
+
+        new_orders = _new_orders(question_ids, current, around)
+        if new_orders is None:
+            # Hueco agotado: tras volver a espaciar el tema siempre hay lugar
+            # (cada hueco mide ORDER_GAP y el grupo tiene como mucho MAX_REORDER)
+            compacted += compact_question_order(exam)
+            current, around = _group_orders(exam, question_ids)
+            new_orders = _new_orders(question_ids, current, around)
+
+        changed = [
+            Question(pk=pk, order=order)
+            for pk, order in zip(question_ids, new_orders)
+            if current[pk] != order
+        ]
+        if changed:
+            Question.objects.bulk_update(changed, ['order'])
+            exam_content_changed([exam.pk])
+    return compacted + len(changed)
+
+
+def compact_question_order(exam):
+    """Vuelve a numerar las preguntas del tema con ``ORDER_GAP`` de separación"""
+    with transaction.atomic():
+        _lock_exam(exam)
+        changed = [
+            Question(pk=pk, order=position * ORDER_GAP)
+            for position, (pk, order) in enumerate(
+                exam.questions.order_by('order', 'id').values_list('pk', 'order'), start=1
+            )
+            if order != position * ORDER_GAP
+        ]
+        if changed:
+            Question.objects.bulk_update(changed, ['order'], batch_size=1000)
+            exam_content_changed([exam.pk])
+    return len(changed)
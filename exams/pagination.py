@@ -0,0 +1,224 @@
+"""
+Paginación por cursor (keyset).
+
+En lugar de ``OFFSET`` cada página se pide con una condición sobre las
+columnas de ordenamiento de la última fila vista, así que el costo de una
+página no depende de su posición. El total se pasa desde fuera (contador
+desnormalizado) o se calcula una sola vez y viaja dentro del cursor.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+NEXT = 'n'
+PREVIOUS = 'p'
+LAST = 'l'
+
+
+def encode_cursor(data):
+    raw = json.dumps(data, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decodifica un cursor; devuelve None si es inválido"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(data, dict) or data.get('d') not in (NEXT, PREVIOUS, LAST):
+        return None
+    for name in ('i', 't'):
+        if name in data and not (isinstance(data[name], int) and data[name] >= 0):
+            return None
+    if 'k' in data and not isinstance(data['k'], list):
+        return None
+    return data
+
+
+class KeysetPaginator:
+    """
+    Paginador por cursor sobre un queryset.
+
+    ``ordering`` es la lista de campos de ordenamiento (con ``-`` para orden
+    descendente); el último debe ser único (normalmente ``id``). ``count``
+    puede ser un entero o una función que devuelva el total.
+    """
+
+    def __init__(self, queryset, per_page, ordering=('id',), count=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = list(ordering)
+        self._count = count
+
+    def get_page(self, cursor=None):
+        cursor_data = decode_cursor(cursor)
+        if cursor_data and len(cursor_data.get('k') or []) not in (0, len(self.ordering)):
+            cursor_data = None
+        return KeysetPage(self, cursor_data)
+
+    def count_for(self, cursor_data):
+        if self._count is not None and not callable(self._count):
+            return self._count
+        if cursor_data and cursor_data.get('t') is not None:
+            return cursor_data['t']
+        if callable(self._count):
+            return self._count()
+        return self.queryset.count()
+
+    def _fields(self, reverse=False):
+        for field in self.ordering:
+            descending = field.startswith('-')
+            if reverse:
+                descending = not descending
+            yield field.lstrip('-'), descending
+
+    def _ordered(self, reverse=False):
+        return self.queryset.order_by(*[
+            f'-{name}' if descending else name
+            for name, descending in self._fields(reverse)
+        ])
+
+    def _after(self, values, reverse=False):
+        """Condición 'fila posterior a values' según el ordenamiento"""
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self._fields(reverse), values):
+            lookup = 'lt' if descending else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def _key(self, obj):
+        return [getattr(obj, name) for name, _ in self._fields()]
+
+    def fetch(self, cursor_data):
+        """Devuelve (filas, hay_anteriores, hay_siguientes, índice_inicial)"""
+        direction = cursor_data['d'] if cursor_data else NEXT
+        start = cursor_data.get('i', 1) if cursor_data else 1
+
+        try:
+            return self._fetch(cursor_data, direction, start)
+        except (ValueError, TypeError, ValidationError):
+            # Cursor manipulado con valores de otro tipo: volver al inicio
+            return self._fetch(None, NEXT, 1)
+
+    def _fetch(self, cursor_data, direction, start):
+        per_page = self.per_page
+        if direction == NEXT:
+            queryset = self._ordered()
+            if cursor_data and cursor_data.get('k'):
+                queryset = queryset.filter(self._after(cursor_data['k']))
+            rows = list(queryset[:per_page + 1])
+            has_next = len(rows) > per_page
+            rows = rows[:per_page]
+            has_previous = bool(cursor_data and cursor_data.get('k'))
+            return rows, has_previous, has_next, start
+
+        queryset = self._ordered(reverse=True)
+        if direction == PREVIOUS:
+            queryset = queryset.filter(self._after(cursor_data.get('k') or [], reverse=True))
+            limit = per_page
+        else:
+            # La última página contiene el resto, para que las páginas queden alineadas
+            total = self.count_for(cursor_data)
+            limit = total % per_page or per_page
+        rows = list(queryset[:limit + 1])
+        has_previous = len(rows) > limit
+        rows = rows[:limit][::-1]
+        if direction == PREVIOUS and not has_previous:
+            if len(rows) < limit:
+                # Se llegó al inicio con una página incompleta: devolver la primera completa
+                return self._fetch(None, NEXT, 1)
+            start = 1
+        if direction == LAST:
+            start = max(total - len(rows) + 1, 1)
+        return rows, has_previous, direction == PREVIOUS, start
+
+
+class KeysetPage:
+    """Página de resultados; la consulta se ejecuta al primer acceso"""
+
+    def __init__(self, paginator, cursor_data):
+        self.paginator = paginator
+        self.cursor_data = cursor_data
+        self._loaded = False
+
+    def _load(self):
+        if self._loaded:
+            return
+        rows, has_previous, has_next, start = self.paginator.fetch(self.cursor_data)
+        self.object_list = rows
+        self._has_previous = has_previous
+        self._has_next = has_next
+        self._start = start if rows else 0
+        self._loaded = True
+
+    @property
+    def count(self):
+        if not hasattr(self, '_total'):
+            self._total = self.paginator.count_for(self.cursor_data)
+        return self._total
+
+    def __iter__(self):
+        self._load()
+        return iter(self.object_list)
+
+    def __len__(self):
+        self._load()
+        return len(self.object_list)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def has_next(self):
+        self._load()
+        return self._has_next
+
+    def has_previous(self):
+        self._load()
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def start_index(self):
+        self._load()
+        return self._start
+
+    def end_index(self):
+        self._load()
+        return self._start + len(self.object_list) - 1 if self.object_list else 0
+
+    def number(self):
+        """Número de la página actual (calculado a partir de la posición)"""
+        return max((self.end_index() + self.paginator.per_page - 1) // self.paginator.per_page, 1)
+
+    def num_pages(self):
+        return max((self.count + self.paginator.per_page - 1) // self.paginator.per_page, 1)
+
+    def _cursor(self, direction, obj=None, start=None):
+        data = {'d': direction, 't': self.count}
+        if obj is not None:
+            data['k'] = self.paginator._key(obj)
+        if start is not None:
+            data['i'] = max(start, 1)
+        return encode_cursor(data)
+
+    def next_cursor(self):
+        if not self.has_next():
+            return None
+        return self._cursor(NEXT, self.object_list[-1], self.end_index() + 1)
+
+    def previous_cursor(self):
+        if not self.has_previous():
+            return None
+        return self._cursor(PREVIOUS, self.object_list[0], self.start_index() - self.paginator.per_page)
+
+    def last_cursor(self):
+        return self._cursor(LAST)
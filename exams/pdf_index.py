@@ -0,0 +1,107 @@
+"""
+Extracción del texto de los PDF de los temas para la búsqueda por curso.
+
+Al guardar un tema con un PDF distinto del indexado se encola la tarea
+``exams.index_pdf``, que lee el archivo por bloques calculando su SHA-256 y,
+solo si el contenido cambió, extrae el texto de cada página con ``pypdf``
+(Python puro) y reemplaza las filas de ``ExamPdfPage`` del tema. Volver a
+subir el mismo PDF, o guardarlo en otro almacenamiento, solo actualiza
+``Exam.pdf_index``.
+
+``Exam.pdf_index`` guarda ``{"source": nombre, "sha256": hash, "pages": n}``.
+"""
+import hashlib
+import logging
+import tempfile
+
+from django.db import transaction
+from pypdf import PdfReader
+
+from .jobs import enqueue
+from .models import Exam, ExamPdfPage
+from .search import refresh_pdf_search_vectors
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE = 1024 * 1024
+# El PDF se copia a memoria hasta este tamaño y a un archivo temporal si es mayor
+SPOOL_SIZE = 16 * 1024 * 1024
+MAX_PAGE_TEXT = 20000
+INSERT_BATCH_SIZE = 500
+
+
+def pdf_index_is_current(exam):
+    return bool(exam.pdf_file) and (exam.pdf_index or {}).get('source') == exam.pdf_file.name
+
+
+def queue_pdf_index(exam, force=False):
+    """Encola la extracción del texto si el PDF del tema cambió"""
+    if not exam.pdf_file and not exam.pdf_index:
+        return None
+    if exam.pdf_file and pdf_index_is_current(exam) and not force:
+        return None
+    return enqueue('exams.index_pdf', key=f'index_pdf:{exam.pk}', exam_id=exam.pk, force=force)
+
+
+def extract_pages(source):
+    """Devuelve el texto de cada página del PDF (una página ilegible queda vacía)"""
+    reader = PdfReader(source)
+    pages = []
+    for number, page in enumerate(reader.pages, start=1):
+        try:
+            text = page.extract_text() or ''
+        except Exception:
+            logger.warning('No se pudo extraer el texto de la página %s', number, exc_info=True)
+            text = ''
+        # PostgreSQL no admite el carácter NUL en columnas de texto
+        pages.append(' '.join(text.replace('\x00', '').split())[:MAX_PAGE_TEXT])
+    return pages
+
+
+def index_exam_pdf(exam_id, force=False):
+    """
+    Actualiza las páginas indexadas del PDF del tema. Devuelve el nuevo
+    ``pdf_index`` (con ``changed`` si se volvieron a extraer las páginas) o
+    None si el tema no existe.
+    """
+    exam = Exam.objects.filter(pk=exam_id).only('pk', 'pdf_file', 'pdf_index').first()
+    if exam is None:
+        return None
+    if not exam.pdf_file:
+        with transaction.atomic():
+            ExamPdfPage.objects.filter(exam_id=exam_id).delete()
+            Exam.objects.filter(pk=exam_id).update(pdf_index={})
+        return {}
+
+    name = exam.pdf_file.name
+    previous = exam.pdf_index or {}
+    with exam.pdf_file.storage.open(name, 'rb') as source, \
+            tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as copy:
+        digest = hashlib.sha256()
+        for chunk in source.chunks(READ_CHUNK_SIZE):
+            digest.update(chunk)
+            copy.write(chunk)
+        sha256 = digest.hexdigest()
+
+        if sha256 == previous.get('sha256') and not force:
+            # Mismo contenido con otro nombre: las páginas siguen valiendo
+            index = {'source': name, 'sha256': sha256, 'pages': previous.get('pages', 0)}
+            Exam.objects.filter(pk=exam_id, pdf_file=name).update(pdf_index=index)
+            return dict(index, changed=False)
+
+        copy.seek(0)
+        pages = extract_pages(copy)
+
+    index = {'source': name, 'sha256': sha256, 'pages': len(pages)}
+    with transaction.atomic():
+        # Si el PDF volvió a cambiar mientras se extraía, lo indexa la tarea siguiente
+        if not Exam.objects.filter(pk=exam_id, pdf_file=name).update(pdf_index=index):
+            return None
+        ExamPdfPage.objects.filter(exam_id=exam_id).delete()
+        ExamPdfPage.objects.bulk_create(
+            [ExamPdfPage(exam_id=exam_id, page=number, text=text)
+             for number, text in enumerate(pages, start=1) if text],
+            batch_size=INSERT_BATCH_SIZE,
+        )
+        refresh_pdf_search_vectors(exam_id)
+    return dict(index, changed=True)
@@ -0,0 +1,174 @@
+"""
+Búsqueda de preguntas.
+
+En PostgreSQL se usa la columna ``Question.search_vector`` (tsvector con la
+configuración ``exam_spanish``: español sin acentos) combinada con índices
+trigram GIN para coincidencias parciales. En otros motores (SQLite en
+desarrollo y tests) se usa un filtro ``icontains`` con un ranking simple.
+"""
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import Case, Exists, F, IntegerField, OuterRef, Q, Value, When
+from django.db.models.functions import Cast, Coalesce
+
+SEARCH_CONFIG = 'exam_spanish'
+RANK_SCALE = 1000000
+SEARCH_ORDERING = ('-search_rank', 'order', 'id')
+
+# Pesos de cada campo en el tsvector: pregunta > respuesta > explicación
+UPDATE_SEARCH_VECTOR_SQL = """
+    UPDATE exams_question AS q
+    SET search_vector =
+        setweight(to_tsvector('{config}', coalesce(q.question_text, '')), 'A') ||
+        setweight(to_tsvector('{config}', coalesce((
+            SELECT string_agg(a.answer_text, ' ')
+            FROM exams_answer AS a
+            WHERE a.question_id = q.id
+        ), '')), 'B') ||
+        setweight(to_tsvector('{config}', coalesce(q.explanation, '')), 'C')
+    WHERE q.id = ANY(%s)
+""".format(config=SEARCH_CONFIG)
+
+UPDATE_PDF_SEARCH_VECTOR_SQL = """
+    UPDATE exams_exampdfpage
+    SET search_vector = to_tsvector('{config}', text)
+    WHERE exam_id = %s
+""".format(config=SEARCH_CONFIG)
+
+PDF_SNIPPET_RADIUS = 120
+
+
+def uses_full_text_search():
+    """Indica si la base de datos actual soporta la búsqueda de texto completo"""
+    return connection.vendor == 'postgresql'
+
+
+def refresh_search_vectors(question_ids):
+    """Recalcula el search_vector de las preguntas indicadas en una sola consulta"""
+    question_ids = [pk for pk in question_ids if pk is not None]
+    if not question_ids or not uses_full_text_search():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(UPDATE_SEARCH_VECTOR_SQL, [question_ids])
+
+
+def refresh_pdf_search_vectors(exam_id):
+    """Recalcula el search_vector de las páginas del PDF de un tema"""
+    if not uses_full_text_search():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(UPDATE_PDF_SEARCH_VECTOR_SQL, [exam_id])
+
+
+def search_questions(questions, query):
+    """
+    Filtra y ordena por relevancia un queryset de preguntas.
+
+    Devuelve el queryset anotado con ``search_rank`` (entero, mayor es más
+    relevante) y ordenado por relevancia, orden de la pregunta e id.
+    """
+    from .models import Answer
+
+    query = (query or '').strip()
+    if not query:
+        return questions
+
+    answer_match = Exists(
+        Answer.objects.filter(question=OuterRef('pk'), answer_text__icontains=query)
+    )
+    substring_match = (
+        Q(question_text__icontains=query)
+        | Q(explanation__icontains=query)
+        | answer_match
+    )
+
+    if uses_full_text_search():
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+        # El ranking se guarda como entero para poder usarlo en cursores de paginación
+        questions = questions.filter(Q(search_vector=search_query) | substring_match).annotate(
+            search_rank=Cast(
+                Coalesce(SearchRank(F('search_vector'), search_query), Value(0.0)) * RANK_SCALE,
+                output_field=IntegerField(),
+            )
+        )
+    else:
+        questions = questions.filter(substring_match).annotate(
+            search_rank=Case(
+                When(question_text__icontains=query, then=Value(RANK_SCALE)),
+                When(answer_match, then=Value(RANK_SCALE * 4 // 10)),
+                default=Value(RANK_SCALE * 2 // 10),
+                output_field=IntegerField(),
+            )
+        )
+
+    return questions.order_by(*SEARCH_ORDERING)
+
+
+def search_pdf_pages(pages, query):
+    """
+    Filtra y ordena por relevancia un queryset de páginas de PDF
+    (``ExamPdfPage``), anotado con ``search_rank`` como search_questions.
+    """
+    query = (query or '').strip()
+    if not query:
+        return pages.none()
+
+    substring_match = Q(text__icontains=query)
+    if uses_full_text_search():
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+        pages = pages.filter(Q(search_vector=search_query) | substring_match).annotate(
+            search_rank=Cast(
+                Coalesce(SearchRank(F('search_vector'), search_query), Value(0.0)) * RANK_SCALE,
+                output_field=IntegerField(),
+            )
+        )
+    else:
+        pages = pages.filter(substring_match).annotate(
+            search_rank=Value(RANK_SCALE, output_field=IntegerField())
+        )
+    return pages.order_by('-search_rank', 'exam_id', 'page')
+
+
+def _fold(text):
+    """Minúsculas y sin acentos, conservando la longitud (cada carácter da uno)"""
+    return ''.join((unicodedata.normalize('NFD', char)[:1].lower() or ' ')[:1] for char in text)
+
+
+def pdf_snippet(text, query, radius=PDF_SNIPPET_RADIUS):
+    """
+    Fragmento del texto alrededor de la primera coincidencia de la búsqueda,
+    como lista de ``(texto, coincide)`` para resaltar en la plantilla.
+    """
+    text = ' '.join(text.split())
+    folded = _fold(text)
+    terms = sorted({term for term in _fold(query).split() if len(term) > 1}, key=len, reverse=True)
+    found = [folded.find(term) for term in terms]
+    first = min([position for position in found if position >= 0], default=0)
+
+    start = max(first - radius, 0)
+    end = min(first + radius, len(text))
+    if start:
+        start = text.find(' ', start, first) + 1 or start
+    segments = []
+    position = start
+    pattern = '|'.join(re.escape(term) for term in terms)
+    if pattern:
+        for match in re.finditer(pattern, folded[start:end]):
+            match_start, match_end = start + match.start(), start + match.end()
+            if match_start > position:
+                segments.append((text[position:match_start], False))
+            segments.append((text[match_start:match_end], True))
+            position = match_end
+    if position < end:
+        segments.append((text[position:end], False))
+    if start:
+        segments.insert(0, ('… ', False))
+    if end < len(text):
+        segments.append((' …', False))
+    return segments
@@ -0,0 +1,59 @@
+"""
+Orden aleatorio determinista de las preguntas de un tema.
+
+Cada estudiante ve las preguntas en un orden propio derivado de
+(estudiante, tema, intento) sin guardar ninguna permutación: la clave de
+orden de una pregunta es una función biyectiva de su id,
+
+    x = (a·id + b) mod p
+    y = x³ mod p
+    clave = (c·y + d) mod p
+
+con ``p`` primo y ``p ≡ 2 (mod 3)`` (así x → x³ es una permutación de Z_p).
+Los coeficientes salen de un hash de la semilla. Como la clave se calcula
+en SQL, el orden se puede paginar por cursor con ``(shuffle_key, id)`` y la
+misma página siempre devuelve las mismas preguntas. Los resultados
+intermedios son menores que p² < 2^62, así que caben en un ``bigint``.
+
+El navegador calcula la misma clave (con BigInt) para ordenar el snapshot.
+"""
+import hashlib
+from collections import namedtuple
+
+from django.db.models import BigIntegerField, ExpressionWrapper, F, Value
+
+PRIME = 2147483579
+SHUFFLE_ORDERING = ('shuffle_key', 'id')
+
+ShuffleSeed = namedtuple('ShuffleSeed', ['a', 'b', 'c', 'd'])
+
+
+def shuffle_seed(student_id, exam_id, attempt=0):
+    """Devuelve los coeficientes del orden de un estudiante en un tema"""
+    digest = hashlib.blake2b(f'{student_id}:{exam_id}:{attempt}'.encode(), digest_size=16).digest()
+    a, b, c, d = (int.from_bytes(digest[index:index + 4], 'big') for index in range(0, 16, 4))
+    return ShuffleSeed(1 + a % (PRIME - 1), b % PRIME, 1 + c % (PRIME - 1), d % PRIME)
+
+
+def shuffle_key(pk, seed):
+    """Clave de orden de una pregunta (la misma que calcula shuffle_key_expression)"""
+    x = (pk * seed.a + seed.b) % PRIME
+    y = (x * x % PRIME) * x % PRIME
+    return (y * seed.c + seed.d) % PRIME
+
+
+def shuffle_key_expression(seed, field='id'):
+    """Expresión SQL con la clave de orden, para ``annotate(shuffle_key=...)``"""
+    x = (F(field) * Value(seed.a) + Value(seed.b)) % Value(PRIME)
+    y = (x * x % Value(PRIME)) * x % Value(PRIME)
+    return ExpressionWrapper((y * Value(seed.c) + Value(seed.d)) % Value(PRIME), output_field=BigIntegerField())
+
+
+def shuffled(questions, seed):
+    """Anota ``shuffle_key`` en el queryset de preguntas (ordenar con SHUFFLE_ORDERING)"""
+    return questions.annotate(shuffle_key=shuffle_key_expression(seed))
+
+
+def seed_data(seed):
+    """Coeficientes como texto para el navegador (BigInt)"""
+    return {'p': str(PRIME), **{name: str(value) for name, value in seed._asdict().items()}}
@@ -0,0 +1,98 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .duplicates import index_questions
+from .images import queue_image_variants
+from .models import Answer, Course, Exam, Question
+from .pdf_index import queue_pdf_index
+from .search import refresh_search_vectors
+
+
+_suspended = ContextVar('exam_content_signals_suspended', default=False)
+
+
+@contextmanager
+def content_signals_suspended():
+    """
+    Desactiva los contadores y el índice de búsqueda en el hilo actual, para
+    borrar en bloque contenido que igual va a desaparecer con su tema.
+    """
+    token = _suspended.set(True)
+    try:
+        yield
+    finally:
+        _suspended.reset(token)
+
+
+def exam_content_changed(exam_ids, question_delta=0):
+    """
+    Incrementa la revisión del contenido de los exámenes (invalida las
+    páginas cacheadas y los ETag) y ajusta el contador de preguntas.
+    """
+    updates = {
+        'content_revision': F('content_revision') + 1,
+        'content_updated_at': timezone.now(),
+    }
+    if question_delta:
+        updates['question_count'] = F('question_count') + question_delta
+    Exam.objects.filter(pk__in=exam_ids).update(**updates)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=Exam)
+@receiver(post_save, sender=Question)
+def image_saved(sender, instance, raw=False, **kwargs):
+    """Las variantes de una imagen nueva se generan en segundo plano (exams.tasks)"""
+    if raw or _suspended.get():
+        return
+    queue_image_variants(instance)
+
+
+@receiver(post_save, sender=Exam)
+def exam_pdf_saved(sender, instance, raw=False, **kwargs):
+    """El texto de un PDF nuevo se indexa en segundo plano (exams.pdf_index)"""
+    if raw or _suspended.get():
+        return
+    queue_pdf_index(instance)
+
+
+@receiver(post_save, sender=Exam)
+def exam_saved(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created or _suspended.get():
+        return
+    exam_content_changed([instance.pk])
+
+
+@receiver(post_save, sender=Question)
+def question_saved(sender, instance, created=False, raw=False, **kwargs):
+    """
+    Mantiene actualizados la revisión, el contador de preguntas, el índice de
+    búsqueda y el de duplicados
+    """
+    if raw or _suspended.get():
+        return
+    exam_content_changed([instance.exam_id], question_delta=1 if created else 0)
+    refresh_search_vectors([instance.pk])
+    index_questions([(instance.pk, instance.question_text)])
+
+
+@receiver(post_delete, sender=Question)
+def question_deleted(sender, instance, **kwargs):
+    if _suspended.get():
+        return
+    exam_content_changed([instance.exam_id], question_delta=-1)
+
+
+@receiver(post_save, sender=Answer)
+@receiver(post_delete, sender=Answer)
+def answer_changed(sender, instance, raw=False, **kwargs):
+    """El texto de las respuestas también forma parte del contenido y del índice de búsqueda"""
+    if raw or _suspended.get():
+        return
+    exam_content_changed(Question.objects.filter(pk=instance.question_id).values('exam_id'))
+    refresh_search_vectors([instance.question_id])
@@ -0,0 +1,75 @@
+"""
+Snapshot JSON de un tema completo para filtrar y paginar en el navegador.
+
+El snapshot se genera una vez por revisión del contenido
+(``Exam.content_revision``), ya comprimido con gzip, y se guarda en la caché
+de fragmentos. Como la URL incluye la revisión, la respuesta nunca cambia y se
+puede cachear como inmutable.
+
+Formato (JSON compacto)::
+
+    {"exam": 1, "revision": 7,
+     "fields": ["id", "question", "answer", "explanation", "image", "thumb"],
+     "questions": [[12, "...", "...", "...", "https://...", "https://..."], ...]}
+
+``image`` es la variante mediana (o la original mientras no haya variantes) y
+``thumb`` la miniatura de la tabla (ver exams.images).
+"""
+import gzip
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import OuterRef, Subquery
+
+from .media_urls import storage_url
+from .models import Answer, Question
+
+SNAPSHOT_FIELDS = ('id', 'question', 'answer', 'explanation', 'image', 'thumb')
+
+
+def _image_urls(storage, name, variants):
+    """(URL mediana, URL miniatura) de la imagen de una pregunta"""
+    if name and variants and variants.get('source') == name:
+        return (
+            storage_url(storage, variants.get('medium', {}).get('name'), 'medium'),
+            storage_url(storage, variants.get('thumb', {}).get('name'), 'thumb'),
+        )
+    # Un error del almacenamiento (p. ej. Cloudinary) no impide el snapshot: la URL queda en None
+    url = storage_url(storage, name)
+    return url, url
+
+
+def build_snapshot(exam):
+    """Devuelve el dict del snapshot con todas las preguntas del tema"""
+    storage = Question._meta.get_field('image').storage
+    primary_answer = Answer.objects.filter(question=OuterRef('pk')).order_by('order', 'id')
+    rows = (
+        exam.questions
+        .annotate(answer_text=Subquery(primary_answer.values('answer_text')[:1]))
+        .order_by('order', 'id')
+        .values_list('id', 'question_text', 'answer_text', 'explanation', 'image', 'image_variants')
+        .iterator(chunk_size=2000)
+    )
+    return {
+        'exam': exam.pk,
+        'revision': exam.content_revision,
+        'fields': SNAPSHOT_FIELDS,
+        'questions': [
+            [pk, question_text, answer_text or '', explanation or '', *_image_urls(storage, image, variants)]
+            for pk, question_text, answer_text, explanation, image, variants in rows
+        ],
+    }
+
+
+def get_snapshot(exam):
+    """Devuelve el snapshot comprimido con gzip de la revisión actual del tema"""
+    cache = caches[settings.EXAM_FRAGMENT_CACHE]
+    key = f'exam_snapshot:{exam.pk}:{exam.content_revision}'
+    data = cache.get(key)
+    if data is None:
+        content = json.dumps(build_snapshot(exam), ensure_ascii=False, separators=(',', ':'))
+        # mtime=0 para que el mismo contenido produzca siempre los mismos bytes
+        data = gzip.compress(content.encode('utf-8'), mtime=0)
+        cache.set(key, data, settings.EXAM_FRAGMENT_CACHE_TIMEOUT)
+    return data
@@ -0,0 +1,147 @@
+"""
+Almacenamiento local direccionado por contenido (alternativa a Cloudinary).
+
+Con ``MEDIA_STORAGE=local`` los archivos subidos se guardan en ``MEDIA_ROOT``
+con el nombre ``ab/cd/<sha256><ext>``: el nombre es el hash SHA-256 del
+contenido, repartido en subdirectorios por los dos primeros bytes para no
+acumular miles de archivos en una carpeta. Así:
+
+- la misma imagen subida en muchas preguntas se guarda una sola vez,
+- la escritura es atómica (archivo temporal + ``os.replace``), sin archivos a
+  medio escribir aunque dos procesos suban lo mismo a la vez,
+- el contenido de una URL nunca cambia, así que ``serve_media`` la entrega con
+  caché de un año (``immutable``) y el hash como ETag, como WhiteNoise con los
+  estáticos.
+
+Como un archivo puede estar compartido por varios objetos, ``delete`` no
+borra nada.
+
+Los PDF de los temas se guardan aparte, en el almacenamiento ``private``
+(``PRIVATE_MEDIA_ROOT`` con ``MEDIA_STORAGE=local``): no tienen URL pública y
+solo se entregan con ``exams:student_pdf_file``, que revisa la inscripción.
+``serve_media`` solo se monta con ``SERVE_MEDIA`` (por defecto igual a
+``DEBUG``).
+
+Sirve para desarrollo, pruebas y despliegues sin red hacia Cloudinary; no
+necesita credenciales ni acceso a internet.
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, storages
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils.deconstruct import deconstructible
+from django.utils.functional import LazyObject, empty
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_safe
+
+CHUNK_SIZE = 64 * 1024
+MEDIA_MAX_AGE = 365 * 24 * 60 * 60
+CONTENT_NAME_RE = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})(\.[a-z0-9]{1,10})?$')
+_EXTENSION_RE = re.compile(r'^\.[a-z0-9]{1,10}$')
+_TEMP_DIR = '.tmp'
+
+
+@deconstructible(path='exams.storage.ContentAddressedStorage')
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage que nombra cada archivo por el SHA-256 de su contenido"""
+
+    def get_available_name(self, name, max_length=None):
+        # El nombre definitivo se decide en _save a partir del contenido
+        return name
+
+    def content_name(self, digest, name):
+        extension = os.path.splitext(name)[1].lower()
+        if not _EXTENSION_RE.match(extension):
+            extension = ''
+        return f'{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+    def _save(self, name, content):
+        temp_dir = os.path.join(self.location, _TEMP_DIR)
+        os.makedirs(temp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=temp_dir, delete=False) as temp:
+            try:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks(CHUNK_SIZE):
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    temp.write(chunk)
+                temp.flush()
+                os.fsync(temp.fileno())
+            except BaseException:
+                os.unlink(temp.name)
+                raise
+
+        name = self.content_name(digest.hexdigest(), name)
+        path = self.path(name)
+        if os.path.exists(path):
+            # Mismo contenido ya guardado: no se duplica
+            os.unlink(temp.name)
+            return name
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(temp.name, self.file_permissions_mode)
+        else:
+            os.chmod(temp.name, 0o644)
+        os.replace(temp.name, path)
+        return name
+
+    def delete(self, name):
+        # Otros objetos pueden usar el mismo archivo
+        pass
+
+
+@deconstructible(path='exams.storage.PrivateContentAddressedStorage')
+class PrivateContentAddressedStorage(ContentAddressedStorage):
+    """ContentAddressedStorage sin URL: sus archivos solo se entregan desde una vista"""
+
+    def url(self, name):
+        return None
+
+
+class PrivateStorage(LazyObject):
+    """El almacenamiento ``private`` de STORAGES (como ``default_storage``)"""
+
+    def _setup(self):
+        self._wrapped = storages['private']
+
+
+private_storage = PrivateStorage()
+
+
+def get_private_storage():
+    return private_storage
+
+
+@receiver(setting_changed)
+def reset_private_storage(setting, **kwargs):
+    if setting == 'STORAGES':
+        private_storage._wrapped = empty
+
+
+@require_safe
+def serve_media(request, name):
+    """Vista para entregar un archivo del almacenamiento local con caché inmutable"""
+    match = CONTENT_NAME_RE.match(name)
+    if match is None:
+        raise Http404('Archivo no encontrado')
+    etag = f'"{match.group(1)}"'
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        path = os.path.join(settings.MEDIA_ROOT, name)
+        try:
+            response = FileResponse(open(path, 'rb'), filename=os.path.basename(name))
+        except FileNotFoundError:
+            raise Http404('Archivo no encontrado')
+    response['ETag'] = etag
+    response['Cache-Control'] = f'public, max-age={MEDIA_MAX_AGE}, immutable'
+    return response
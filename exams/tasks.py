@@ -0,0 +1,122 @@
+"""
+Tareas en segundo plano de la app (ver exams.jobs).
+
+Las tareas deben poder repetirse: si un worker cae a la mitad, la tarea se
+vuelve a ejecutar desde el principio.
+"""
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from .analytics import analyze_exam
+from .duplicates import index_queryset
+from .grading import grade_exam
+from .images import generate_image_variants
+from .jobs import task
+from .models import Course, Exam, Question, StudentAnswer
+from .pdf_index import index_exam_pdf
+from .signals import content_signals_suspended, exam_content_changed
+from .uploads import expire_upload, store_upload
+
+DELETE_BATCH_SIZE = 1000
+
+
+def _delete_in_batches(queryset):
+    """Borra las filas en lotes, cada uno en su transacción, y devuelve cuántas se borraron"""
+    model = queryset.model
+    deleted = 0
+    while True:
+        pks = list(queryset.order_by().values_list('pk', flat=True)[:DELETE_BATCH_SIZE])
+        if not pks:
+            return deleted
+        with transaction.atomic():
+            deleted += model.objects.filter(pk__in=pks).delete()[1].get(model._meta.label, 0)
+
+
+def _delete_exam_content(exam_id):
+    # Las respuestas de los estudiantes primero (no tienen dependientes: DELETE
+    # directo) y luego las preguntas por lotes, sin actualizar contadores ni el
+    # índice de búsqueda de un tema que se va a borrar
+    with content_signals_suspended():
+        answers = _delete_in_batches(StudentAnswer.objects.filter(exam_result__exam_id=exam_id))
+        questions = _delete_in_batches(Question.objects.filter(exam_id=exam_id))
+        Exam.objects.filter(pk=exam_id).delete()
+    return answers, questions
+
+
+@task('exams.delete_exam')
+def delete_exam(exam_id):
+    # Si el tema se restauró (se vació deleted_at) antes de ejecutar la tarea no se borra
+    if not Exam.objects.filter(pk=exam_id, deleted_at__isnull=False).exists():
+        return {'exam': exam_id, 'deleted': False}
+    answers, questions = _delete_exam_content(exam_id)
+    return {'exam': exam_id, 'questions': questions, 'student_answers': answers}
+
+
+@task('exams.delete_course')
+def delete_course(course_id):
+    if not Course.objects.filter(pk=course_id, deleted_at__isnull=False).exists():
+        return {'course': course_id, 'deleted': False}
+    questions = 0
+    for exam_id in Exam.objects.filter(course_id=course_id).values_list('pk', flat=True):
+        questions += _delete_exam_content(exam_id)[1]
+    Course.objects.filter(pk=course_id).delete()
+    return {'course': course_id, 'questions': questions}
+
+
+@task('exams.grade_exam')
+def grade_exam_task(exam_id, regrade=False, graded_by_id=None):
+    exam = Exam.objects.filter(pk=exam_id).first()
+    if exam is None:
+        return None
+    graded_by = get_user_model().objects.filter(pk=graded_by_id).first() if graded_by_id else None
+    report = grade_exam(exam, regrade=regrade, graded_by=graded_by)
+    return {
+        'results': report.results,
+        'results_updated': report.results_updated,
+        'answers': report.answers,
+        'answers_updated': report.answers_updated,
+        'seconds': round(report.elapsed, 2),
+    }
+
+
+@task('exams.analyze_exam')
+def analyze_exam_task(exam_id):
+    exam = Exam.objects.filter(pk=exam_id).first()
+    if exam is None:
+        return None
+    analysis = analyze_exam(exam)
+    return {'students': analysis.students, 'questions': analysis.questions, 'kr20': analysis.kr20}
+
+
+@task('exams.image_variants')
+def image_variants_task(model, pk, field='image', force=False):
+    model = apps.get_model(model)
+    variants = generate_image_variants(model, pk, field, force)
+    # Las páginas cacheadas y el snapshot del tema incluyen las URL de las imágenes
+    if model is Question:
+        exam_content_changed(Question.objects.filter(pk=pk).values('exam_id'))
+    elif model is Exam:
+        exam_content_changed([pk])
+    return {'model': model._meta.label_lower, 'pk': pk, 'source': (variants or {}).get('source')}
+
+
+@task('exams.store_upload')
+def store_upload_task(session_id):
+    return {'session': session_id, 'name': store_upload(session_id)}
+
+
+@task('exams.expire_upload')
+def expire_upload_task(session_id):
+    return {'session': session_id, 'expired': expire_upload(session_id)}
+
+
+@task('exams.index_duplicates')
+def index_duplicates_task(course_id):
+    questions = Question.objects.filter(exam__course_id=course_id)
+    return {'course': course_id, 'indexed': index_queryset(questions)}
+
+
+@task('exams.index_pdf')
+def index_pdf_task(exam_id, force=False):
+    return index_exam_pdf(exam_id, force=force)
@@ -0,0 +1,73 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from ..images import VARIANT_SIZES, variants_are_current
+from ..media_urls import file_url, storage_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def image_url(obj, variant='original', field='image'):
+    """URL (cacheada) de una variante de la imagen, o de la original si aún no existe"""
+    image = getattr(obj, field)
+    if not image:
+        return ''
+    if variant != 'original' and variants_are_current(obj, field):
+        name = obj.image_variants.get(variant, {}).get('name')
+        if name:
+            return storage_url(image.storage, name, variant) or ''
+    return file_url(image) or ''
+
+
+@register.simple_tag
+def responsive_image(obj, sizes, field='image', **attrs):
+    """
+    ``<img>`` con ``srcset`` de las variantes WebP, carga diferida y el
+    placeholder de fondo. Uso::
+
+        {% responsive_image question '45px' class='thumbnail' alt='Imagen' %}
+
+    ``data-full`` lleva la variante mediana (para el modal de imagen). Mientras
+    no existan las variantes se usa la imagen original; si el almacenamiento
+    no da la URL no se muestra nada.
+    """
+    image = getattr(obj, field)
+    if not image:
+        return ''
+    attrs = {key.replace('_', '-'): value for key, value in attrs.items()}
+    attrs.setdefault('loading', 'lazy')
+    attrs.setdefault('decoding', 'async')
+
+    sources = []
+    full = None
+    if variants_are_current(obj, field):
+        variants = obj.image_variants
+        for variant in VARIANT_SIZES:
+            item = variants.get(variant)
+            url = item and storage_url(image.storage, item['name'], variant)
+            if url:
+                sources.append((url, item))
+                if variant == 'medium':
+                    full = url
+
+    if sources:
+        url, largest = sources[-1]
+        attrs['srcset'] = ', '.join(f'{url} {item["width"]}w' for url, item in sources)
+        attrs['sizes'] = sizes
+        attrs['src'] = url
+        attrs['width'] = largest['width']
+        attrs['height'] = largest['height']
+        # Sin la variante mediana el modal usa la original, no la miniatura
+        attrs['data-full'] = full or file_url(image) or url
+        if variants.get('placeholder'):
+            style = f'background: url({variants["placeholder"]}) center / cover no-repeat'
+            attrs['style'] = f'{style}; {attrs["style"]}' if attrs.get('style') else style
+    else:
+        url = file_url(image)
+        if not url:
+            return ''
+        attrs['src'] = url
+        attrs['data-full'] = url
+    return format_html('<img{}>', flatatt(attrs))
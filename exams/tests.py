@@ -1,3 +1,2221 @@
-from django.test import TestCase
+import gzip
+import hashlib
+import importlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import InMemoryStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.db.models.fields.files import FieldFile
+from django.http import Http404
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, reverse
+from django.utils import timezone
+
+import numpy as np
+from PIL import Image
+
+import exam_system.urls
+from accounts.models import User
+from .models import (
+    Answer, Course, CourseEnrollment, Exam, ExamAnalysis, ExamPdfPage, ExamResult, Job, Question, QuestionAnalysis,
+    QuestionBucket, QuestionSignature, StudentAnswer, UploadChunk, UploadSession,
+)
+from .analytics import analyze_exam, item_statistics
+from .attempts import MAX_DELTAS, AttemptClosed, clean_deltas, save_answers, saved_answers, submit_attempt
+from .delivery import RangeNotSatisfiable, file_etag, iter_file_range, parse_range
+from .duplicates import (
+    BANDS, NUM_PERM, buckets, duplicate_groups, find_similar, find_similar_many, index_questions, index_queryset,
+    shingles, signature, similarity,
+)
+from .exporters import stream_export
+from .grading import grade_exam
+from .jobs import claim_job, enqueue, requeue_stale_jobs, retry_jobs, run_job, task
+from .images import build_variants, generate_image_variants
+from .importers import (
+    CourseImporter, ImportFormatError, QuestionImporter, clean_row, detect_format, read_rows, store_image
+)
+from .media_urls import URLCache, clear_url_cache, forget_url, storage_url
+from .ordering import ORDER_GAP, next_question_order, reorder_questions
+from .pagination import KeysetPaginator, decode_cursor, encode_cursor
+from .pdf_index import extract_pages, index_exam_pdf, queue_pdf_index
+from .search import _fold, pdf_snippet, search_pdf_pages, search_questions
+from .storage import CONTENT_NAME_RE, ContentAddressedStorage, serve_media
+from .tasks import delete_course, delete_exam, image_variants_task, index_duplicates_task
+from .text import normalize_text
+from .uploads import (
+    UploadError, attach_upload, complete_upload, expire_upload, receive_chunk, received_chunks, sniff_content_type,
+    start_upload, store_upload,
+)
+from .templatetags.exam_images import image_url, responsive_image
+from .shuffle import PRIME, SHUFFLE_ORDERING, seed_data, shuffle_key, shuffle_seed, shuffled
+from .snapshots import SNAPSHOT_FIELDS, get_snapshot
+from .views import MAX_BATCH_QUESTIONS
+
+MEMORY_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+    'private': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+@task('tests.echo')
+def echo_task(value):
+    return {'value': value}
+
+
+@task('tests.sleep')
+def sleep_task(seconds):
+    time.sleep(seconds)
+
+
+@task('tests.fail', max_attempts=2)
+def failing_task():
+    raise RuntimeError('Falla de prueba')
+
+
+def png_upload(name='imagen.png', size=(40, 30), mode='RGB', color='red'):
+    content = BytesIO()
+    Image.new(mode, size, color).save(content, 'PNG')
+    return SimpleUploadedFile(name, content.getvalue(), content_type='image/png')
+
+
+def make_pdf(*texts):
+    """PDF mínimo con una página por texto (Helvetica, sin compresión)"""
+    objects = ['<< /Type /Catalog /Pages 2 0 R >>', None, '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for text in texts:
+        stream = f'BT /F1 12 Tf 72 720 Td ({text}) Tj ET'
+        objects.append(f'<< /Length {len(stream)} >>\nstream\n{stream}\nendstream')
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+                       f'/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>')
+        kids.append(f'{len(objects)} 0 R')
+    objects[1] = f'<< /Type /Pages /Kids [{" ".join(kids)}] /Count {len(kids)} >>'
+    content = b'%PDF-1.4\n'
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(content))
+        content += f'{number} 0 obj\n{body}\nendobj\n'.encode('latin-1')
+    xref = len(content)
+    content += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode()
+    content += ''.join(f'{offset:010d} 00000 n \n' for offset in offsets).encode()
+    content += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode()
+    return content
+
+
+@override_settings(STORAGES=MEMORY_STORAGES)
+class ExamTestCase(TestCase):
+    """Curso con un administrador y un estudiante inscrito"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='x', user_type='admin')
+        cls.student = User.objects.create_user(username='student', password='x', user_type='student')
+        cls.course = Course.objects.create(name='Curso', created_by=cls.admin)
+        CourseEnrollment.objects.create(course=cls.course, student=cls.student)
+
+    def setUp(self):
+        caches[settings.EXAM_FRAGMENT_CACHE].clear()
+
+    def create_exam(self, num_questions=0, **kwargs):
+        kwargs.setdefault('title', 'Tema')
+        kwargs.setdefault('subject', 'Materia')
+        exam = Exam.objects.create(course=self.course, created_by=self.admin, **kwargs)
+        for i in range(num_questions):
+            self.create_question(exam, f'Pregunta {i}', f'Respuesta {i}', order=(i + 1) * 1024)
+        return exam
+
+    def create_question(self, exam, text, answer='', explanation='', order=0, marks=1):
+        question = Question.objects.create(
+            exam=exam, question_text=text, explanation=explanation, order=order, marks=marks
+        )
+        if answer:
+            Answer.objects.create(question=question, answer_text=answer, is_correct=True, order=1)
+        return question
+
+    def create_student(self, username):
+        student = User.objects.create_user(username=username, password='x', user_type='student')
+        CourseEnrollment.objects.create(course=self.course, student=student)
+        return student
+
+    def create_result(self, exam, student, answers=(), status='completed', **kwargs):
+        """``answers`` son pares (pregunta, opción seleccionada o texto escrito)"""
+        result = ExamResult.objects.create(exam=exam, student=student, status=status, **kwargs)
+        StudentAnswer.objects.bulk_create([
+            StudentAnswer(
+                exam_result=result, question=question,
+                selected_answer=answer if isinstance(answer, Answer) else None,
+                text_answer=answer if isinstance(answer, str) else None,
+            )
+            for question, answer in answers
+        ])
+        return result
+
+
+class StudentViewExamQueryCountTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.student)
+
+    def count_queries(self, exam):
+        url = reverse('exams:student_take_exam', args=[exam.id])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_query_count_does_not_depend_on_rows(self):
+        few, _ = self.count_queries(self.create_exam(2))
+        many, response = self.count_queries(self.create_exam(40))
+        self.assertEqual(few, many)
+        self.assertContains(response, 'Respuesta 39')
+
+    def test_primary_answer_uses_prefetch(self):
+        exam = self.create_exam(3)
+        questions = list(exam.questions.with_answers())
+        with self.assertNumQueries(0):
+            answers = [question.primary_answer.answer_text for question in questions]
+        self.assertEqual(answers, ['Respuesta 0', 'Respuesta 1', 'Respuesta 2'])
+
+
+class SearchQuestionsTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.exam = self.create_exam()
+        self.in_text = self.create_question(self.exam, 'La fotosíntesis ocurre en la hoja', order=3)
+        self.in_answer = self.create_question(self.exam, 'Proceso de las plantas', 'fotosíntesis', order=1)
+        self.in_explanation = self.create_question(
+            self.exam, 'Otra pregunta', explanation='Relacionada con la fotosíntesis', order=2
+        )
+        self.unrelated = self.create_question(self.exam, 'Mitocondria', 'energía', order=4)
+
+    def test_matches_question_answer_and_explanation(self):
+        found = search_questions(self.exam.questions.all(), 'fotosíntesis')
+        self.assertEqual(
+            {question.pk for question in found},
+            {self.in_text.pk, self.in_answer.pk, self.in_explanation.pk},
+        )
+
+    def test_question_text_ranks_first(self):
+        found = list(search_questions(self.exam.questions.all(), 'fotosíntesis'))
+        self.assertEqual(found[0], self.in_text)
+        ranks = [question.search_rank for question in found]
+        self.assertEqual(ranks, sorted(ranks, reverse=True))
+        self.assertEqual(found[0].search_rank, max(ranks))
+
+    def test_empty_query_returns_queryset_unchanged(self):
+        questions = self.exam.questions.all()
+        self.assertIs(search_questions(questions, '   '), questions)
+
+    def test_view_filters_by_search(self):
+        self.client.force_login(self.student)
+        response = self.client.get(
+            reverse('exams:student_take_exam', args=[self.exam.id]), {'search': 'mitocondria'}, secure=True
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Mitocondria')
+        self.assertNotContains(response, 'Proceso de las plantas')
+        self.assertEqual(response.context['total_questions'], 1)
+
+
+class KeysetPaginationTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.exam = self.create_exam(25)
+        self.questions = self.exam.questions.order_by('order', 'id')
+        self.paginator = KeysetPaginator(self.questions, 10, ordering=('order', 'id'))
+
+    def texts(self, page):
+        return [question.question_text for question in page]
+
+    def test_walks_forward_and_back(self):
+        first = self.paginator.get_page(None)
+        self.assertEqual(self.texts(first), [f'Pregunta {i}' for i in range(10)])
+        self.assertFalse(first.has_previous())
+        self.assertTrue(first.has_next())
+        self.assertEqual((first.start_index(), first.end_index(), first.count), (1, 10, 25))
+
+        second = self.paginator.get_page(first.next_cursor())
+        self.assertEqual(self.texts(second), [f'Pregunta {i}' for i in range(10, 20)])
+        self.assertEqual((second.start_index(), second.number(), second.num_pages()), (11, 2, 3))
+
+        third = self.paginator.get_page(second.next_cursor())
+        self.assertEqual(self.texts(third), [f'Pregunta {i}' for i in range(20, 25)])
+        self.assertFalse(third.has_next())
+
+        back = self.paginator.get_page(third.previous_cursor())
+        self.assertEqual(self.texts(back), self.texts(second))
+        self.assertEqual(back.start_index(), 11)
+
+    def test_last_page_is_aligned(self):
+        last = self.paginator.get_page(self.paginator.get_page(None).last_cursor())
+        self.assertEqual(self.texts(last), [f'Pregunta {i}' for i in range(20, 25)])
+        self.assertEqual((last.start_index(), last.end_index()), (21, 25))
+        self.assertTrue(last.has_previous())
+        self.assertFalse(last.has_next())
+
+    def test_descending_ordering(self):
+        paginator = KeysetPaginator(self.questions, 10, ordering=('-order', '-id'))
+        first = paginator.get_page(None)
+        second = paginator.get_page(first.next_cursor())
+        self.assertEqual(self.texts(second), [f'Pregunta {i}' for i in range(14, 4, -1)])
+
+    def test_count_travels_in_cursor(self):
+        cursor = self.paginator.get_page(None).next_cursor()
+        with self.assertNumQueries(1):
+            page = self.paginator.get_page(cursor)
+            list(page)
+            self.assertEqual(page.count, 25)
+
+    def test_invalid_cursor_starts_over(self):
+        for cursor in ('basura', encode_cursor({'d': 'x'}), encode_cursor({'d': 'n', 'k': [1]}),
+                       encode_cursor({'d': 'n', 'k': ['texto', 'x'], 'i': 11})):
+            page = self.paginator.get_page(cursor)
+            self.assertEqual(self.texts(page)[0], 'Pregunta 0', cursor)
+
+    def test_decode_cursor_rejects_bad_data(self):
+        self.assertIsNone(decode_cursor(''))
+        self.assertIsNone(decode_cursor('!!'))
+        self.assertIsNone(decode_cursor(encode_cursor([1, 2])))
+        self.assertIsNone(decode_cursor(encode_cursor({'d': 'n', 'i': -1})))
+        self.assertEqual(decode_cursor(encode_cursor({'d': 'p', 'k': [1, 2]})), {'d': 'p', 'k': [1, 2]})
+
+    def test_question_manage_pages_with_cursor(self):
+        exam = self.create_exam(45)
+        self.client.force_login(self.admin)
+        url = reverse('exams:question_manage', args=[exam.id])
+        first = self.client.get(url, {'order': 'order'}, secure=True).context['page_obj']
+        self.assertEqual(len(first), 40)
+        second = self.client.get(url, {'order': 'order', 'cursor': first.next_cursor()}, secure=True).context['page_obj']
+        self.assertEqual([question.question_text for question in second], [f'Pregunta {i}' for i in range(40, 45)])
+        self.assertEqual(second.count, 45)
+
+
+class ExamFragmentCacheTests(ExamTestCase):
+    def get(self, exam):
+        url = reverse('exams:student_take_exam', args=[exam.id])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.student)
+        self.exam = self.create_exam(3)
+
+    def test_cached_page_skips_question_queries(self):
+        _, cold = self.get(self.exam)
+        response, warm = self.get(self.exam)
+        self.assertLess(warm, cold)
+        self.assertContains(response, 'Pregunta 2')
+
+    def test_content_change_bumps_revision_and_refreshes_page(self):
+        self.get(self.exam)
+        revision = Exam.objects.get(pk=self.exam.pk).content_revision
+        question = self.exam.questions.get(question_text='Pregunta 1')
+        question.question_text = 'Pregunta editada'
+        question.save()
+        self.assertEqual(Exam.objects.get(pk=self.exam.pk).content_revision, revision + 1)
+        response, _ = self.get(self.exam)
+        self.assertContains(response, 'Pregunta editada')
+        self.assertNotContains(response, 'Pregunta 1')
+
+    def test_new_question_updates_counter(self):
+        self.create_question(self.exam, 'Nueva', 'Respuesta nueva')
+        self.assertEqual(Exam.objects.get(pk=self.exam.pk).question_count, 4)
+        response, _ = self.get(self.exam)
+        self.assertContains(response, 'Respuesta nueva')
+
+
+class QuestionImportTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.exam = self.create_exam()
+
+    def read(self, text, file_format, encoding='utf-8'):
+        return list(read_rows(BytesIO(text.encode(encoding)), file_format))
+
+    def test_reads_csv_with_bom_and_multiline_fields(self):
+        rows = self.read('\ufeffquestion_text,answer_text\n"Uno\ndos",Sí\nTres,\n', 'csv')
+        self.assertEqual(rows, [
+            (2, {'question_text': 'Uno\ndos', 'answer_text': 'Sí'}),
+            (3, {'question_text': 'Tres', 'answer_text': ''}),
+        ])
+
+    def test_latin1_csv_is_a_format_error(self):
+        with self.assertRaisesMessage(ImportFormatError, 'La línea 2 no está en UTF-8'):
+            self.read('question_text\ncaña\n', 'csv', encoding='latin-1')
+
+    def test_malformed_csv_is_a_format_error(self):
+        with self.assertRaisesMessage(ImportFormatError, 'CSV inválido en la línea 3'):
+            self.read('question_text\nok\n"' + 'a' * 200000 + '"\n', 'csv')
+
+    def test_jsonl_reports_invalid_lines(self):
+        rows = self.read('{"question_text": "A"}\n\n{roto\n', 'jsonl')
+        self.assertEqual(rows[0], (1, {'question_text': 'A'}))
+        self.assertEqual(rows[1][0], 3)
+        self.assertIsInstance(rows[1][1], ImportFormatError)
+        with self.assertRaises(ImportFormatError):
+            self.read('{"question_text": "ñ"}\n', 'jsonl', encoding='latin-1')
+
+    def test_json_must_be_a_list(self):
+        self.assertEqual(self.read('{"questions": [{"question_text": "A"}]}', 'json'), [(1, {'question_text': 'A'})])
+        with self.assertRaises(ImportFormatError):
+            self.read('"texto"', 'json')
+        with self.assertRaises(ImportFormatError):
+            self.read('[1,', 'json')
+
+    def test_detect_format(self):
+        self.assertEqual(detect_format('banco.XLSX'), 'xlsx')
+        with self.assertRaises(ImportFormatError):
+            detect_format('banco.pdf')
+
+    def test_clean_row_validation(self):
+        self.assertEqual(clean_row({'question_text': ' A ', 'marks': '2.5'})['marks'], Decimal('2.50'))
+        for row, message in (({}, 'question_text'), ({'question_text': 'A', 'marks': 'x'}, 'inválida'),
+                             ({'question_text': 'A', 'marks': '1000'}, 'entre 0'), ('fila', 'objeto')):
+            with self.assertRaisesMessage(ValueError, message):
+                clean_row(row)
+        # En los archivos la columna image se ignora
+        self.assertIsNone(clean_row({'question_text': 'A', 'image': 'otro/archivo.png'})['image'])
+
+    def test_import_inserts_valid_rows_in_batches(self):
+        rows = self.read(
+            'question_text,answer_text,marks\nA,a,1\n,sin pregunta,1\nB,b,2\nC,,x\nD,d,1\n', 'csv'
+        )
+        report = QuestionImporter(self.exam, batch_size=2).run(rows)
+        self.assertEqual((report.total_rows, report.created), (5, 3))
+        self.assertEqual([line for line, _ in report.errors], [3, 5])
+        questions = list(self.exam.questions.order_by('order'))
+        self.assertEqual([question.question_text for question in questions], ['A', 'B', 'D'])
+        self.assertEqual([question.order for question in questions], [1024, 2048, 3072])
+        self.assertEqual(Answer.objects.filter(question__exam=self.exam).count(), 3)
+        self.assertEqual(Exam.objects.get(pk=self.exam.pk).question_count, 3)
+
+    def test_dry_run_saves_nothing(self):
+        report = QuestionImporter(self.exam, dry_run=True).run(self.read('question_text\nA\n\n', 'csv'))
+        self.assertEqual((report.total_rows, report.valid_rows, report.created), (1, 1, 0))
+        self.assertFalse(self.exam.questions.exists())
+
+    def test_format_error_rolls_back(self):
+        data = 'question_text\nA\ncaña\n'.encode('latin-1')
+        with self.assertRaises(ImportFormatError):
+            QuestionImporter(self.exam, batch_size=1).run(read_rows(BytesIO(data), 'csv'))
+        self.assertFalse(self.exam.questions.exists())
+
+    def test_course_importer_creates_missing_exams(self):
+        rows = self.read('exam,question_text\nTema,A\nNuevo,B\n,C\n', 'csv')
+        report = CourseImporter(self.course, self.admin).run(rows)
+        self.assertEqual(report.created, 2)
+        self.assertEqual(report.errors[0][0], 4)
+        self.assertEqual(self.exam.questions.get().question_text, 'A')
+        self.assertEqual(self.course.exams.get(title='Nuevo').questions.get().question_text, 'B')
+
+    def test_view_reports_encoding_error(self):
+        self.client.force_login(self.admin)
+        upload = SimpleUploadedFile('banco.csv', 'question_text\ncaña\n'.encode('latin-1'))
+        response = self.client.post(
+            reverse('exams:question_import', args=[self.exam.id]), {'file': upload}, secure=True
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'no está en UTF-8')
+
+
+class QuestionExportTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.exam = self.create_exam(title='Tema 1')
+        self.create_question(self.exam, 'Dos, "tres"\nlíneas', answer='Sí', order=2048, marks=2)
+        self.create_question(self.exam, 'Sin respuesta', explanation='Nota', order=1024)
+        self.client.force_login(self.admin)
+
+    def download(self, url_name, pk, **params):
+        response = self.client.get(reverse(url_name, args=[pk]), params, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_csv_export_round_trips_through_importer(self):
+        text = ''.join(stream_export(Question.objects.filter(exam=self.exam), 'csv'))
+        self.assertTrue(text.startswith('\ufeffquestion_text,answer_text,explanation,marks,order'))
+        rows = [clean_row(row) for _, row in read_rows(BytesIO(text.encode('utf-8')), 'csv')]
+        self.assertEqual([row['question_text'] for row in rows], ['Sin respuesta', 'Dos, "tres"\nlíneas'])
+        self.assertEqual([row['answer_text'] for row in rows], ['', 'Sí'])
+        self.assertEqual(rows[1]['marks'], Decimal('2.00'))
+
+    def test_jsonl_export(self):
+        lines = [json.loads(line) for line in stream_export(Question.objects.filter(exam=self.exam), 'jsonl')]
+        self.assertEqual(lines[0], {
+            'question_text': 'Sin respuesta', 'answer_text': '', 'explanation': 'Nota',
+            'marks': '1.00', 'order': 1024,
+        })
+
+    def test_exam_export_view_streams_file(self):
+        response = self.client.get(reverse('exams:exam_export', args=[self.exam.id]), {'format': 'jsonl'}, secure=True)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        self.assertIn(f'tema-{self.exam.id}-preguntas.jsonl', response['Content-Disposition'])
+        # Un formato desconocido cae en CSV
+        self.assertIn('question_text,', self.download('exams:exam_export', self.exam.id, format='xml'))
+
+    def test_course_export_includes_exam_column_and_skips_deleted_exams(self):
+        deleted = self.create_exam(title='Borrado', deleted_at=timezone.now())
+        self.create_question(deleted, 'Oculta')
+        text = self.download('exams:course_export', self.course.id)
+        self.assertTrue(text.startswith('\ufeffexam,question_text'))
+        self.assertIn('Tema 1,Sin respuesta', text)
+        self.assertNotIn('Oculta', text)
+
+    def test_export_requires_admin(self):
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('exams:exam_export', args=[self.exam.id]), secure=True)
+        self.assertRedirects(response, reverse('accounts:dashboard'), fetch_redirect_response=False)
+
+
+class ConditionalGetTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.exam = self.create_exam(2)
+        self.client.force_login(self.student)
+
+    def get(self, url_name, *args, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(reverse(url_name, args=args), secure=True, **headers)
+
+    def assertRevalidates(self, url_name, *args):
+        response = self.get(url_name, *args)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+        self.assertEqual(self.get(url_name, *args, etag=response['ETag']).status_code, 304)
+        return response['ETag']
+
+    def test_student_pages_answer_304(self):
+        self.assertRevalidates('accounts:dashboard')
+        self.assertRevalidates('exams:student_course_exams', self.course.id)
+        self.assertRevalidates('exams:student_take_exam', self.exam.id)
+
+    def test_question_change_invalidates_exam_page(self):
+        etag = self.assertRevalidates('exams:student_take_exam', self.exam.id)
+        self.create_question(self.exam, 'Nueva pregunta')
+        response = self.get('exams:student_take_exam', self.exam.id, etag=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Nueva pregunta')
+
+    def test_new_exam_invalidates_course_page(self):
+        etag = self.assertRevalidates('exams:student_course_exams', self.course.id)
+        self.create_exam(title='Tema nuevo')
+        response = self.get('exams:student_course_exams', self.course.id, etag=etag)
+        self.assertContains(response, 'Tema nuevo')
+
+    def test_deleted_course_is_not_served_from_cache(self):
+        course_etag = self.assertRevalidates('exams:student_course_exams', self.course.id)
+        exam_etag = self.assertRevalidates('exams:student_take_exam', self.exam.id)
+        dashboard_etag = self.assertRevalidates('accounts:dashboard')
+
+        self.client.force_login(self.admin)
+        self.client.post(reverse('exams:course_delete', args=[self.course.id]), secure=True)
+        self.client.force_login(self.student)
+
+        self.assertEqual(self.get('exams:student_course_exams', self.course.id, etag=course_etag).status_code, 404)
+        self.assertEqual(self.get('exams:student_take_exam', self.exam.id, etag=exam_etag).status_code, 404)
+        response = self.get('accounts:dashboard', etag=dashboard_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['enrollments'], [])
+
+    def test_not_enrolled_student_is_redirected(self):
+        CourseEnrollment.objects.filter(student=self.student).delete()
+        response = self.get('exams:student_take_exam', self.exam.id, etag='"cualquiera"')
+        self.assertRedirects(response, reverse('accounts:dashboard'), fetch_redirect_response=False)
+
+    def test_admin_pages_have_no_etag(self):
+        self.client.force_login(self.admin)
+        response = self.get('exams:student_take_exam', self.exam.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+
+
+class ExamSnapshotTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.exam = self.create_exam()
+        self.create_question(self.exam, 'Segunda', order=2048)
+        self.create_question(self.exam, 'Primera', answer='Sí', explanation='Porque', order=1024)
+        self.exam.refresh_from_db()
+        self.client.force_login(self.student)
+
+    def url(self, revision=None):
+        revision = self.exam.content_revision if revision is None else revision
+        return reverse('exams:student_exam_snapshot', args=[self.exam.id, revision])
+
+    def test_snapshot_contains_questions_in_order(self):
+        data = json.loads(gzip.decompress(get_snapshot(self.exam)))
+        self.assertEqual(data['revision'], self.exam.content_revision)
+        self.assertEqual(data['fields'], list(SNAPSHOT_FIELDS))
+        self.assertEqual([row[1:4] for row in data['questions']], [['Primera', 'Sí', 'Porque'], ['Segunda', '', '']])
+        self.assertIsNone(data['questions'][0][4])
+
+    def test_snapshot_is_cached_per_revision(self):
+        data = get_snapshot(self.exam)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_snapshot(self.exam), data)
+        self.create_question(self.exam, 'Tercera', order=3072)
+        self.exam.refresh_from_db()
+        self.assertIn('Tercera', gzip.decompress(get_snapshot(self.exam)).decode())
+
+    def test_view_sends_gzip_and_immutable_cache(self):
+        response = self.client.get(self.url(), secure=True, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(response.content))['exam'], self.exam.id)
+
+        response = self.client.get(self.url(), secure=True)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(len(json.loads(response.content)['questions']), 2)
+
+    def test_old_revision_redirects_to_current(self):
+        response = self.client.get(self.url(self.exam.content_revision - 1), secure=True)
+        self.assertRedirects(response, self.url(), fetch_redirect_response=False)
+
+    def test_not_enrolled_student_is_rejected(self):
+        CourseEnrollment.objects.filter(student=self.student).delete()
+        self.assertEqual(self.client.get(self.url(), secure=True).status_code, 403)
+        self.exam.is_active = False
+        self.exam.save()
+        self.assertEqual(self.client.get(self.url(), secure=True).status_code, 404)
+
+
+class QuestionOrderTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.exam = self.create_exam(5)
+        self.ids = list(self.exam.questions.order_by('order').values_list('pk', flat=True))
+
+    def orders(self):
+        return list(self.exam.questions.order_by('order').values_list('pk', 'order'))
+
+    def test_next_order_leaves_a_gap(self):
+        self.assertEqual(next_question_order(self.exam), 6 * ORDER_GAP)
+        self.assertEqual(next_question_order(self.create_exam()), ORDER_GAP)
+
+    def test_moving_one_question_updates_one_row(self):
+        revision = Exam.objects.get(pk=self.exam.pk).content_revision
+        new_ids = [self.ids[4]] + self.ids[:4]
+        self.assertEqual(reorder_questions(self.exam, new_ids), 1)
+        orders = self.orders()
+        self.assertEqual([pk for pk, _ in orders], new_ids)
+        self.assertEqual(orders[0][1], ORDER_GAP // 2)
+        self.assertEqual(Exam.objects.get(pk=self.exam.pk).content_revision, revision + 1)
+
+    def test_reorder_inside_page_keeps_rest_of_exam(self):
+        page = [self.ids[3], self.ids[1], self.ids[2]]
+        reorder_questions(self.exam, page)
+        self.assertEqual([pk for pk, _ in self.orders()], [self.ids[0]] + page + [self.ids[4]])
+        self.assertEqual(reorder_questions(self.exam, page), 0)
+
+    def test_exhausted_gap_compacts_exam(self):
+        Question.objects.filter(pk=self.ids[0]).update(order=1)
+        Question.objects.filter(pk=self.ids[1]).update(order=2)
+        # Entre 1 y 2 no cabe otra pregunta: se vuelve a espaciar el tema
+        reorder_questions(self.exam, [self.ids[0], self.ids[2], self.ids[1]])
+        self.assertEqual(self.orders(), [
+            (self.ids[0], ORDER_GAP), (self.ids[2], ORDER_GAP * 3 // 2), (self.ids[1], 2 * ORDER_GAP),
+            (self.ids[3], 4 * ORDER_GAP), (self.ids[4], 5 * ORDER_GAP),
+        ])
+
+    def test_repeated_orders_compact_exam(self):
+        Question.objects.filter(pk__in=self.ids[1:4]).update(order=2048)
+        reorder_questions(self.exam, [self.ids[3], self.ids[2], self.ids[1]])
+        self.assertEqual([pk for pk, _ in self.orders()],
+                         [self.ids[0], self.ids[3], self.ids[2], self.ids[1], self.ids[4]])
+        orders = [order for _, order in self.orders()]
+        self.assertEqual(len(set(orders)), 5)
+        self.assertEqual((orders[0], orders[-1]), (ORDER_GAP, 5 * ORDER_GAP))
+
+    def test_group_must_be_contiguous(self):
+        for ids in ([self.ids[2], self.ids[0]], [self.ids[4], self.ids[1], self.ids[2]]):
+            with self.subTest(ids=ids), self.assertRaisesMessage(ValueError, 'consecutivas'):
+                reorder_questions(self.exam, ids)
+        # Una pregunta de fuera con el mismo orden que el extremo del grupo
+        # queda dentro de él en el orden visible (order, id)
+        Question.objects.filter(pk=self.ids[1]).update(order=ORDER_GAP)
+        with self.assertRaisesMessage(ValueError, 'consecutivas'):
+            reorder_questions(self.exam, [self.ids[2], self.ids[0]])
+        self.assertEqual([order for _, order in self.orders()], [1024, 1024, 3072, 4096, 5120])
+        reorder_questions(self.exam, [self.ids[1], self.ids[0]])
+        self.assertEqual([pk for pk, _ in self.orders()][:2], [self.ids[1], self.ids[0]])
+
+    def test_invalid_lists_are_rejected(self):
+        other = self.create_exam(1).questions.get().pk
+        for ids, message in (([self.ids[0], self.ids[0]], 'repetidas'), ([self.ids[0], other], 'no pertenecen')):
+            with self.assertRaisesMessage(ValueError, message):
+                reorder_questions(self.exam, ids)
+
+    def test_reorder_view(self):
+        url = reverse('exams:question_reorder', args=[self.exam.id])
+        self.client.force_login(self.admin)
+        response = self.client.post(url, json.dumps({'question_ids': self.ids[::-1]}),
+                                    content_type='application/json', secure=True)
+        self.assertEqual(response.json(), {'success': True, 'updated': 4})
+        for body in ('{', '{"question_ids": []}', '{"question_ids": ["x"]}'):
+            response = self.client.post(url, body, content_type='application/json', secure=True)
+            self.assertEqual(response.status_code, 400)
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.post(url, '{}', content_type='application/json', secure=True).status_code, 403)
+
+    def test_compact_command_respaces_orders(self):
+        Question.objects.filter(pk=self.ids[2]).update(order=2049)
+        out = StringIO()
+        call_command('compact_question_order', str(self.exam.pk), stdout=out)
+        self.assertEqual([order for _, order in self.orders()], [n * ORDER_GAP for n in range(1, 6)])
+        self.assertIn('1 pregunta(s) renumerada(s) en total', out.getvalue())
+        with self.assertRaisesMessage(CommandError, 'Temas inexistentes'):
+            call_command('compact_question_order', '999999', stdout=out)
+
+    def test_image_is_stored_before_locking_exam(self):
+        events = []
+        store = mock.Mock(side_effect=lambda image: events.append('store') or store_image(image))
+        lock = mock.Mock(side_effect=lambda exam: events.append('lock'))
+        self.client.force_login(self.admin)
+        with mock.patch('exams.views.store_image', store), mock.patch('exams.ordering._lock_exam', lock):
+            response = self.client.post(reverse('exams:question_create', args=[self.exam.id]), {
+                'question_text': 'Con imagen', 'answer_text': 'Sí', 'image': png_upload(),
+            }, secure=True)
+        self.assertRedirects(response, reverse('exams:question_manage', args=[self.exam.id]),
+                             fetch_redirect_response=False)
+        self.assertEqual(events, ['store', 'lock'])
+        question = self.exam.questions.get(question_text='Con imagen')
+        self.assertEqual(question.order, 6 * ORDER_GAP)
+        self.assertTrue(question.image.name.startswith('questions/'))
+        self.assertTrue(question.image.storage.exists(question.image.name))
+
+
+class QuestionBatchCreateTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.exam = self.create_exam(1)
+        self.url = reverse('exams:question_batch_create', args=[self.exam.id])
+        self.client.force_login(self.admin)
+
+    def post(self, data):
+        return self.client.post(self.url, data, secure=True)
+
+    def test_creates_all_rows_in_order(self):
+        response = self.post({
+            'question_text': ['Uno', '', 'Dos'],
+            'answer_text': ['a', '', 'b'],
+            'explanation': ['', '', 'Nota'],
+            'image-2': png_upload(),
+        })
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual((data['created'], data['total_questions']), (2, 3))
+        self.assertIn('Uno', data['html'])
+        questions = list(self.exam.questions.order_by('order'))
+        self.assertEqual([question.question_text for question in questions], ['Pregunta 0', 'Uno', 'Dos'])
+        self.assertEqual([question.order for question in questions], [1024, 2048, 3072])
+        self.assertEqual(questions[2].primary_answer.answer_text, 'b')
+        self.assertTrue(questions[2].image.storage.exists(questions[2].image.name))
+
+    def test_invalid_row_saves_nothing(self):
+        response = self.post({
+            'question_text': ['Uno', '', 'Tres'],
+            'answer_text': ['a', 'sin pregunta', ''],
+            'image-2': SimpleUploadedFile('notas.txt', b'texto'),
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['row'] for error in response.json()['errors']], [2, 3])
+        self.assertEqual(self.exam.questions.count(), 1)
+
+    def test_empty_and_oversized_batches(self):
+        self.assertEqual(self.post({'question_text': ['', '']}).status_code, 400)
+        response = self.post({'question_text': ['P'] * (MAX_BATCH_QUESTIONS + 1)})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(MAX_BATCH_QUESTIONS), response.json()['error'])
+
+    def test_requires_admin(self):
+        self.client.force_login(self.student)
+        self.assertEqual(self.post({'question_text': ['Uno']}).status_code, 403)
+        self.assertEqual(self.exam.questions.count(), 1)
+
+
+class GradingTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.exam = self.create_exam()
+        self.capital = self.create_question(self.exam, 'Capital de Francia', 'París', marks=2)
+        self.right = self.capital.answers.get()
+        self.wrong = Answer.objects.create(question=self.capital, answer_text='Lyon', is_correct=False, order=2)
+        self.water = self.create_question(self.exam, 'H2O', 'Agua', order=1)
+        self.other = self.create_student('otro')
+
+    def marks(self, result):
+        result.refresh_from_db()
+        return result.status, result.marks_obtained
+
+    def test_normalize_text(self):
+        self.assertEqual(normalize_text('  ¿Árbol   GRANDE? '), 'arbol grande')
+        self.assertEqual(normalize_text(None), '')
+
+    def test_grades_completed_results(self):
+        good = self.create_result(self.exam, self.student, [(self.capital, self.right), (self.water, ' agua. ')])
+        bad = self.create_result(self.exam, self.other, [(self.capital, self.wrong), (self.water, 'fuego')])
+        pending = self.create_result(self.exam, self.create_student('tercero'), [(self.water, 'Agua')], status='pending')
+
+        report = grade_exam(self.exam, graded_by=self.admin, batch_size=1)
+        self.assertEqual((report.results, report.results_updated), (2, 2))
+        self.assertEqual((report.answers, report.answers_updated), (4, 2))
+        self.assertEqual(self.marks(good), ('graded', Decimal('3.00')))
+        self.assertEqual(self.marks(bad), ('graded', Decimal('0.00')))
+        self.assertEqual(good.graded_by, self.admin)
+        self.assertEqual(self.marks(pending), ('pending', None))
+        self.assertEqual(
+            list(good.student_answers.order_by('question__order').values_list('is_correct', 'marks_obtained')),
+            [(True, Decimal('2.00')), (True, Decimal('1.00'))],
+        )
+
+        # Lo ya calificado no se vuelve a procesar sin regrade
+        self.assertEqual(grade_exam(self.exam).results, 0)
+
+    def test_regrade_applies_corrected_key(self):
+        bad = self.create_result(self.exam, self.other, [(self.capital, self.wrong)])
+        grade_exam(self.exam)
+        self.wrong.is_correct = True
+        self.wrong.save()
+        self.assertEqual(grade_exam(self.exam).results, 0)
+        report = grade_exam(self.exam, regrade=True)
+        self.assertEqual((report.results_updated, report.answers_updated), (1, 1))
+        self.assertEqual(self.marks(bad), ('graded', Decimal('2.00')))
+        # Sin cambios no se escribe nada
+        report = grade_exam(self.exam, regrade=True)
+        self.assertEqual((report.results_updated, report.answers_updated), (0, 0))
+
+    def test_exam_without_results(self):
+        report = grade_exam(self.exam)
+        self.assertEqual((report.results, report.answers), (0, 0))
+
+    def test_command(self):
+        self.create_result(self.exam, self.student, [(self.water, 'agua')])
+        out = StringIO()
+        call_command('grade_exam', str(self.exam.pk), stdout=out)
+        self.assertIn(f'Tema {self.exam.pk}: 1 resultado(s), 1 actualizado(s)', out.getvalue())
+        with self.assertRaisesMessage(CommandError, 'Temas inexistentes: 999999'):
+            call_command('grade_exam', '999999', stdout=out)
+
+
+class ItemAnalysisTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.exam = self.create_exam()
+        self.first = self.create_question(self.exam, 'Primera', 'Sí', order=1)
+        self.second = self.create_question(self.exam, 'Segunda', 'Sí', order=2)
+        self.right = [self.first.answers.get(), self.second.answers.get()]
+        self.wrong = [
+            Answer.objects.create(question=question, answer_text='No', is_correct=False, order=2)
+            for question in (self.first, self.second)
+        ]
+
+    def test_item_statistics(self):
+        matrix = np.array([[1, 1], [1, 0], [0, 0]], dtype=np.uint8)
+        p_values, discrimination, totals, kr20 = item_statistics(matrix)
+        np.testing.assert_allclose(p_values, [2 / 3, 1 / 3])
+        np.testing.assert_allclose(discrimination, [0.5, 0.5])
+        np.testing.assert_allclose(totals, [2, 1, 0])
+        self.assertAlmostEqual(kr20, 2 / 3)
+
+    def test_item_statistics_without_variance(self):
+        p_values, discrimination, _, kr20 = item_statistics(np.ones((3, 2), dtype=np.uint8))
+        np.testing.assert_allclose(p_values, [1, 1])
+        self.assertTrue(np.isnan(discrimination).all())
+        self.assertTrue(np.isnan(kr20))
+        self.assertTrue(np.isnan(item_statistics(np.zeros((0, 2), dtype=np.uint8))[3]))
+
+    def test_analyze_exam_saves_statistics(self):
+        choices = ((self.right[0], self.right[1]), (self.right[0], self.wrong[1]), (self.wrong[0], self.wrong[1]))
+        for index, (first, second) in enumerate(choices):
+            self.create_result(self.exam, self.create_student(f'alumno{index}'),
+                               [(self.first, first), (self.second, second)])
+        # Los resultados sin calificar no se consideran
+        self.create_result(self.exam, self.student, [(self.first, self.right[0])], status='pending')
+        grade_exam(self.exam)
+
+        analysis = analyze_exam(self.exam)
+        self.assertEqual((analysis.students, analysis.questions), (3, 2))
+        self.assertEqual(analysis.mean_score, 1.0)
+        self.assertAlmostEqual(analysis.kr20, 0.6667)
+
+        first, second = (QuestionAnalysis.objects.get(question=question) for question in (self.first, self.second))
+        self.assertEqual((first.responses, first.p_value, first.discrimination), (3, 0.6667, 0.5))
+        self.assertEqual(second.p_value, 0.3333)
+        self.assertEqual(second.distractors, [
+            {'answer': self.right[1].id, 'is_correct': True, 'count': 1, 'proportion': 0.3333, 'mean_score': 2.0},
+            {'answer': self.wrong[1].id, 'is_correct': False, 'count': 2, 'proportion': 0.6667, 'mean_score': 0.5},
+        ])
+
+        # Recalcular actualiza las mismas filas
+        ExamResult.objects.filter(student__username='alumno2').delete()
+        analyze_exam(self.exam)
+        self.assertEqual(ExamAnalysis.objects.get(exam=self.exam).students, 2)
+        self.assertEqual(QuestionAnalysis.objects.get(question=self.first).p_value, 1.0)
+        self.assertEqual(QuestionAnalysis.objects.get(question=self.first).flag, 'Muy fácil')
+
+    def test_analyze_exam_without_results(self):
+        analysis = analyze_exam(self.exam)
+        self.assertEqual(analysis.students, 0)
+        self.assertIsNone(analysis.kr20)
+        self.assertIsNone(QuestionAnalysis.objects.get(question=self.first).p_value)
+
+    def test_refresh_view_enqueues_job(self):
+        self.client.force_login(self.admin)
+        url = reverse('exams:exam_analysis_refresh', args=[self.exam.id])
+        self.client.post(url, secure=True)
+        self.client.post(url, secure=True)
+        self.assertEqual(Job.objects.filter(name='exams.analyze_exam', key=f'analyze_exam:{self.exam.id}').count(), 1)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('analyze_exam', str(self.exam.pk), stdout=out)
+        self.assertIn(f'Tema {self.exam.pk}: 0 estudiante(s), 2 pregunta(s), KR-20 -', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('analyze_exam', '999999', stdout=out)
+
+
+class ResultScoreTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.exam = self.create_exam(total_marks=Decimal('20'), passing_marks=Decimal('11'))
+
+    def scored(self, result):
+        return ExamResult.objects.with_scores().get(pk=result.pk)
+
+    def test_annotations_match_python_methods(self):
+        for index, marks in enumerate((Decimal('15'), Decimal('11'), Decimal('10.50'), None)):
+            result = self.create_result(self.exam, self.create_student(f'alumno{index}'), marks_obtained=marks)
+            annotated = self.scored(result)
+            self.assertEqual(annotated.get_percentage(), ExamResult.objects.get(pk=result.pk).get_percentage())
+            self.assertEqual(annotated.is_passed(), ExamResult.objects.get(pk=result.pk).is_passed())
+        self.assertEqual(self.scored(ExamResult.objects.get(student__username='alumno0')).percentage, Decimal('75'))
+        self.assertEqual(
+            list(ExamResult.objects.with_scores().order_by('student__username').values_list('passed', flat=True)),
+            [True, True, False, False],
+        )
+
+    def test_exam_without_total_marks(self):
+        exam = self.create_exam(title='Sin puntaje')
+        result = self.scored(self.create_result(exam, self.student, marks_obtained=Decimal('3')))
+        self.assertEqual(result.get_percentage(), 0)
+        self.assertTrue(result.is_passed())
+
+    def test_related_objects_are_joined(self):
+        result = self.create_result(self.exam, self.student, marks_obtained=Decimal('12'))
+        result = self.scored(result)
+        with self.assertNumQueries(0):
+            self.assertEqual(str(result), 'student - Tema')
+
+    def test_admin_changelist_runs_fixed_queries(self):
+        superuser = User.objects.create_superuser(username='root', password='x', email='root@example.com')
+        self.client.force_login(superuser)
+        url = reverse('admin:exams_examresult_changelist')
+
+        def count():
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url, secure=True)
+            self.assertEqual(response.status_code, 200)
+            return len(ctx.captured_queries)
+
+        self.create_result(self.exam, self.student, marks_obtained=Decimal('12'))
+        few = count()
+        for index in range(5):
+            self.create_result(self.exam, self.create_student(f'alumno{index}'), marks_obtained=Decimal(index))
+        self.assertEqual(count(), few)
+
+    def test_student_cannot_see_other_results(self):
+        other = self.create_result(self.exam, self.create_student('otro'), marks_obtained=Decimal('15'))
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('exams:student_exam_result', args=[other.id]), secure=True)
+        self.assertEqual(response.status_code, 404)
+
+
+class AttemptAutosaveTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.exam = self.create_exam(2)
+        self.first, self.second = self.exam.questions.order_by('order')
+        self.right = self.first.answers.get()
+        self.wrong = Answer.objects.create(question=self.first, answer_text='Otra', is_correct=False, order=2)
+        self.result = self.create_result(self.exam, self.student, status='pending')
+        self.url = reverse('exams:student_autosave_answers', args=[self.result.id])
+
+    def autosave(self, body):
+        if not isinstance(body, str):
+            body = json.dumps(body)
+        return self.client.post(self.url, body, content_type='application/json', secure=True)
+
+    def test_clean_deltas_keeps_last_value(self):
+        deltas = clean_deltas(self.exam, [
+            {'question': self.first.id, 'answer': self.wrong.id},
+            {'question': str(self.second.id), 'answer': '', 'text': '  escrita  '},
+            {'question': self.first.id, 'answer': self.right.id, 'text': None},
+        ])
+        self.assertEqual(deltas, {self.first.id: (self.right.id, None), self.second.id: (None, 'escrita')})
+
+    def test_clean_deltas_errors(self):
+        other = self.create_exam(1).questions.get()
+        cases = (
+            ([], 'Debes enviar'),
+            ({'question': self.first.id}, 'Debes enviar'),
+            ([{'question': self.first.id}] * (MAX_DELTAS + 1), 'No se pueden guardar'),
+            (['texto'], 'objeto'),
+            ([{'answer': self.right.id}], '"question"'),
+            ([{'question': self.first.id, 'answer': 'x'}], '"question"'),
+            ([{'question': self.first.id, 'text': 5}], 'texto'),
+            ([{'question': other.id}], 'no pertenecen'),
+            ([{'question': self.second.id, 'answer': self.right.id}], 'no pertenece a la pregunta'),
+        )
+        for items, message in cases:
+            with self.subTest(items=items), self.assertRaisesMessage(ValueError, message):
+                clean_deltas(self.exam, items)
+
+    def test_save_answers_upserts(self):
+        save_answers(self.result, {self.first.id: (self.wrong.id, None), self.second.id: (None, 'uno')})
+        save_answers(self.result, {self.first.id: (self.right.id, None)})
+        # Repetir el mismo lote deja el mismo estado
+        save_answers(self.result, {self.first.id: (self.right.id, None)})
+        self.assertEqual(saved_answers(self.result), {
+            self.first.id: (self.right.id, None), self.second.id: (None, 'uno'),
+        })
+        self.assertEqual(self.result.student_answers.count(), 2)
+
+    def test_closed_attempts_reject_changes(self):
+        self.exam.duration_minutes = 10
+        self.result.exam = self.exam
+        deltas = {self.first.id: (self.right.id, None)}
+        late = self.result.created_at + timedelta(minutes=10, seconds=31)
+        with self.assertRaisesMessage(AttemptClosed, 'tiempo'):
+            save_answers(self.result, deltas, now=late)
+        save_answers(self.result, deltas, now=late - timedelta(seconds=2))
+
+        # Fuera de tiempo se envía lo ya guardado
+        submit_attempt(self.result, {self.first.id: (self.wrong.id, None)}, now=late)
+        self.result.refresh_from_db()
+        self.assertEqual(self.result.status, 'completed')
+        self.assertEqual(saved_answers(self.result), {self.first.id: (self.right.id, None)})
+        with self.assertRaisesMessage(AttemptClosed, 'enviado'):
+            save_answers(self.result, deltas)
+        with self.assertRaises(AttemptClosed):
+            submit_attempt(self.result)
+
+    def test_autosave_view(self):
+        self.client.force_login(self.student)
+        response = self.autosave({'answers': [{'question': self.first.id, 'answer': self.right.id}]})
+        self.assertEqual(response.json(), {'success': True, 'saved': 1, 'remaining_seconds': None})
+        self.assertEqual(self.autosave('{').status_code, 400)
+        response = self.autosave({'answers': [{'question': 0}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('no pertenecen', response.json()['error'])
+
+        submit_attempt(self.result)
+        response = self.autosave({'answers': [{'question': self.first.id, 'answer': self.wrong.id}]})
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(response.json()['closed'])
+        self.assertEqual(saved_answers(self.result), {self.first.id: (self.right.id, None)})
+
+    def test_autosave_view_permissions(self):
+        self.client.force_login(self.admin)
+        self.assertEqual(self.autosave({'answers': []}).status_code, 403)
+        self.client.force_login(self.create_student('otro'))
+        self.assertEqual(self.autosave({'answers': []}).status_code, 404)
+
+    def test_attempt_page_restores_and_submits_answers(self):
+        self.client.force_login(self.student)
+        save_answers(self.result, {self.second.id: (None, 'guardada')})
+        url = reverse('exams:student_attempt_exam', args=[self.exam.id])
+        response = self.client.get(url, secure=True)
+        self.assertContains(response, 'guardada')
+
+        response = self.client.post(url, {
+            f'question_{self.first.id}': self.right.id, f'text_{self.second.id}': 'final',
+        }, secure=True)
+        self.assertRedirects(response, reverse('exams:student_course_exams', args=[self.course.id]),
+                             fetch_redirect_response=False)
+        self.result.refresh_from_db()
+        self.assertEqual(self.result.status, 'completed')
+        self.assertEqual(saved_answers(self.result)[self.second.id], (None, 'final'))
+
+
+class JobQueueTests(TestCase):
+    def test_enqueue_deduplicates_by_key(self):
+        job = enqueue('tests.echo', key='eco', value=1)
+        self.assertEqual(enqueue('tests.echo', key='eco', value=2).pk, job.pk)
+        self.assertNotEqual(enqueue('tests.echo', value=3).pk, job.pk)
+        with self.assertRaisesMessage(LookupError, 'no está registrada'):
+            enqueue('tests.desconocida')
+
+    def test_claim_order(self):
+        later = enqueue('tests.echo', value='después', run_at=timezone.now() + timedelta(hours=1))
+        low = enqueue('tests.echo', value='baja')
+        high = enqueue('tests.echo', value='alta', priority=5)
+        self.assertEqual(claim_job('w1').pk, high.pk)
+        job = claim_job('w2')
+        self.assertEqual((job.pk, job.status, job.attempts, job.worker), (low.pk, 'running', 1, 'w2'))
+        # Las tareas en ejecución o programadas para después no se toman
+        self.assertIsNone(claim_job('w3'))
+        self.assertEqual(Job.objects.get(pk=later.pk).status, 'queued')
+
+    def test_run_job_saves_result(self):
+        job = enqueue('tests.echo', key='eco', value=7)
+        self.assertTrue(run_job(claim_job('w')))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.worker), ('done', {'value': 7}, ''))
+        self.assertIsNotNone(job.finished_at)
+        # Con la tarea terminada la misma clave se puede volver a encolar
+        self.assertNotEqual(enqueue('tests.echo', key='eco', value=8).pk, job.pk)
+
+    def test_failed_job_retries_with_backoff_then_fails(self):
+        job = enqueue('tests.fail')
+        with self.assertLogs('exams.jobs', 'ERROR'):
+            self.assertFalse(run_job(claim_job('w')))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertIn('Falla de prueba', job.last_error)
+        self.assertGreater(job.run_at, timezone.now())
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('exams.jobs', 'ERROR'):
+            run_job(claim_job('w'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+
+        self.assertEqual(retry_jobs(Job.objects.all()), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 0))
+
+    def test_requeue_stale_jobs(self):
+        stale = enqueue('tests.echo', value=1)
+        exhausted = enqueue('tests.fail')
+        long_running = enqueue('tests.echo', value=2)
+        for job in (stale, exhausted, long_running):
+            claim_job('muerto')
+        Job.objects.filter(pk=exhausted.pk).update(attempts=2)
+        hour_ago = timezone.now() - timedelta(hours=1)
+        Job.objects.update(started_at=hour_ago, heartbeat_at=hour_ago)
+        # Empezó hace una hora pero su worker sigue renovando el latido
+        Job.objects.filter(pk=long_running.pk).update(heartbeat_at=timezone.now())
+        self.assertEqual(requeue_stale_jobs(60), 2)
+        self.assertEqual(Job.objects.get(pk=stale.pk).status, 'queued')
+        self.assertEqual(Job.objects.get(pk=exhausted.pk).status, 'failed')
+        self.assertEqual(Job.objects.get(pk=long_running.pk).status, 'running')
+        self.assertEqual(requeue_stale_jobs(60), 0)
+
+    def test_same_key_never_runs_twice_at_once(self):
+        first = enqueue('tests.echo', key='eco', value=1)
+        self.assertEqual(claim_job('w1').pk, first.pk)
+        # Un cambio durante la ejecución encola una sola tarea más, que espera
+        follow_up = enqueue('tests.echo', key='eco', value=2)
+        self.assertNotEqual(follow_up.pk, first.pk)
+        self.assertEqual(enqueue('tests.echo', key='eco', value=3).pk, follow_up.pk)
+        other = enqueue('tests.echo', value=4)
+        self.assertEqual(claim_job('w2').pk, other.pk)
+        self.assertIsNone(claim_job('w2'))
+
+        run_job(Job.objects.get(pk=first.pk))
+        self.assertEqual(claim_job('w2').pk, follow_up.pk)
+
+    def test_result_is_not_saved_by_a_worker_that_lost_the_job(self):
+        enqueue('tests.echo', value=1)
+        job = claim_job('w1')
+        Job.objects.filter(pk=job.pk).update(status='queued', worker='')
+        self.assertEqual(claim_job('w2').pk, job.pk)
+        run_job(job)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, 'running')
+
+
+class JobHeartbeatTests(TransactionTestCase):
+    def test_running_job_renews_heartbeat(self):
+        enqueue('tests.sleep', seconds=0.3)
+        job = claim_job('w')
+        started = job.heartbeat_at
+        with mock.patch('exams.jobs.settings.JOB_HEARTBEAT_INTERVAL', 0.05):
+            self.assertTrue(run_job(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        self.assertGreater(job.heartbeat_at, started)
+
+
+@skipUnless(connection.features.has_select_for_update_skip_locked, 'Requiere SELECT ... FOR UPDATE SKIP LOCKED')
+class JobSkipLockedTests(TransactionTestCase):
+    def test_locked_job_is_skipped(self):
+        first = enqueue('tests.echo', value=1, priority=1)
+        second = enqueue('tests.echo', value=2)
+        claimed = []
+
+        def claim():
+            try:
+                claimed.append(claim_job('otro'))
+            finally:
+                connections.close_all()
+
+        with transaction.atomic():
+            # Otro worker tiene tomada la primera tarea
+            Job.objects.select_for_update().get(pk=first.pk)
+            thread = threading.Thread(target=claim)
+            thread.start()
+            thread.join()
+        self.assertEqual(claimed[0].pk, second.pk)
+        self.assertEqual(Job.objects.get(pk=first.pk).status, 'queued')
+
+
+class SoftDeleteTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.exam = self.create_exam(3)
+        self.create_result(self.exam, self.student, [(self.exam.questions.first(), 'x')])
+        self.client.force_login(self.admin)
+
+    def test_course_delete_hides_course_and_deletes_in_background(self):
+        updated_at = self.exam.updated_at
+        revision = Exam.objects.get(pk=self.exam.pk).content_revision
+        response = self.client.post(reverse('exams:course_delete', args=[self.course.id]), secure=True)
+        self.assertRedirects(response, reverse('exams:course_list'), fetch_redirect_response=False)
+
+        exam = Exam.objects.get(pk=self.exam.pk)
+        self.assertGreater(exam.updated_at, updated_at)
+        self.assertEqual(exam.content_revision, revision + 1)
+        self.assertNotIn(self.course, self.client.get(reverse('exams:course_list'), secure=True).context['courses'])
+        for url in (reverse('exams:course_edit', args=[self.course.id]),
+                    reverse('exams:exam_edit', args=[self.exam.id]),
+                    reverse('exams:question_manage', args=[self.exam.id])):
+            self.assertEqual(self.client.get(url, secure=True).status_code, 404)
+        response = self.client.post(reverse('exams:course_delete', args=[self.course.id]), secure=True)
+        self.assertEqual(response.status_code, 404)
+
+        job = Job.objects.get(name='exams.delete_course')
+        self.assertEqual(job.payload, {'course_id': self.course.id})
+        self.assertEqual(job.created_by, self.admin)
+        self.assertEqual(delete_course(self.course.id), {'course': self.course.id, 'questions': 3})
+        self.assertFalse(Course.objects.filter(pk=self.course.pk).exists())
+        self.assertFalse(StudentAnswer.objects.exists())
+
+    def test_exam_delete_hides_exam(self):
+        response = self.client.post(reverse('exams:exam_delete', args=[self.exam.id]), secure=True)
+        self.assertRedirects(response, reverse('exams:exam_list', args=[self.course.id]),
+                             fetch_redirect_response=False)
+        response = self.client.get(reverse('exams:exam_list', args=[self.course.id]), secure=True)
+        self.assertEqual(list(response.context['exams']), [])
+        response = self.client.post(reverse('exams:exam_edit', args=[self.exam.id]), {'title': 'X'}, secure=True)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Exam.objects.get(pk=self.exam.pk).title, 'Tema')
+
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('exams:student_take_exam', args=[self.exam.id]), secure=True)
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('exams:student_course_exams', args=[self.course.id]), secure=True)
+        self.assertEqual(list(response.context['exams']), [])
+
+        result = delete_exam(self.exam.id)
+        self.assertEqual((result['questions'], result['student_answers']), (3, 1))
+        self.assertFalse(Exam.objects.filter(pk=self.exam.pk).exists())
+
+    def test_delete_requires_admin(self):
+        self.client.force_login(self.student)
+        self.client.post(reverse('exams:course_delete', args=[self.course.id]), secure=True)
+        self.assertIsNone(Course.objects.get(pk=self.course.pk).deleted_at)
+        self.assertFalse(Job.objects.exists())
+
+    def test_inactive_content_stays_editable_for_admins(self):
+        Course.objects.filter(pk=self.course.pk).update(is_active=False)
+        Exam.objects.filter(pk=self.exam.pk).update(is_active=False)
+        self.assertIn(self.course, self.client.get(reverse('exams:course_list'), secure=True).context['courses'])
+        response = self.client.get(reverse('exams:exam_list', args=[self.course.id]), secure=True)
+        self.assertEqual(list(response.context['exams']), [self.exam])
+        for url in (reverse('exams:course_edit', args=[self.course.id]),
+                    reverse('exams:exam_edit', args=[self.exam.id]),
+                    reverse('exams:question_manage', args=[self.exam.id])):
+            self.assertEqual(self.client.get(url, secure=True).status_code, 200)
+
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('exams:student_take_exam', args=[self.exam.id]), secure=True)
+        self.assertEqual(response.status_code, 404)
+
+    def test_restored_content_is_not_deleted(self):
+        self.client.post(reverse('exams:course_delete', args=[self.course.id]), secure=True)
+        self.client.post(reverse('exams:exam_delete', args=[self.exam.id]), secure=True)
+        self.assertEqual(self.client.get(reverse('exams:exam_edit', args=[self.exam.id]), secure=True).status_code, 404)
+        # Restaurado desde el admin de Django antes de que corra la tarea
+        Course.objects.filter(pk=self.course.pk).update(deleted_at=None)
+        Exam.objects.filter(pk=self.exam.pk).update(deleted_at=None)
+        self.assertEqual(delete_course(self.course.id), {'course': self.course.id, 'deleted': False})
+        self.assertEqual(delete_exam(self.exam.id), {'exam': self.exam.id, 'deleted': False})
+        self.assertEqual(self.exam.questions.count(), 3)
+        self.assertEqual(self.client.get(reverse('exams:exam_edit', args=[self.exam.id]), secure=True).status_code, 200)
+
+
+class DuplicateDetectionTests(ExamTestCase):
+    BASE = '¿Cuál es la capital de Francia y en qué río se encuentra ubicada esa ciudad europea?'
+    NEAR = '¿Cuál es la capital de Francia y en qué río se encuentra ubicada esta ciudad europea?'
+    SAME = 'Cual es la capital de Francia, y en que rio se encuentra ubicada esa ciudad europea'
+    OTHER = 'Explique el ciclo de Krebs y su importancia en la respiración celular aeróbica.'
+    KREBS = 'Explique el ciclo de Krebs y su importancia en la respiración celular aerobia.'
+
+    def setUp(self):
+        super().setUp()
+        self.exam = self.create_exam()
+        self.other_exam = self.create_exam(title='Otro tema')
+
+    def test_shingles_and_signature(self):
+        self.assertEqual(shingles('¡Hola, MUNDO!'), {'hola', 'ola ', 'la m', 'a mu', ' mun', 'mund', 'undo'})
+        self.assertEqual(shingles('Sí'), {'si'})
+        self.assertEqual(shingles('¿?'), set())
+        self.assertIsNone(signature('...'))
+        sig = signature(self.BASE)
+        self.assertEqual((sig.dtype, sig.shape), (np.uint32, (NUM_PERM,)))
+        self.assertEqual(len(buckets(sig)), BANDS)
+
+    def test_similarity_estimates_jaccard(self):
+        base = signature(self.BASE)
+        self.assertEqual(similarity(base, signature(self.SAME)), 1.0)
+        self.assertEqual(buckets(base), buckets(signature(self.SAME)))
+        self.assertGreaterEqual(similarity(base, signature(self.NEAR)), 0.8)
+        self.assertLess(similarity(base, signature(self.OTHER)), 0.2)
+
+    def test_questions_are_indexed_on_save(self):
+        question = self.create_question(self.exam, self.BASE)
+        stored = bytes(QuestionSignature.objects.get(question=question).signature)
+        self.assertEqual(stored, signature(self.BASE).tobytes())
+        self.assertEqual(QuestionBucket.objects.filter(question=question).count(), BANDS)
+        # Sin cambios no se reescribe nada
+        self.assertEqual(index_questions([(question.pk, self.SAME)]), 0)
+        self.assertEqual(index_questions([(question.pk, '¿?')]), 1)
+        self.assertFalse(QuestionSignature.objects.filter(question=question).exists())
+        self.assertFalse(QuestionBucket.objects.filter(question=question).exists())
+
+    def test_find_similar_in_same_course(self):
+        question = self.create_question(self.exam, self.BASE)
+        same = self.create_question(self.other_exam, self.SAME)
+        near = self.create_question(self.other_exam, self.NEAR)
+        self.create_question(self.other_exam, self.OTHER)
+        other_course = Course.objects.create(name='Otro curso', created_by=self.admin)
+        self.create_question(Exam.objects.create(course=other_course, title='Ajeno', created_by=self.admin), self.BASE)
+        hidden = self.create_exam(title='Borrado', deleted_at=timezone.now())
+        self.create_question(hidden, self.BASE)
+
+        found = find_similar(question)
+        self.assertEqual([other for other, _ in found], [same, near])
+        self.assertEqual(found[0][1], 1.0)
+        self.assertEqual(find_similar(Question(exam=self.exam, question_text='¿?')), [])
+
+    def test_find_similar_many_in_one_pass(self):
+        base = self.create_question(self.exam, self.BASE)
+        same = self.create_question(self.other_exam, self.SAME)
+        near = self.create_question(self.other_exam, self.NEAR)
+        other = self.create_question(self.exam, self.OTHER)
+        krebs = self.create_question(self.other_exam, self.KREBS)
+        questions = list(Question.objects.select_related('exam').order_by('id'))
+
+        # Cubetas, firmas y preguntas: tres consultas sin importar cuántas preguntas se revisen
+        with self.assertNumQueries(3):
+            found = find_similar_many(questions, limit=1)
+        self.assertEqual(
+            {pk: [(match.pk, score) for match, score in similar] for pk, similar in found.items()},
+            {
+                question.pk: [(match.pk, score) for match, score in find_similar(question, limit=1)]
+                for question in questions
+            },
+        )
+        self.assertEqual([match for match, _ in found[near.pk]], [base])
+        self.assertEqual([match for match, _ in found[other.pk]], [krebs])
+        self.assertEqual([match for match, _ in found[same.pk]], [base])
+        self.assertEqual(find_similar_many([Question(exam=self.exam, question_text='¿?')]), {})
+
+    def test_batch_create_reports_duplicates(self):
+        self.create_question(self.other_exam, self.BASE)
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('exams:question_batch_create', args=[self.exam.id]), {
+            'question_text': [self.SAME, self.OTHER, self.NEAR], 'answer_text': ['', '', ''],
+        }, secure=True)
+        created = dict(self.exam.questions.values_list('question_text', 'id'))
+        original = self.other_exam.questions.get().pk
+        self.assertEqual(response.json()['duplicates'], [
+            {'question': created[self.NEAR], 'similar': [original, created[self.SAME]]},
+            {'question': created[self.SAME], 'similar': [original, created[self.NEAR]]},
+        ])
+
+    def test_duplicate_groups(self):
+        first = [self.create_question(self.exam, text) for text in (self.BASE, self.SAME)]
+        first.append(self.create_question(self.other_exam, self.NEAR))
+        second = [self.create_question(self.exam, self.OTHER), self.create_question(self.other_exam, self.KREBS)]
+        self.create_question(self.exam, 'Una pregunta sin parecido con ninguna otra del banco')
+        # El reporte no indexa: las preguntas sin firma no se comparan
+        QuestionSignature.objects.all().delete()
+        QuestionBucket.objects.all().delete()
+        self.assertEqual(duplicate_groups(Question.objects.filter(exam__course=self.course)), [])
+        self.assertEqual(index_queryset(Question.objects.all()), 6)
+
+        groups = duplicate_groups(Question.objects.filter(exam__course=self.course))
+        self.assertEqual([group['size'] for group in groups], [3, 2])
+        self.assertEqual(groups[0]['questions'], first)
+        self.assertEqual(groups[1]['questions'], second)
+        self.assertGreaterEqual(groups[0]['similarity'], 0.8)
+        self.assertEqual(len(duplicate_groups(Question.objects.all(), limit=1)), 1)
+        self.assertEqual(duplicate_groups(Question.objects.filter(pk=first[0].pk)), [])
+
+    def test_duplicates_view_and_create_warning(self):
+        self.create_question(self.other_exam, self.BASE)
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('exams:course_duplicates', args=[self.course.id]), secure=True)
+        self.assertEqual(response.context['groups'], [])
+
+        response = self.client.post(reverse('exams:question_create', args=[self.exam.id]), {
+            'question_text': self.SAME, 'answer_text': 'París',
+        }, secure=True, follow=True)
+        self.assertContains(response, 'La pregunta se parece a otras del curso')
+        response = self.client.get(reverse('exams:course_duplicates', args=[self.course.id]), secure=True)
+        self.assertEqual([group['size'] for group in response.context['groups']], [2])
+        self.assertEqual(response.context['pending'], 0)
+        self.assertFalse(Job.objects.filter(name='exams.index_duplicates').exists())
+
+    def test_report_queues_unindexed_questions(self):
+        self.create_question(self.exam, self.BASE)
+        self.create_question(self.other_exam, self.SAME)
+        QuestionSignature.objects.all().delete()
+        QuestionBucket.objects.all().delete()
+        self.client.force_login(self.admin)
+        url = reverse('exams:course_duplicates', args=[self.course.id])
+        for _ in range(2):
+            response = self.client.get(url, secure=True)
+            self.assertEqual((response.context['pending'], response.context['groups']), (2, []))
+            self.assertContains(response, 'aún no están indexadas')
+        job = Job.objects.get(name='exams.index_duplicates')
+        self.assertEqual((job.key, job.payload), (f'index_duplicates:{self.course.pk}', {'course_id': self.course.pk}))
+
+        self.assertEqual(index_duplicates_task(self.course.pk), {'course': self.course.pk, 'indexed': 2})
+        response = self.client.get(url, secure=True)
+        self.assertEqual([group['size'] for group in response.context['groups']], [2])
+
+    def test_index_command(self):
+        self.create_question(self.exam, self.BASE)
+        QuestionSignature.objects.all().delete()
+        out = StringIO()
+        call_command('index_duplicates', stdout=out)
+        self.assertIn('1 pregunta(s) indexada(s)', out.getvalue())
+        call_command('index_duplicates', stdout=out)
+        self.assertIn('0 pregunta(s) indexada(s)', out.getvalue())
+
+
+class ShuffleTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.exam = self.create_exam(45, shuffle_questions=True)
+        self.ids = list(self.exam.questions.values_list('id', flat=True))
+
+    def expected(self, student, attempt=0):
+        seed = shuffle_seed(student.pk, self.exam.pk, attempt)
+        return sorted(self.ids, key=lambda pk: (shuffle_key(pk, seed), pk))
+
+    def page_ids(self, response):
+        return [question.id for question in response.context['questions']]
+
+    def rendered_texts(self, response):
+        return re.findall(r'<div class="cell-content">(Pregunta \d+)</div>', response.content.decode())
+
+    def texts(self, ids):
+        questions = Question.objects.in_bulk(ids)
+        return [questions[pk].question_text for pk in ids]
+
+    def test_prime_allows_cube_permutation(self):
+        self.assertEqual(PRIME % 3, 2)
+        self.assertTrue(all(PRIME % divisor for divisor in range(2, int(PRIME ** 0.5) + 1)))
+
+    def test_key_is_a_bijection(self):
+        # Con un primo pequeño (también ≡ 2 mod 3) se puede recorrer todo Z_p
+        with mock.patch('exams.shuffle.PRIME', 101):
+            for student_id in range(1, 20):
+                seed = shuffle_seed(student_id, 1)
+                self.assertEqual(sorted(shuffle_key(pk, seed) for pk in range(101)), list(range(101)))
+
+    def test_seed_is_deterministic(self):
+        self.assertEqual(shuffle_seed(1, 2), shuffle_seed(1, 2))
+        self.assertNotEqual(shuffle_seed(1, 2), shuffle_seed(2, 2))
+        self.assertNotEqual(shuffle_seed(1, 2), shuffle_seed(1, 2, attempt=1))
+        seed = shuffle_seed(1, 2)
+        self.assertEqual(seed_data(seed), {
+            'p': str(PRIME), 'a': str(seed.a), 'b': str(seed.b), 'c': str(seed.c), 'd': str(seed.d),
+        })
+
+    def test_sql_key_matches_python(self):
+        seed = shuffle_seed(self.student.pk, self.exam.pk)
+        rows = shuffled(self.exam.questions, seed).values_list('id', 'shuffle_key')
+        self.assertEqual({pk: key for pk, key in rows}, {pk: shuffle_key(pk, seed) for pk in self.ids})
+        ordered = list(shuffled(self.exam.questions, seed).order_by(*SHUFFLE_ORDERING).values_list('id', flat=True))
+        self.assertEqual(ordered, self.expected(self.student))
+        self.assertNotEqual(ordered, sorted(self.ids))
+
+    def test_cursor_pages_cover_every_question_once(self):
+        seed = shuffle_seed(self.student.pk, self.exam.pk)
+        paginator = KeysetPaginator(shuffled(self.exam.questions, seed), 10, ordering=SHUFFLE_ORDERING)
+        page = paginator.get_page(None)
+        seen = [question.id for question in page]
+        while page.has_next():
+            page = paginator.get_page(page.next_cursor())
+            seen += [question.id for question in page]
+        self.assertEqual(seen, self.expected(self.student))
+
+    def test_each_student_sees_own_order(self):
+        url = reverse('exams:student_take_exam', args=[self.exam.id])
+        other = self.create_student('otro')
+        self.client.force_login(self.student)
+        response = self.client.get(url, secure=True)
+        self.assertEqual(self.rendered_texts(response), self.texts(self.expected(self.student)[:40]))
+        self.assertEqual(response.context['shuffle_seed'], seed_data(shuffle_seed(self.student.pk, self.exam.pk)))
+
+        # El fragmento cacheado del primer estudiante no se comparte
+        self.client.force_login(other)
+        response = self.client.get(url, secure=True)
+        self.assertEqual(self.rendered_texts(response), self.texts(self.expected(other)[:40]))
+
+        self.client.force_login(self.admin)
+        response = self.client.get(url, secure=True)
+        self.assertEqual(self.rendered_texts(response), [f'Pregunta {i}' for i in range(40)])
+        self.assertIsNone(response.context['shuffle_seed'])
+
+    def test_attempt_uses_order_of_the_attempt(self):
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('exams:student_attempt_exam', args=[self.exam.id]), secure=True)
+        result = ExamResult.objects.get(exam=self.exam, student=self.student)
+        self.assertEqual(self.page_ids(response), self.expected(self.student, attempt=result.pk))
+
+
+class ImageVariantTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.exam = self.create_exam()
+
+    def create_image_question(self, **kwargs):
+        question = self.create_question(self.exam, 'Con imagen')
+        question.image = png_upload(**kwargs)
+        question.save()
+        return question
+
+    def test_build_variants(self):
+        storage = InMemoryStorage()
+        name = storage.save('questions/foto.png', png_upload(size=(1200, 600), mode='RGBA', color=(255, 0, 0, 128)))
+        variants = build_variants(storage, name)
+        self.assertEqual((variants['source'], variants['width'], variants['height']), (name, 1200, 600))
+        self.assertEqual(variants['thumb'], {'name': 'variants/questions/foto.thumb.webp', 'width': 160, 'height': 80})
+        self.assertEqual((variants['medium']['width'], variants['medium']['height']), (800, 400))
+        self.assertTrue(variants['placeholder'].startswith('data:image/webp;base64,'))
+        with storage.open(variants['medium']['name']) as medium:
+            image = Image.open(medium)
+            self.assertEqual((image.format, image.mode), ('WEBP', 'RGBA'))
+
+    def test_small_images_are_not_enlarged(self):
+        storage = InMemoryStorage()
+        variants = build_variants(storage, storage.save('a.png', png_upload(size=(100, 50))))
+        self.assertEqual((variants['medium']['width'], variants['thumb']['width']), (100, 100))
+
+    def test_new_image_queues_variants_once(self):
+        question = self.create_image_question()
+        jobs = Job.objects.filter(name='exams.image_variants', key=f'image_variants:exams.question:{question.pk}')
+        self.assertEqual(list(jobs.values_list('payload', flat=True)), [
+            {'model': 'exams.question', 'pk': question.pk, 'field': 'image', 'force': False},
+        ])
+        question.save()
+        self.assertEqual(jobs.count(), 1)
+
+    def test_task_stores_variants_and_bumps_revision(self):
+        question = self.create_image_question(size=(1000, 1000))
+        revision = Exam.objects.get(pk=self.exam.pk).content_revision
+        self.assertEqual(image_variants_task('exams.question', question.pk)['source'], question.image.name)
+        self.assertEqual(Exam.objects.get(pk=self.exam.pk).content_revision, revision + 1)
+        question.refresh_from_db()
+        self.assertEqual(question.image_variants['source'], question.image.name)
+        self.assertEqual(image_url(question, 'thumb'), question.image.storage.url(question.image_variants['thumb']['name']))
+        # Con las variantes al día no se regeneran
+        with mock.patch('exams.images.build_variants') as build:
+            self.assertEqual(generate_image_variants(Question, question.pk), question.image_variants)
+        build.assert_not_called()
+
+    def test_replaced_image_discards_old_variants(self):
+        question = self.create_image_question()
+        generate_image_variants(Question, question.pk)
+        question.refresh_from_db()
+        old = question.image_variants
+        storage = question.image.storage
+
+        question.image = png_upload('nueva.png')
+        question.save()
+        # Mientras no hay variantes nuevas se usa la original
+        self.assertEqual(image_url(question, 'thumb'), storage.url(question.image.name))
+        new = generate_image_variants(Question, question.pk)
+        self.assertEqual(new['source'], question.image.name)
+        self.assertFalse(storage.exists(old['thumb']['name']))
+        self.assertTrue(storage.exists(new['thumb']['name']))
+
+        question.refresh_from_db()
+        question.image = None
+        question.save()
+        self.assertIsNone(generate_image_variants(Question, question.pk))
+        self.assertFalse(storage.exists(new['medium']['name']))
+        self.assertEqual(Question.objects.get(pk=question.pk).image_variants, {})
+
+    def test_image_changed_during_generation(self):
+        question = self.create_image_question()
+        storage = question.image.storage
+        built = []
+
+        def build(storage, name):
+            variants = build_variants(storage, name)
+            built.append(variants)
+            Question.objects.filter(pk=question.pk).update(image='questions/otra.png')
+            return variants
+
+        with mock.patch('exams.images.build_variants', build):
+            self.assertIsNone(generate_image_variants(Question, question.pk))
+        self.assertEqual(Question.objects.get(pk=question.pk).image_variants, {})
+        self.assertFalse(storage.exists(built[0]['thumb']['name']))
+
+    def test_missing_objects(self):
+        self.assertIsNone(generate_image_variants(Question, 999999))
+        self.assertIsNone(generate_image_variants(Question, self.create_question(self.exam, 'Sin imagen').pk))
+
+    def test_command_queues_missing_variants(self):
+        question = self.create_image_question()
+        Job.objects.all().delete()
+        out = StringIO()
+        call_command('build_image_variants', stdout=out)
+        self.assertIn('1 imagen(es) encolada(s)', out.getvalue())
+        generate_image_variants(Question, question.pk)
+        Job.objects.all().delete()
+        call_command('build_image_variants', stdout=out)
+        self.assertIn('0 imagen(es) encolada(s)', out.getvalue())
+        call_command('build_image_variants', '--rebuild', stdout=out)
+        self.assertTrue(Job.objects.get().payload['force'])
+
+
+class CountingStorage(InMemoryStorage):
+    """Almacenamiento que cuenta las llamadas a url() y puede fallar"""
+
+    def __init__(self, fail=False):
+        super().__init__(base_url='/media/')
+        self.fail = fail
+        self.calls = 0
+
+    def url(self, name):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError('Sin conexión con el almacenamiento')
+        return super().url(name)
+
+
+class MediaURLCacheTests(TestCase):
+    def setUp(self):
+        clear_url_cache()
+        self.addCleanup(clear_url_cache)
+
+    def test_lru_eviction(self):
+        cache = URLCache(maxsize=2)
+        cache.set('a', 1, 60)
+        cache.set('b', 2, 60)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3, 60)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.get('a'), cache.get('c'), len(cache)), (1, 3, 2))
+        cache.delete('a')
+        self.assertIsNone(cache.get('a'))
+
+    def test_entries_expire(self):
+        cache = URLCache(maxsize=10)
+        with mock.patch('exams.media_urls.time.monotonic', return_value=100.0):
+            cache.set('a', 1, 5)
+        with mock.patch('exams.media_urls.time.monotonic', return_value=104.0):
+            self.assertEqual(cache.get('a'), 1)
+        with mock.patch('exams.media_urls.time.monotonic', return_value=105.0):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+    def test_storage_url_is_cached_per_variant(self):
+        storage = CountingStorage()
+        self.assertEqual(storage_url(storage, 'a.png'), '/media/a.png')
+        self.assertEqual(storage_url(storage, 'a.png'), '/media/a.png')
+        self.assertEqual(storage.calls, 1)
+        storage_url(storage, 'a.png', 'thumb')
+        self.assertEqual(storage.calls, 2)
+        forget_url(storage, 'a.png')
+        storage_url(storage, 'a.png')
+        self.assertEqual(storage.calls, 3)
+        self.assertIsNone(storage_url(storage, ''))
+
+    def test_failures_are_cached(self):
+        storage = CountingStorage(fail=True)
+        with self.assertLogs('exams.media_urls', 'WARNING'):
+            self.assertIsNone(storage_url(storage, 'rota.png'))
+        self.assertIsNone(storage_url(storage, 'rota.png'))
+        self.assertEqual(storage.calls, 1)
+
+        # Cuando vence la entrada negativa se vuelve a intentar
+        with override_settings(MEDIA_URL_NEGATIVE_TIMEOUT=0), self.assertLogs('exams.media_urls', 'WARNING'):
+            storage_url(storage, 'otra.png')
+        storage.fail = False
+        self.assertEqual(storage_url(storage, 'otra.png'), '/media/otra.png')
+
+
+class ResponsiveImageTests(TestCase):
+    def setUp(self):
+        clear_url_cache()
+        self.addCleanup(clear_url_cache)
+        self.storage = CountingStorage()
+        self.question = Question(question_text='Con imagen')
+        self.question.image = FieldFile(self.question, Question._meta.get_field('image'), 'questions/a.png')
+        self.question.image.storage = self.storage
+        self.question.image_variants = {
+            'source': 'questions/a.png', 'width': 1200, 'height': 900,
+            'thumb': {'name': 'variants/questions/a.thumb.webp', 'width': 160, 'height': 120},
+            'medium': {'name': 'variants/questions/a.medium.webp', 'width': 800, 'height': 600},
+            'placeholder': 'data:image/webp;base64,AAAA',
+        }
+
+    def attrs(self, html):
+        return dict(re.findall(r' ([\w-]+)="([^"]*)"', html))
+
+    def test_srcset_and_medium_for_modal(self):
+        attrs = self.attrs(responsive_image(self.question, '45px', class_name='thumbnail', alt='Imagen'))
+        self.assertEqual(attrs['srcset'], (
+            '/media/variants/questions/a.thumb.webp 160w, /media/variants/questions/a.medium.webp 800w'
+        ))
+        self.assertEqual((attrs['sizes'], attrs['width'], attrs['height']), ('45px', '800', '600'))
+        self.assertEqual(attrs['data-full'], '/media/variants/questions/a.medium.webp')
+        self.assertEqual((attrs['loading'], attrs['class-name']), ('lazy', 'thumbnail'))
+        self.assertIn('data:image/webp;base64,AAAA', attrs['style'])
+
+    def test_modal_uses_original_without_medium_variant(self):
+        del self.question.image_variants['medium']
+        attrs = self.attrs(responsive_image(self.question, '45px'))
+        self.assertEqual(attrs['src'], '/media/variants/questions/a.thumb.webp')
+        self.assertEqual(attrs['data-full'], '/media/questions/a.png')
+
+    def test_outdated_variants_use_original(self):
+        self.question.image_variants['source'] = 'questions/anterior.png'
+        attrs = self.attrs(responsive_image(self.question, '45px'))
+        self.assertEqual((attrs['src'], attrs['data-full']), ('/media/questions/a.png', '/media/questions/a.png'))
+        self.assertNotIn('srcset', attrs)
+        self.assertEqual(image_url(self.question, 'medium'), '/media/questions/a.png')
+
+    def test_storage_failure_renders_nothing(self):
+        self.storage.fail = True
+        self.question.image_variants = {}
+        with self.assertLogs('exams.media_urls', 'WARNING'):
+            self.assertEqual(responsive_image(self.question, '45px'), '')
+        self.assertEqual(image_url(self.question), '')
+        self.assertEqual(responsive_image(Question(), '45px'), '')
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.storage = ContentAddressedStorage(location=self.root, base_url='/media/')
+        self.factory = RequestFactory()
+
+    def serve(self, name, **headers):
+        with override_settings(MEDIA_ROOT=self.root):
+            return serve_media(self.factory.get(f'/media/{name}', **headers), name)
+
+    def test_name_is_content_hash(self):
+        digest = hashlib.sha256(b'contenido').hexdigest()
+        name = self.storage.save('questions/Foto.PNG', ContentFile(b'contenido'))
+        self.assertEqual(name, f'{digest[:2]}/{digest[2:4]}/{digest}.png')
+        self.assertTrue(CONTENT_NAME_RE.match(name))
+        with self.storage.open(name) as stored:
+            self.assertEqual(stored.read(), b'contenido')
+        self.assertFalse(os.listdir(os.path.join(self.root, '.tmp')))
+
+    def test_same_content_is_stored_once(self):
+        first = self.storage.save('a.png', ContentFile(b'igual'))
+        second = self.storage.save('otra/b.png', ContentFile(b'igual'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(self.storage.save('a.png', ContentFile(b'distinto')), first)
+        self.assertEqual(self.storage.save('sin-extension', ContentFile(b'igual')), first[:-4])
+        self.assertEqual(self.storage.save('a.tar gz', ContentFile(b'igual')), first[:-4])
+
+    def test_delete_keeps_shared_files(self):
+        name = self.storage.save('a.png', ContentFile(b'compartido'))
+        self.storage.delete(name)
+        self.assertTrue(self.storage.exists(name))
+
+    def test_serve_media_with_immutable_cache(self):
+        name = self.storage.save('a.png', ContentFile(b'imagen'))
+        response = self.serve(name)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'imagen')
+        self.assertEqual(response['ETag'], f'"{hashlib.sha256(b"imagen").hexdigest()}"')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        response.close()
+
+        response = self.serve(name, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_serve_media_rejects_unknown_names(self):
+        digest = 'a' * 64
+        for name in ('../settings.py', 'aa/aa/corto.png', f'aa/aa/{digest}.png'):
+            with self.subTest(name=name), self.assertRaises(Http404):
+                self.serve(name)
+        with override_settings(MEDIA_ROOT=self.root):
+            response = serve_media(self.factory.post(f'/media/aa/aa/{digest}'), f'aa/aa/{digest}')
+        self.assertEqual(response.status_code, 405)
+
+    def test_media_route_only_with_serve_media(self):
+        def media_routes(**settings):
+            with override_settings(MEDIA_STORAGE='local', **settings):
+                routes = [getattr(pattern, 'name', None) for pattern in importlib.reload(exam_system.urls).urlpatterns]
+            return routes.count('media')
+
+        self.addCleanup(clear_url_caches)
+        self.addCleanup(importlib.reload, exam_system.urls)
+        self.assertEqual(media_routes(SERVE_MEDIA=False), 0)
+        self.assertEqual(media_routes(SERVE_MEDIA=True), 1)
+
+    def test_exam_pdfs_go_to_private_storage(self):
+        private_root = os.path.join(self.root, 'private')
+        storages = {
+            'default': {'BACKEND': 'exams.storage.ContentAddressedStorage', 'OPTIONS': {'location': self.root}},
+            'private': {
+                'BACKEND': 'exams.storage.PrivateContentAddressedStorage', 'OPTIONS': {'location': private_root},
+            },
+        }
+        with override_settings(STORAGES=storages):
+            exam = Exam(title='Tema', subject='Materia')
+            exam.pdf_file.save('tema.pdf', ContentFile(PDF_CONTENT), save=False)
+            self.assertTrue(os.path.exists(os.path.join(private_root, exam.pdf_file.name)))
+            self.assertFalse(os.path.exists(os.path.join(self.root, exam.pdf_file.name)))
+            self.assertIsNone(exam.pdf_file.url)
+        # La ruta pública no encuentra el PDF
+        with self.assertRaises(Http404):
+            self.serve(exam.pdf_file.name)
+
+
+class RangeRequestTests(ExamTestCase):
+    CONTENT = bytes(range(256)) * 4
+
+    def setUp(self):
+        super().setUp()
+        self.exam = self.create_exam()
+        self.exam.pdf_file = SimpleUploadedFile('tema.pdf', self.CONTENT)
+        self.exam.save()
+        self.url = reverse('exams:student_pdf_file', args=[self.exam.id])
+        self.client.force_login(self.student)
+
+    def get(self, **headers):
+        return self.client.get(self.url, secure=True, **headers)
+
+    def test_parse_range(self):
+        cases = {
+            '': None, 'bytes=-': None, 'items=0-1': None, 'bytes=0-1,5-6': None,
+            'bytes=0-99': (0, 99), 'bytes = 10 - 19': (10, 19), 'bytes=900-': (900, 999),
+            'bytes=990-5000': (990, 999), 'bytes=-100': (900, 999), 'bytes=-5000': (0, 999),
+            'bytes=999-999': (999, 999),
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                self.assertEqual(parse_range(header, 1000), expected)
+        for header in ('bytes=1000-', 'bytes=50-10', 'bytes=-0'):
+            with self.subTest(header=header), self.assertRaises(RangeNotSatisfiable):
+                parse_range(header, 1000)
+
+    def test_empty_file_ranges_are_not_satisfiable(self):
+        for header in ('bytes=0-', 'bytes=0-0', 'bytes=-10'):
+            with self.subTest(header=header), self.assertRaises(RangeNotSatisfiable):
+                parse_range(header, 0)
+        self.assertIsNone(parse_range('', 0))
+
+    def test_full_file(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENT)
+        self.assertEqual((response['Content-Length'], response['Accept-Ranges']), ('1024', 'bytes'))
+        self.assertEqual(response['ETag'], file_etag(self.exam.pdf_file))
+        self.assertTrue(response['Cache-Control'].startswith('private, max-age='))
+
+    def test_partial_content(self):
+        response = self.get(HTTP_RANGE='bytes=100-299')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 100-299/1024')
+        self.assertEqual(response['Content-Length'], '200')
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENT[100:300])
+
+        response = self.get(HTTP_RANGE='bytes=-24')
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENT[-24:])
+
+        # Con If-Range de otra versión se entrega el archivo completo
+        response = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"otra"')
+        self.assertEqual((response.status_code, response['Content-Length']), (200, '1024'))
+
+    def test_not_satisfiable_and_not_modified(self):
+        response = self.get(HTTP_RANGE='bytes=2000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        response = self.client.head(self.url, secure=True, HTTP_RANGE='bytes=0-9')
+        self.assertEqual((response.status_code, response['Content-Length'], response.content), (206, '10', b''))
+
+    def test_empty_file(self):
+        self.exam.pdf_file = SimpleUploadedFile('vacio.pdf', b'')
+        self.exam.save()
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-').status_code, 416)
+        response = self.get()
+        self.assertEqual((response.status_code, response['Content-Length'], response.content), (200, '0', b''))
+
+    def test_access_checks(self):
+        CourseEnrollment.objects.filter(student=self.student).delete()
+        self.assertEqual(self.get().status_code, 403)
+        self.client.force_login(self.admin)
+        self.exam.pdf_file = None
+        self.exam.save()
+        self.assertEqual(self.get().status_code, 404)
+
+    def test_remote_file_is_read_by_range(self):
+        remote = mock.Mock(status_code=206)
+        remote.iter_content.return_value = [self.CONTENT[10:15], self.CONTENT[15:30]]
+        with mock.patch('exams.delivery._remote_url', return_value='https://cdn.example.com/tema.pdf'), \
+                mock.patch('exams.delivery.requests.get', return_value=remote) as get:
+            data = b''.join(iter_file_range(self.exam.pdf_file, 10, 19))
+        self.assertEqual(data, self.CONTENT[10:20])
+        self.assertEqual(get.call_args.kwargs['headers'], {'Range': 'bytes=10-19'})
+        remote.close.assert_called_once()
+
+        # Si el servidor ignora el rango se descartan los bytes anteriores
+        remote = mock.Mock(status_code=200)
+        remote.iter_content.return_value = [self.CONTENT[:8], self.CONTENT[8:64]]
+        with mock.patch('exams.delivery._remote_url', return_value='https://cdn.example.com/tema.pdf'), \
+                mock.patch('exams.delivery.requests.get', return_value=remote):
+            self.assertEqual(b''.join(iter_file_range(self.exam.pdf_file, 10, 19)), self.CONTENT[10:20])
+
+
+PDF_CONTENT = b'%PDF-1.4\n' + bytes(range(256)) + b'\n%%EOF\n'
+
+
+@override_settings(UPLOAD_CHUNK_SIZE=100, UPLOAD_MAX_PDF_SIZE=1000, UPLOAD_MAX_IMAGE_SIZE=500)
+class ChunkedUploadTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.exam = self.create_exam()
+        self.client.force_login(self.admin)
+
+    def upload(self, content=PDF_CONTENT, kind='pdf', filename='tema.pdf'):
+        session = start_upload(self.admin, kind, filename, len(content))
+        for index in range(session.chunk_count):
+            receive_chunk(session, index, content[index * 100:(index + 1) * 100])
+        return complete_upload(session)
+
+    def post_json(self, url, data):
+        return self.client.post(url, json.dumps(data), content_type='application/json', secure=True)
+
+    def test_sniff_content_type(self):
+        cases = {
+            b'%PDF-1.7': 'application/pdf', b'\x89PNG\r\n\x1a\n....': 'image/png', b'\xff\xd8\xff\xe0': 'image/jpeg',
+            b'GIF89a..': 'image/gif', b'RIFF\x00\x00\x00\x00WEBPVP8 ': 'image/webp',
+            b'RIFF\x00\x00\x00\x00WAVEfmt ': None, b'<html>': None, b'': None,
+        }
+        for data, content_type in cases.items():
+            with self.subTest(data=data):
+                self.assertEqual(sniff_content_type(data), content_type)
+
+    def test_start_upload_validates_declared_file(self):
+        cases = (
+            ('video', 'a.pdf', 10, 'Tipo de archivo'),
+            ('pdf', 'a.exe', 10, 'Formatos aceptados: PDF'),
+            ('image', 'a.pdf', 10, 'JPG, JPEG, PNG'),
+            ('pdf', 'a.pdf', 'x', 'Tamaño de archivo no válido'),
+            ('pdf', 'a.pdf', 0, 'vacío'),
+            ('pdf', 'a.pdf', 1001, 'no debe exceder'),
+            ('image', 'a.png', 501, 'no debe exceder'),
+        )
+        for kind, filename, size, message in cases:
+            with self.subTest(filename=filename, size=size), self.assertRaisesMessage(UploadError, message):
+                start_upload(self.admin, kind, filename, size)
+        self.assertFalse(UploadSession.objects.exists())
+
+        session = start_upload(self.admin, 'pdf', '../../Tema 1.PDF', 250)
+        self.assertEqual((session.filename, session.chunk_size, session.chunk_count), ('Tema 1.PDF', 100, 3))
+        job = Job.objects.get(name='exams.expire_upload')
+        self.assertEqual(job.payload, {'session_id': str(session.pk)})
+        self.assertGreater(job.run_at, timezone.now() + timedelta(hours=23))
+
+    def test_chunks_are_upserted(self):
+        session = start_upload(self.admin, 'pdf', 'tema.pdf', len(PDF_CONTENT))
+        receive_chunk(session, 1, b'x' * 100)
+        receive_chunk(session, 1, PDF_CONTENT[100:200])
+        receive_chunk(session, 0, PDF_CONTENT[:100])
+        self.assertEqual(received_chunks(session), [0, 1])
+        self.assertEqual(bytes(session.chunks.get(index=1).data), PDF_CONTENT[100:200])
+        session.refresh_from_db()
+        self.assertEqual(session.content_type, 'application/pdf')
+
+        for index, data, message in ((3, b'x', 'fuera de rango'), (-1, b'x', 'fuera de rango'),
+                                     (1, b'x' * 99, 'debe tener 100 bytes'), (2, b'x' * 100, 'debe tener 72 bytes')):
+            with self.subTest(index=index), self.assertRaisesMessage(UploadError, message):
+                receive_chunk(session, index, data)
+
+        with self.assertRaisesMessage(UploadError, 'Faltan 1 parte(s)'):
+            complete_upload(session)
+
+    def test_wrong_content_fails_upload(self):
+        session = start_upload(self.admin, 'pdf', 'tema.pdf', 150)
+        receive_chunk(session, 1, b'x' * 50)
+        png = png_upload().read()
+        with self.assertRaisesMessage(UploadError, 'no corresponde'):
+            receive_chunk(session, 0, png[:8].ljust(100, b'\0'))
+        session.refresh_from_db()
+        self.assertEqual(session.status, 'failed')
+        self.assertFalse(session.chunks.exists())
+        with self.assertRaisesMessage(UploadError, 'ya no admite'):
+            receive_chunk(session, 0, PDF_CONTENT[:100])
+        with self.assertRaisesMessage(UploadError, 'no se puede completar'):
+            complete_upload(session)
+
+    def test_attach_and_store_assembles_file(self):
+        session = self.upload()
+        self.assertEqual(complete_upload(session).status, 'complete')
+        response = self.client.post(reverse('exams:exam_edit', args=[self.exam.id]), {
+            'title': 'Tema', 'subject': 'Materia', 'pdf_file_upload': str(session.pk),
+        }, secure=True)
+        self.assertEqual(response.status_code, 302)
+        job = Job.objects.get(name='exams.store_upload')
+        self.assertEqual(job.payload, {'session_id': str(session.pk)})
+
+        with self.assertRaisesMessage(UploadError, 'ya se usó'):
+            attach_upload(self.admin, session.pk, self.exam, 'pdf_file', 'pdf')
+        with self.assertRaisesMessage(UploadError, 'no existe'):
+            attach_upload(self.admin, 'no-es-un-uuid', self.exam, 'pdf_file', 'pdf')
+        with self.assertRaisesMessage(UploadError, 'no existe'):
+            attach_upload(self.student, session.pk, self.exam, 'pdf_file', 'pdf')
+
+        name = store_upload(str(session.pk))
+        self.exam.refresh_from_db()
+        self.assertEqual(self.exam.pdf_file.name, name)
+        with self.exam.pdf_file.open('rb') as stored:
+            self.assertEqual(stored.read(), PDF_CONTENT)
+        session.refresh_from_db()
+        self.assertEqual((session.status, session.stored_name), ('stored', name))
+        self.assertFalse(session.chunks.exists())
+        # Repetir la tarea no hace nada
+        self.assertIsNone(store_upload(str(session.pk)))
+        self.assertFalse(expire_upload(str(session.pk)))
+
+    def test_store_rejects_incomplete_assembly(self):
+        session = self.upload()
+        attach_upload(self.admin, session.pk, self.exam, 'pdf_file', 'pdf')
+        session.chunks.filter(index=1).delete()
+        with self.assertRaisesMessage(UploadError, 'en lugar de 272'):
+            store_upload(str(session.pk))
+        self.assertEqual(UploadSession.objects.get(pk=session.pk).status, 'complete')
+
+    def test_failed_store_is_expired_after_last_attempt(self):
+        session = self.upload()
+        attach_upload(self.admin, session.pk, self.exam, 'pdf_file', 'pdf')
+        session.chunks.filter(index=1).delete()
+        job = Job.objects.get(name='exams.store_upload')
+        Job.objects.filter(pk=job.pk).update(max_attempts=2)
+
+        # Mientras el envío se reintenta la subida no se descarta
+        self.assertFalse(run_job(claim_job('w1')))
+        self.assertFalse(expire_upload(str(session.pk)))
+        self.assertEqual(Job.objects.filter(name='exams.expire_upload').count(), 2)
+        self.assertEqual(UploadSession.objects.get(pk=session.pk).status, 'complete')
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        self.assertFalse(run_job(claim_job('w1')))
+        self.assertEqual(Job.objects.get(pk=job.pk).status, 'failed')
+        self.assertTrue(expire_upload(str(session.pk)))
+        self.assertEqual(UploadSession.objects.get(pk=session.pk).status, 'failed')
+        self.assertFalse(UploadChunk.objects.exists())
+        self.assertIsNone(store_upload(str(session.pk)))
+
+    def test_store_for_deleted_target_expires_upload(self):
+        session = self.upload()
+        attach_upload(self.admin, session.pk, self.exam, 'pdf_file', 'pdf')
+        Exam.objects.filter(pk=self.exam.pk).delete()
+        self.assertIsNone(store_upload(str(session.pk)))
+        self.assertEqual(UploadSession.objects.get(pk=session.pk).status, 'expired')
+        self.assertFalse(UploadChunk.objects.exists())
+
+    def test_unfinished_upload_expires(self):
+        session = start_upload(self.admin, 'pdf', 'tema.pdf', len(PDF_CONTENT))
+        receive_chunk(session, 0, PDF_CONTENT[:100])
+        self.assertTrue(expire_upload(str(session.pk)))
+        self.assertEqual(UploadSession.objects.get(pk=session.pk).status, 'expired')
+        self.assertFalse(UploadChunk.objects.exists())
+
+    def test_upload_views(self):
+        response = self.post_json(reverse('exams:upload_start'), {
+            'kind': 'pdf', 'filename': 'tema.pdf', 'size': len(PDF_CONTENT),
+        })
+        data = response.json()
+        self.assertEqual((data['status'], data['chunks'], data['received']), ('uploading', 3, []))
+        upload_id = data['upload']
+
+        for index in range(3):
+            response = self.client.post(
+                reverse('exams:upload_chunk', args=[upload_id, index]), PDF_CONTENT[index * 100:(index + 1) * 100],
+                content_type='application/octet-stream', secure=True,
+            )
+            self.assertEqual(response.json(), {'success': True, 'index': index})
+        response = self.client.get(reverse('exams:upload_status', args=[upload_id]), secure=True)
+        self.assertEqual(response.json()['received'], [0, 1, 2])
+        response = self.client.post(reverse('exams:upload_complete', args=[upload_id]), secure=True)
+        self.assertEqual(response.json()['status'], 'complete')
+
+    def test_upload_view_errors(self):
+        self.assertEqual(self.post_json(reverse('exams:upload_start'), ['x']).status_code, 400)
+        response = self.post_json(reverse('exams:upload_start'), {'kind': 'pdf', 'filename': 'a.pdf', 'size': 5000})
+        self.assertEqual(response.status_code, 400)
+
+        session = start_upload(self.admin, 'pdf', 'tema.pdf', len(PDF_CONTENT))
+        url = reverse('exams:upload_chunk', args=[session.pk, 0])
+        response = self.client.post(url, b'x' * 101, content_type='application/octet-stream', secure=True)
+        self.assertEqual(response.status_code, 413)
+        response = self.client.post(url, b'x' * 100, content_type='application/octet-stream', secure=True)
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(reverse('exams:upload_complete', args=[session.pk]), secure=True)
+        self.assertEqual(response.status_code, 400)
+
+        other = User.objects.create_user(username='otro_admin', password='x', user_type='admin')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(reverse('exams:upload_status', args=[session.pk]), secure=True).status_code, 404)
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(reverse('exams:upload_status', args=[session.pk]), secure=True).status_code, 403)
+
+
+class PdfIndexTests(ExamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.exam = self.create_exam()
+
+    def attach_pdf(self, exam, *texts, name='tema.pdf'):
+        exam.pdf_file = SimpleUploadedFile(name, make_pdf(*texts), content_type='application/pdf')
+        exam.save()
+        return exam
+
+    def test_extract_pages(self):
+        pages = extract_pages(BytesIO(make_pdf('Hola   mundo', '', 'La fotosintesis en plantas')))
+        self.assertEqual(pages, ['Hola mundo', '', 'La fotosintesis en plantas'])
+
+    def test_new_pdf_queues_index_once(self):
+        self.attach_pdf(self.exam, 'Hola')
+        job = Job.objects.get(name='exams.index_pdf')
+        self.assertEqual(job.key, f'index_pdf:{self.exam.pk}')
+        self.assertEqual(job.payload, {'exam_id': self.exam.pk, 'force': False})
+        index_exam_pdf(self.exam.pk)
+        self.exam.refresh_from_db()
+        self.assertIsNone(queue_pdf_index(self.exam))
+        self.assertIsNotNone(queue_pdf_index(self.exam, force=True))
+
+    def test_index_replaces_pages(self):
+        self.attach_pdf(self.exam, 'Primera pagina', '', 'Tercera pagina')
+        index = index_exam_pdf(self.exam.pk)
+        self.assertEqual((index['pages'], index['changed']), (3, True))
+        self.assertEqual(index['sha256'], hashlib.sha256(make_pdf('Primera pagina', '', 'Tercera pagina')).hexdigest())
+        # Las páginas sin texto no se guardan
+        self.assertEqual(list(self.exam.pdf_pages.values_list('page', 'text')),
+                         [(1, 'Primera pagina'), (3, 'Tercera pagina')])
+
+        self.attach_pdf(self.exam, 'Nuevo contenido')
+        self.assertEqual(index_exam_pdf(self.exam.pk)['pages'], 1)
+        self.assertEqual(list(self.exam.pdf_pages.values_list('page', 'text')), [(1, 'Nuevo contenido')])
+
+    def test_same_content_is_not_extracted_again(self):
+        self.attach_pdf(self.exam, 'Hola mundo')
+        index_exam_pdf(self.exam.pk)
+        self.attach_pdf(self.exam, 'Hola mundo', name='copia.pdf')
+        with mock.patch('exams.pdf_index.extract_pages') as extract:
+            index = index_exam_pdf(self.exam.pk)
+        extract.assert_not_called()
+        self.exam.refresh_from_db()
+        self.assertEqual((index['changed'], self.exam.pdf_index['source']), (False, self.exam.pdf_file.name))
+        self.assertEqual(self.exam.pdf_pages.count(), 1)
+
+        with mock.patch('exams.pdf_index.extract_pages', return_value=['Hola mundo']) as extract:
+            self.assertTrue(index_exam_pdf(self.exam.pk, force=True)['changed'])
+        extract.assert_called_once()
+
+    def test_removed_pdf_clears_pages(self):
+        self.attach_pdf(self.exam, 'Hola')
+        index_exam_pdf(self.exam.pk)
+        self.exam.pdf_file = None
+        self.exam.save()
+        self.assertEqual(index_exam_pdf(self.exam.pk), {})
+        self.assertFalse(ExamPdfPage.objects.exists())
+        self.assertIsNone(index_exam_pdf(0))
+
+    def test_pdf_snippet(self):
+        self.assertEqual(_fold('Fotosíntesis Ñandú'), 'fotosintesis nandu')
+        self.assertEqual(pdf_snippet('La  fotosíntesis ocurre', 'FOTOSINTESIS'),
+                         [('La ', False), ('fotosíntesis', True), (' ocurre', False)])
+        text = 'uno dos tres cuatro cinco seis siete ocho nueve diez'
+        self.assertEqual(pdf_snippet(text, 'cinco', radius=10),
+                         [('… ', False), ('cuatro ', False), ('cinco', True), (' seis', False), (' …', False)])
+        # Sin coincidencias muestra el principio del texto
+        self.assertEqual(pdf_snippet(text, 'x', radius=7), [('uno dos', False), (' …', False)])
+
+    def test_search_pdf_pages(self):
+        other = self.create_exam(title='Otro')
+        ExamPdfPage.objects.bulk_create([
+            ExamPdfPage(exam=self.exam, page=2, text='Celula animal'),
+            ExamPdfPage(exam=self.exam, page=1, text='La celula vegetal'),
+            ExamPdfPage(exam=other, page=1, text='Sin coincidencias'),
+        ])
+        pages = search_pdf_pages(ExamPdfPage.objects.all(), ' celula ')
+        self.assertEqual([(page.exam_id, page.page) for page in pages], [(self.exam.id, 1), (self.exam.id, 2)])
+        self.assertFalse(search_pdf_pages(ExamPdfPage.objects.all(), '  ').exists())
+
+    def test_course_search_view(self):
+        hidden = self.create_exam(title='Oculto', is_active=False)
+        ExamPdfPage.objects.create(exam=self.exam, page=4, text='Las mitocondrias producen energia')
+        ExamPdfPage.objects.create(exam=hidden, page=1, text='Mitocondrias ocultas')
+        url = reverse('exams:student_course_search', args=[self.course.id])
+
+        self.client.force_login(self.student)
+        response = self.client.get(url, {'q': 'mitocondrias'}, secure=True)
+        self.assertEqual([(result.exam_id, result.page) for result in response.context['results']], [(self.exam.id, 4)])
+        self.assertContains(response, '<mark>mitocondrias</mark>')
+        self.assertEqual(self.client.get(url, secure=True).context['results'], [])
+
+        self.client.force_login(self.create_student('ajeno'))
+        CourseEnrollment.objects.filter(student__username='ajeno').delete()
+        self.assertRedirects(self.client.get(url, {'q': 'mitocondrias'}, secure=True),
+                             reverse('accounts:dashboard'), fetch_redirect_response=False)
+
+    def test_index_pdfs_command(self):
+        self.attach_pdf(self.exam, 'Hola')
+        index_exam_pdf(self.exam.pk)
+        pending = self.attach_pdf(self.create_exam(title='Pendiente'), 'Adios')
+        self.create_exam(title='Sin PDF')
+        Job.objects.all().delete()
+
+        out = StringIO()
+        call_command('index_pdfs', stdout=out)
+        self.assertIn('1 PDF(s) encolado(s)', out.getvalue())
+        self.assertEqual(list(Job.objects.values_list('key', flat=True)), [f'index_pdf:{pending.pk}'])
+
+        call_command('index_pdfs', '--rebuild', stdout=out)
+        self.assertEqual(Job.objects.count(), 2)
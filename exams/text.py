@@ -0,0 +1,12 @@
+"""
+Normalización de textos compartida por la calificación y la detección de
+duplicados: sin distinguir mayúsculas, acentos ni espacios repetidos.
+"""
+import unicodedata
+
+
+def normalize_text(text):
+    """Normaliza un texto para compararlo con otros"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(text.lower().split()).strip('.,;:¡!¿?')
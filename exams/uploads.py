@@ -0,0 +1,240 @@
+"""
+Subidas por partes (reanudables) de PDF e imágenes de los temas.
+
+El navegador inicia la subida declarando tipo, nombre y tamaño (un archivo
+más grande que el máximo se rechaza antes de enviar ningún byte) y luego envía
+partes de ``UPLOAD_CHUNK_SIZE`` bytes, cada una en su petición. Las partes se
+guardan en la base de datos (``UploadChunk``) con un upsert, así que repetir
+una parte tras un corte de red es inofensivo y la subida se puede reanudar
+consultando qué partes ya llegaron. La web y el worker no comparten disco en
+Render; la base de datos sí.
+
+El tipo real del archivo se detecta por los primeros bytes de la parte 0
+(``%PDF-``, PNG, JPEG, GIF, WebP); si no coincide con el declarado la subida
+se marca como fallida.
+
+Al guardar el formulario la subida completa se asigna al campo del tema y la
+tarea ``exams.store_upload`` arma el archivo y lo envía al almacenamiento
+(Cloudinary) fuera de la petición. Las subidas sin terminar se descartan tras
+``UPLOAD_SESSION_TTL_HOURS`` (tarea ``exams.expire_upload``). La misma tarea
+marca como fallidas las subidas asignadas cuyo envío falló definitivamente
+(la tarea ``exams.store_upload`` agotó sus intentos) y borra sus partes; si el
+envío sigue pendiente se vuelve a revisar tras otro plazo igual.
+"""
+import os
+import tempfile
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .jobs import enqueue
+from .models import Job, UploadChunk, UploadSession
+
+EXTENSIONS = {
+    'pdf': ('pdf',),
+    'image': ('jpg', 'jpeg', 'png', 'gif', 'webp'),
+}
+CONTENT_TYPES = {
+    'pdf': ('application/pdf',),
+    'image': ('image/png', 'image/jpeg', 'image/gif', 'image/webp'),
+}
+# Firmas (magic bytes) de los formatos aceptados
+SIGNATURES = (
+    (b'%PDF-', 'application/pdf'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+)
+ASSEMBLE_BATCH_SIZE = 4
+
+
+class UploadError(ValueError):
+    pass
+
+
+def _store_key(session_id):
+    return f'store_upload:{session_id}'
+
+
+def _enqueue_expiry(session_id):
+    enqueue(
+        'exams.expire_upload',
+        run_at=timezone.now() + timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS),
+        session_id=str(session_id),
+    )
+
+
+def max_upload_size(kind):
+    return settings.UPLOAD_MAX_PDF_SIZE if kind == 'pdf' else settings.UPLOAD_MAX_IMAGE_SIZE
+
+
+def sniff_content_type(data):
+    """Tipo de contenido según los primeros bytes, o None si no es un formato aceptado"""
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    for signature, content_type in SIGNATURES:
+        if data.startswith(signature):
+            return content_type
+    return None
+
+
+def start_upload(user, kind, filename, size):
+    """Crea la sesión de subida tras validar tipo, extensión y tamaño declarados"""
+    if kind not in EXTENSIONS:
+        raise UploadError('Tipo de archivo no válido.')
+    filename = os.path.basename(str(filename or '')).strip()[:UploadSession._meta.get_field('filename').max_length]
+    extension = os.path.splitext(filename)[1].lower().lstrip('.')
+    if extension not in EXTENSIONS[kind]:
+        raise UploadError(f'Formatos aceptados: {", ".join(EXTENSIONS[kind]).upper()}.')
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError('Tamaño de archivo no válido.')
+    if size <= 0:
+        raise UploadError('El archivo está vacío.')
+    limit = max_upload_size(kind)
+    if size > limit:
+        raise UploadError(
+            f'El archivo no debe exceder {limit / (1024 * 1024):.0f}MB. '
+            f'Tamaño actual: {size / (1024 * 1024):.2f}MB'
+        )
+
+    with transaction.atomic():
+        session = UploadSession.objects.create(
+            kind=kind, filename=filename, size=size,
+            chunk_size=settings.UPLOAD_CHUNK_SIZE, created_by=user,
+        )
+        _enqueue_expiry(session.pk)
+    return session
+
+
+def expected_chunk_length(session, index):
+    return min(session.chunk_size, session.size - index * session.chunk_size)
+
+
+def receive_chunk(session, index, data):
+    """Guarda (o reemplaza) una parte de la subida"""
+    if session.status != 'uploading':
+        raise UploadError('La subida ya no admite partes.')
+    if not 0 <= index < session.chunk_count:
+        raise UploadError('Número de parte fuera de rango.')
+    if len(data) != expected_chunk_length(session, index):
+        raise UploadError(f'La parte {index} debe tener {expected_chunk_length(session, index)} bytes.')
+
+    if index == 0:
+        content_type = sniff_content_type(data)
+        if content_type not in CONTENT_TYPES[session.kind]:
+            UploadSession.objects.filter(pk=session.pk).update(status='failed', updated_at=timezone.now())
+            UploadChunk.objects.filter(session=session).delete()
+            raise UploadError('El contenido del archivo no corresponde a un PDF o una imagen válida.')
+        UploadSession.objects.filter(pk=session.pk).update(content_type=content_type, updated_at=timezone.now())
+
+    UploadChunk.objects.bulk_create(
+        [UploadChunk(session=session, index=index, data=data)],
+        update_conflicts=True,
+        unique_fields=['session', 'index'],
+        update_fields=['data'],
+    )
+
+
+def received_chunks(session):
+    return list(session.chunks.order_by('index').values_list('index', flat=True))
+
+
+def complete_upload(session):
+    """Marca la subida como completa si llegaron todas las partes"""
+    if session.status == 'complete':
+        return session
+    if session.status != 'uploading':
+        raise UploadError('La subida no se puede completar.')
+    missing = session.chunk_count - session.chunks.count()
+    if missing:
+        raise UploadError(f'Faltan {missing} parte(s) por subir.')
+    completed = UploadSession.objects.filter(pk=session.pk, status='uploading').exclude(content_type='').update(
+        status='complete', updated_at=timezone.now()
+    )
+    if not completed:
+        raise UploadError('La subida no se puede completar.')
+    session.status = 'complete'
+    return session
+
+
+def attach_upload(user, upload_id, instance, field, kind):
+    """
+    Asigna una subida completa al campo del objeto y encola su envío al
+    almacenamiento. Devuelve la sesión, o None si ``upload_id`` está vacío.
+    """
+    if not upload_id:
+        return None
+    try:
+        session = UploadSession.objects.get(pk=upload_id, created_by=user, kind=kind)
+    except (UploadSession.DoesNotExist, ValidationError):
+        raise UploadError('La subida no existe.')
+    updated = UploadSession.objects.filter(pk=session.pk, status='complete', target_model='').update(
+        target_model=instance._meta.label_lower, target_id=instance.pk,
+        target_field=field, updated_at=timezone.now(),
+    )
+    if not updated:
+        raise UploadError('La subida no está completa o ya se usó.')
+    enqueue('exams.store_upload', key=_store_key(session.pk), created_by=user, session_id=str(session.pk))
+    return session
+
+
+def store_upload(session_id):
+    """Arma el archivo con sus partes, lo guarda en el almacenamiento y lo asigna al objeto"""
+    session = UploadSession.objects.filter(pk=session_id, status='complete').first()
+    if session is None or not session.target_model:
+        return None
+    model = apps.get_model(session.target_model)
+    instance = model.objects.filter(pk=session.target_id).first()
+    if instance is None:
+        UploadSession.objects.filter(pk=session.pk).update(status='expired', updated_at=timezone.now())
+        UploadChunk.objects.filter(session=session).delete()
+        return None
+
+    with tempfile.TemporaryFile() as temp:
+        chunks = session.chunks.order_by('index').values_list('data', flat=True)
+        for data in chunks.iterator(chunk_size=ASSEMBLE_BATCH_SIZE):
+            temp.write(data)
+        if temp.tell() != session.size:
+            raise UploadError(f'El archivo armado tiene {temp.tell()} bytes en lugar de {session.size}.')
+        temp.seek(0)
+        file = getattr(instance, session.target_field)
+        file.save(session.filename, File(temp, name=session.filename), save=False)
+
+    instance.save(update_fields=[session.target_field, 'updated_at'])
+    with transaction.atomic():
+        UploadSession.objects.filter(pk=session.pk).update(
+            status='stored', stored_name=file.name, updated_at=timezone.now()
+        )
+        UploadChunk.objects.filter(session=session).delete()
+    return file.name
+
+
+def expire_upload(session_id):
+    """
+    Descarta una subida que no se terminó ni se asignó a tiempo, o que se
+    asignó pero no se pudo guardar. Devuelve True si se descartó.
+    """
+    with transaction.atomic():
+        expired = UploadSession.objects.filter(
+            pk=session_id, status__in=['uploading', 'complete'], target_model=''
+        ).update(status='expired', updated_at=timezone.now())
+        if not expired:
+            attached = UploadSession.objects.filter(pk=session_id, status='complete').exclude(target_model='')
+            if not attached.exists():
+                return False
+            # El envío todavía se está reintentando: se revisa de nuevo más tarde
+            if Job.objects.filter(key=_store_key(session_id), status__in=['queued', 'running']).exists():
+                _enqueue_expiry(session_id)
+                return False
+            expired = attached.update(status='failed', updated_at=timezone.now())
+        if expired:
+            UploadChunk.objects.filter(session_id=session_id).delete()
+    return bool(expired)
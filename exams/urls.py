@@ -9,22 +9,38 @@ urlpatterns = [
     path('courses/create/', views.course_create, name='course_create'),
     path('courses/<int:pk>/edit/', views.course_edit, name='course_edit'),
     path('courses/<int:pk>/delete/', views.course_delete, name='course_delete'),
+    path('courses/<int:pk>/export/', views.course_export, name='course_export'),
+    path('courses/<int:pk>/duplicates/', views.course_duplicates, name='course_duplicates'),
 
     # Exámenes
     path('courses/<int:course_id>/exams/', views.exam_list, name='exam_list'),
     path('courses/<int:course_id>/exams/create/', views.exam_create, name='exam_create'),
     path('exams/<int:pk>/edit/', views.exam_edit, name='exam_edit'),
     path('exams/<int:pk>/delete/', views.exam_delete, name='exam_delete'),
+    path('uploads/', views.upload_start, name='upload_start'),
+    path('uploads/<uuid:upload_id>/', views.upload_status, name='upload_status'),
+    path('uploads/<uuid:upload_id>/chunks/<int:index>/', views.upload_chunk, name='upload_chunk'),
+    path('uploads/<uuid:upload_id>/complete/', views.upload_complete, name='upload_complete'),
+    path('exams/<int:pk>/export/', views.exam_export, name='exam_export'),
 
     # Preguntas y Respuestas
     path('exams/<int:exam_id>/questions/', views.question_manage, name='question_manage'),
     path('exams/<int:exam_id>/questions/create/', views.question_create, name='question_create'),
+    path('exams/<int:exam_id>/analysis/refresh/', views.exam_analysis_refresh, name='exam_analysis_refresh'),
+    path('exams/<int:exam_id>/questions/batch/', views.question_batch_create, name='question_batch_create'),
+    path('exams/<int:exam_id>/questions/reorder/', views.question_reorder, name='question_reorder'),
+    path('exams/<int:exam_id>/questions/import/', views.question_import, name='question_import'),
     path('questions/<int:pk>/edit/', views.question_edit, name='question_edit'),
     path('questions/<int:pk>/delete/', views.question_delete, name='question_delete'),
 
     # Vistas de Estudiantes
     path('student/course/<int:course_id>/exams/', views.student_course_exams, name='student_course_exams'),
+    path('student/course/<int:course_id>/search/', views.student_course_search, name='student_course_search'),
     path('student/exam/<int:exam_id>/take/', views.student_take_exam, name='student_take_exam'),
+    path('student/exam/<int:exam_id>/snapshot/<int:revision>.json', views.student_exam_snapshot, name='student_exam_snapshot'),
+    path('student/exam/<int:exam_id>/attempt/', views.student_attempt_exam, name='student_attempt_exam'),
+    path('student/result/<int:exam_result_id>/autosave/', views.student_autosave_answers, name='student_autosave_answers'),
     path('student/exam/<int:exam_id>/pdf/', views.student_view_pdf, name='student_view_pdf'),
+    path('student/exam/<int:exam_id>/pdf/file/', views.student_pdf_file, name='student_pdf_file'),
     path('student/result/<int:exam_result_id>/', views.student_exam_result, name='student_exam_result'),
 ]
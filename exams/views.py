@@ -1,9 +1,41 @@
+import functools
+import gzip
+import hashlib
+import json
+import time
+
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from .models import Course, Exam, Question, Answer
-from django.http import JsonResponse
-from django.db import models
+from django.conf import settings
+from django.core.cache import caches
+from .models import Course, Exam, ExamAnalysis, ExamPdfPage, ExamResult, Question, Answer, UploadSession
+from .attempts import (
+    AttemptClosed, clean_deltas, remaining_seconds, save_answers, saved_answers, submit_attempt,
+)
+from .conditional import (
+    conditional_page, course_exams_etag, course_exams_last_modified,
+    take_exam_etag, take_exam_last_modified,
+)
+from .delivery import file_version, ranged_file_response
+from .duplicates import THRESHOLD as DUPLICATE_THRESHOLD, duplicate_groups, find_similar, find_similar_many
+from .exporters import CONTENT_TYPES as EXPORT_CONTENT_TYPES, EXPORT_FORMATS, stream_export
+from .importers import ImportFormatError, QuestionImporter, clean_row, detect_format, read_rows, store_image
+from .jobs import enqueue
+from .ordering import next_question_order, reorder_questions
+from .pagination import KeysetPaginator
+from .search import SEARCH_ORDERING, pdf_snippet, search_pdf_pages, search_questions
+from .shuffle import SHUFFLE_ORDERING, seed_data, shuffle_seed, shuffled
+from .signals import exam_content_changed
+from .snapshots import get_snapshot
+from .uploads import UploadError, attach_upload, complete_upload, receive_chunk, received_chunks, start_upload
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils import timezone
+from django.db import models, transaction
+from django.views.decorators.clickjacking import xframe_options_sameorigin
+from django.views.decorators.http import require_POST, require_safe
 from django_ratelimit.decorators import ratelimit
 
 
@@ -14,7 +46,7 @@ def course_list(request):
         messages.error(request, 'No tienes permisos para acceder a esta página.')
         return redirect('accounts:dashboard')
 
-    courses = Course.objects.all()
+    courses = Course.objects.not_deleted()
     context = {'courses': courses}
     return render(request, 'exams/course_list.html', context)
 
@@ -48,7 +80,7 @@ def course_edit(request, pk):
         messages.error(request, 'No tienes permisos para acceder a esta página.')
         return redirect('accounts:dashboard')
 
-    course = get_object_or_404(Course, pk=pk)
+    course = get_object_or_404(Course.objects.not_deleted(), pk=pk)
 
     if request.method == 'POST':
         course.name = request.POST.get('name')
@@ -69,13 +101,53 @@ def course_delete(request, pk):
         messages.error(request, 'No tienes permisos para realizar esta acción.')
         return redirect('accounts:dashboard')
 
-    course = get_object_or_404(Course, pk=pk)
+    course = get_object_or_404(Course.objects.not_deleted(), pk=pk)
     course_name = course.name
-    course.delete()
-    messages.success(request, f'Curso "{course_name}" eliminado exitosamente.')
+    # El borrado en cascada (temas, preguntas, resultados) se hace en segundo
+    # plano; mientras tanto el curso queda marcado (deleted_at) y deja de
+    # aparecer. Se actualizan las fechas y revisiones para invalidar los ETag
+    # de las páginas
+    with transaction.atomic():
+        Course.objects.filter(pk=course.pk).update(deleted_at=timezone.now(), updated_at=timezone.now())
+        exam_ids = list(course.exams.values_list('pk', flat=True))
+        Exam.objects.filter(pk__in=exam_ids).update(updated_at=timezone.now())
+        exam_content_changed(exam_ids)
+        enqueue('exams.delete_course', key=f'delete_course:{course.pk}', created_by=request.user, course_id=course.pk)
+    messages.success(request, f'Curso "{course_name}" eliminado. El contenido se borrará en segundo plano.')
     return redirect('exams:course_list')
 
 
+MAX_DUPLICATE_GROUPS = 100
+
+
+@login_required
+def course_duplicates(request, pk):
+    """Vista para el reporte de preguntas casi duplicadas de un curso"""
+    if not request.user.is_admin():
+        messages.error(request, 'No tienes permisos para acceder a esta página.')
+        return redirect('accounts:dashboard')
+
+    course = get_object_or_404(Course.objects.not_deleted(), pk=pk)
+    questions = Question.objects.filter(exam__course=course, exam__deleted_at__isnull=True)
+    # Las preguntas sin firma (anteriores al índice) se indexan en segundo plano
+    pending = questions.filter(signature__isnull=True).count()
+    if pending:
+        enqueue('exams.index_duplicates', key=f'index_duplicates:{course.pk}', created_by=request.user,
+                course_id=course.pk)
+    started = time.monotonic()
+    groups = duplicate_groups(questions, limit=MAX_DUPLICATE_GROUPS)
+    context = {
+        'course': course,
+        'groups': groups,
+        'pending': pending,
+        'max_groups': MAX_DUPLICATE_GROUPS,
+        'threshold': DUPLICATE_THRESHOLD * 100,
+        'total_questions': questions.count(),
+        'elapsed': time.monotonic() - started,
+    }
+    return render(request, 'exams/course_duplicates.html', context)
+
+
 # ============ EXAM VIEWS ============
 @login_required
 def exam_list(request, course_id):
@@ -83,8 +155,8 @@ def exam_list(request, course_id):
         messages.error(request, 'No tienes permisos para acceder a esta página.')
         return redirect('accounts:dashboard')
 
-    course = get_object_or_404(Course, pk=course_id)
-    exams = course.exams.all()
+    course = get_object_or_404(Course.objects.not_deleted(), pk=course_id)
+    exams = course.exams.filter(deleted_at__isnull=True)
     context = {'course': course, 'exams': exams}
     return render(request, 'exams/exam_list.html', context)
 
@@ -95,7 +167,7 @@ def exam_create(request, course_id):
         messages.error(request, 'No tienes permisos para acceder a esta página.')
         return redirect('accounts:dashboard')
 
-    course = get_object_or_404(Course, pk=course_id)
+    course = get_object_or_404(Course.objects.not_deleted(), pk=course_id)
 
     if request.method == 'POST':
         title = request.POST.get('title')
@@ -119,12 +191,14 @@ def exam_create(request, course_id):
             passing_marks=passing_marks,
             duration_minutes=duration_minutes,
             exam_date=exam_date,
+            shuffle_questions=request.POST.get('shuffle_questions') == '1',
             created_by=request.user
         )
+        _attach_uploads(request, exam)
         messages.success(request, f'Tema "{exam.title}" creado exitosamente.')
         return redirect('exams:question_manage', exam_id=exam.id)
 
-    context = {'course': course}
+    context = {'course': course, 'upload_max_pdf_mb': settings.UPLOAD_MAX_PDF_SIZE // (1024 * 1024)}
     return render(request, 'exams/exam_form.html', context)
 
 
@@ -134,7 +208,7 @@ def exam_edit(request, pk):
         messages.error(request, 'No tienes permisos para acceder a esta página.')
         return redirect('accounts:dashboard')
 
-    exam = get_object_or_404(Exam, pk=pk)
+    exam = get_object_or_404(Exam.objects.not_deleted(), pk=pk)
 
     if request.method == 'POST':
         exam.title = request.POST.get('title')
@@ -148,11 +222,17 @@ def exam_edit(request, pk):
         exam.passing_marks = request.POST.get('passing_marks')
         exam.duration_minutes = request.POST.get('duration_minutes')
         exam.exam_date = request.POST.get('exam_date')
+        exam.shuffle_questions = request.POST.get('shuffle_questions') == '1'
         exam.save()
+        _attach_uploads(request, exam)
         messages.success(request, f'Tema "{exam.title}" actualizado exitosamente.')
         return redirect('exams:exam_list', course_id=exam.course.id)
 
-    context = {'exam': exam, 'course': exam.course}
+    context = {
+        'exam': exam,
+        'course': exam.course,
+        'upload_max_pdf_mb': settings.UPLOAD_MAX_PDF_SIZE // (1024 * 1024),
+    }
     return render(request, 'exams/exam_form.html', context)
 
 
@@ -162,64 +242,187 @@ def exam_delete(request, pk):
         messages.error(request, 'No tienes permisos para realizar esta acción.')
         return redirect('accounts:dashboard')
 
-    exam = get_object_or_404(Exam, pk=pk)
-    course_id = exam.course.id
+    exam = get_object_or_404(Exam.objects.not_deleted(), pk=pk)
+    course_id = exam.course_id
     exam_title = exam.title
-    exam.delete()
-    messages.success(request, f'Examen "{exam_title}" eliminado exitosamente.')
+    with transaction.atomic():
+        Exam.objects.filter(pk=exam.pk).update(deleted_at=timezone.now(), updated_at=timezone.now())
+        exam_content_changed([exam.pk])
+        enqueue('exams.delete_exam', key=f'delete_exam:{exam.pk}', created_by=request.user, exam_id=exam.pk)
+    messages.success(request, f'Examen "{exam_title}" eliminado. Las preguntas se borrarán en segundo plano.')
     return redirect('exams:exam_list', course_id=course_id)
 
 
+# ============ CHUNKED UPLOAD VIEWS ============
+# Campos del tema que se pueden subir por partes: campo -> tipo de subida
+EXAM_UPLOAD_FIELDS = {'image': 'image', 'pdf_file': 'pdf'}
+
+
+def _attach_uploads(request, exam):
+    """Asigna al tema las subidas por partes indicadas en el formulario"""
+    for field, kind in EXAM_UPLOAD_FIELDS.items():
+        try:
+            session = attach_upload(request.user, request.POST.get(f'{field}_upload'), exam, field, kind)
+        except UploadError as e:
+            messages.error(request, f'No se pudo usar el archivo subido: {e}')
+            continue
+        if session is not None:
+            messages.info(request, f'El archivo "{session.filename}" se está guardando en segundo plano.')
+
+
+def _upload_data(session):
+    return {
+        'success': True,
+        'upload': str(session.pk),
+        'status': session.status,
+        'chunk_size': session.chunk_size,
+        'chunks': session.chunk_count,
+        'received': received_chunks(session),
+        'attached': bool(session.target_model),
+    }
+
+
+@login_required
+@require_POST
+@ratelimit(key='user', rate='100/h', method='POST', block=True)
+def upload_start(request):
+    """Vista para iniciar una subida por partes (tipo, nombre y tamaño en JSON)"""
+    if not request.user.is_admin():
+        return JsonResponse({'success': False, 'error': 'No autorizado'}, status=403)
+
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return JsonResponse({'success': False, 'error': 'JSON inválido.'}, status=400)
+
+    try:
+        session = start_upload(request.user, data.get('kind'), data.get('filename'), data.get('size'))
+    except UploadError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    return JsonResponse(_upload_data(session))
+
+
+@login_required
+def upload_status(request, upload_id):
+    """Vista con el estado de una subida y las partes recibidas (para reanudarla)"""
+    if not request.user.is_admin():
+        return JsonResponse({'success': False, 'error': 'No autorizado'}, status=403)
+
+    session = get_object_or_404(UploadSession, pk=upload_id, created_by=request.user)
+    return JsonResponse(_upload_data(session))
+
+
+@login_required
+@require_POST
+@ratelimit(key='user', rate='6000/h', method='POST', block=True)
+def upload_chunk(request, upload_id, index):
+    """Vista para recibir una parte de la subida (cuerpo binario)"""
+    if not request.user.is_admin():
+        return JsonResponse({'success': False, 'error': 'No autorizado'}, status=403)
+
+    session = get_object_or_404(UploadSession, pk=upload_id, created_by=request.user)
+    # Se rechaza antes de leer el cuerpo si declara más bytes que una parte
+    try:
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        length = 0
+    if length > session.chunk_size:
+        return JsonResponse({'success': False, 'error': 'La parte es demasiado grande.'}, status=413)
+
+    try:
+        receive_chunk(session, index, request.body)
+    except UploadError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    return JsonResponse({'success': True, 'index': index})
+
+
+@login_required
+@require_POST
+def upload_complete(request, upload_id):
+    """Vista para cerrar una subida cuando llegaron todas las partes"""
+    if not request.user.is_admin():
+        return JsonResponse({'success': False, 'error': 'No autorizado'}, status=403)
+
+    session = get_object_or_404(UploadSession, pk=upload_id, created_by=request.user)
+    try:
+        complete_upload(session)
+    except UploadError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    return JsonResponse(_upload_data(session))
+
+
 # ============ QUESTION VIEWS ============
+QUESTION_ORDERINGS = {
+    '-id': ('-id',),
+    'id': ('id',),
+    'order': ('order', 'id'),
+}
+
+
+def _warn_duplicates(request, question):
+    """Avisa si la pregunta recién creada se parece a otras del curso"""
+    similar = find_similar(question)
+    if similar:
+        listed = '; '.join(f'#{other.id} de "{other.exam.title}" ({score:.0%})' for other, score in similar)
+        messages.warning(request, f'La pregunta se parece a otras del curso: {listed}.')
+
+
 @login_required
 @ratelimit(key='user', rate='100/h', method='POST', block=True)
 def question_manage(request, exam_id):
-    from django.core.paginator import Paginator
-
     if not request.user.is_admin():
         messages.error(request, 'No tienes permisos para acceder a esta página.')
         return redirect('accounts:dashboard')
 
-    exam = get_object_or_404(Exam, pk=exam_id)
+    exam = get_object_or_404(Exam.objects.not_deleted(), pk=exam_id)
 
     # Obtener parámetro de ordenamiento (por defecto: más reciente primero)
-    order_by = request.GET.get('order', '-id')  # -id = descendente, id = ascendente
+    # -id = descendente, id = ascendente, order = orden del tema (permite arrastrar)
+    order_by = request.GET.get('order', '-id')
+    if order_by not in QUESTION_ORDERINGS:
+        order_by = '-id'
 
-    # Obtener preguntas con ordenamiento
-    questions = exam.questions.all().prefetch_related('answers').order_by(order_by)
+    # Obtener preguntas (con su análisis de ítems, si existe)
+    questions = exam.questions.with_answers().select_related('analysis')
 
-    # Paginación - 40 preguntas por página
-    paginator = Paginator(questions, 40)
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
+    # Paginación por cursor - 40 preguntas por página
+    paginator = KeysetPaginator(questions, 40, ordering=QUESTION_ORDERINGS[order_by], count=exam.question_count)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
 
     if request.method == 'POST':
         question_text = request.POST.get('question_text')
         image = request.FILES.get('image')
         explanation = request.POST.get('explanation')
         answer_text = request.POST.get('answer_text')
-
-        # Crear pregunta
-        question = Question.objects.create(
-            exam=exam,
-            question_text=question_text,
-            image=image,
-            question_type='multiple_choice',
-            marks=1.0,
-            explanation=explanation,
-            order=exam.questions.count() + 1
-        )
-
-        # Crear la respuesta única
-        if answer_text:
-            Answer.objects.create(
-                question=question,
-                answer_text=answer_text,
-                is_correct=True,
-                order=1
+        # La imagen se sube antes de bloquear el tema para asignar el orden
+        if image:
+            image = store_image(image)
+
+        with transaction.atomic():
+            # Crear pregunta al final del tema
+            question = Question.objects.create(
+                exam=exam,
+                question_text=question_text,
+                image=image,
+                question_type='multiple_choice',
+                marks=1.0,
+                explanation=explanation,
+                order=next_question_order(exam)
             )
 
+            # Crear la respuesta única
+            if answer_text:
+                Answer.objects.create(
+                    question=question,
+                    answer_text=answer_text,
+                    is_correct=True,
+                    order=1
+                )
+
         messages.success(request, 'Pregunta creada exitosamente.')
+        _warn_duplicates(request, question)
         # Redirigir manteniendo el ordenamiento
         redirect_url = f"{request.path}?order={order_by}"
         return redirect(redirect_url)
@@ -229,7 +432,9 @@ def question_manage(request, exam_id):
         'questions': page_obj,
         'page_obj': page_obj,
         'order_by': order_by,
-        'total_questions': questions.count(),
+        'total_questions': exam.question_count,
+        'max_batch_questions': MAX_BATCH_QUESTIONS,
+        'exam_analysis': ExamAnalysis.objects.filter(exam=exam).first(),
     }
     return render(request, 'exams/question_manage.html', context)
 
@@ -240,48 +445,249 @@ def question_create(request, exam_id):
         messages.error(request, 'No tienes permisos para acceder a esta página.')
         return redirect('accounts:dashboard')
 
-    exam = get_object_or_404(Exam, pk=exam_id)
+    exam = get_object_or_404(Exam.objects.not_deleted(), pk=exam_id)
 
     if request.method == 'POST':
         question_text = request.POST.get('question_text')
         image = request.FILES.get('image')
         explanation = request.POST.get('explanation')
         answer_text = request.POST.get('answer_text')
-
-        # Crear pregunta
-        question = Question.objects.create(
-            exam=exam,
-            question_text=question_text,
-            image=image,
-            question_type='multiple_choice',
-            marks=1.0,
-            explanation=explanation,
-            order=exam.questions.count() + 1
-        )
-
-        # Crear la respuesta única
-        if answer_text:
-            Answer.objects.create(
-                question=question,
-                answer_text=answer_text,
-                is_correct=True,
-                order=1
+        # La imagen se sube antes de bloquear el tema para asignar el orden
+        if image:
+            image = store_image(image)
+
+        with transaction.atomic():
+            # Crear pregunta al final del tema
+            question = Question.objects.create(
+                exam=exam,
+                question_text=question_text,
+                image=image,
+                question_type='multiple_choice',
+                marks=1.0,
+                explanation=explanation,
+                order=next_question_order(exam)
             )
 
+            # Crear la respuesta única
+            if answer_text:
+                Answer.objects.create(
+                    question=question,
+                    answer_text=answer_text,
+                    is_correct=True,
+                    order=1
+                )
+
         messages.success(request, 'Pregunta creada exitosamente.')
+        _warn_duplicates(request, question)
         return redirect('exams:question_manage', exam_id=exam.id)
 
     context = {'exam': exam}
     return render(request, 'exams/question_form.html', context)
 
 
+@login_required
+@require_POST
+@ratelimit(key='user', rate='30/h', method='POST', block=True)
+def exam_analysis_refresh(request, exam_id):
+    """Vista para recalcular el análisis de ítems (dificultad y discriminación) de un tema"""
+    if not request.user.is_admin():
+        messages.error(request, 'No tienes permisos para realizar esta acción.')
+        return redirect('accounts:dashboard')
+
+    exam = get_object_or_404(Exam.objects.not_deleted(), pk=exam_id)
+    enqueue('exams.analyze_exam', key=f'analyze_exam:{exam.pk}', created_by=request.user, exam_id=exam.pk)
+    messages.info(request, 'El análisis se está recalculando en segundo plano; recarga la página en unos minutos.')
+    return redirect('exams:question_manage', exam_id=exam.id)
+
+
+MAX_BATCH_QUESTIONS = 50
+
+
+def _batch_rows(request):
+    """Genera (número_de_fila, dict) con las filas no vacías del formulario por lotes"""
+    question_texts = request.POST.getlist('question_text')
+    answer_texts = request.POST.getlist('answer_text')
+    explanations = request.POST.getlist('explanation')
+    for index, question_text in enumerate(question_texts):
+        row = {
+            'question_text': question_text,
+            'answer_text': answer_texts[index] if index < len(answer_texts) else '',
+            'explanation': explanations[index] if index < len(explanations) else '',
+            'image': request.FILES.get(f'image-{index}'),
+        }
+        if any(row.values()):
+            yield index + 1, row
+
+
+@login_required
+@require_POST
+@ratelimit(key='user', rate='100/h', method='POST', block=True)
+def question_batch_create(request, exam_id):
+    """Vista para crear varias preguntas en una sola petición (todas o ninguna)"""
+    if not request.user.is_admin():
+        return JsonResponse({'success': False, 'error': 'No autorizado'}, status=403)
+
+    exam = get_object_or_404(Exam.objects.not_deleted(), pk=exam_id)
+    rows = list(_batch_rows(request))
+    if not rows:
+        return JsonResponse({'success': False, 'error': 'Agrega al menos una pregunta.'}, status=400)
+    if len(rows) > MAX_BATCH_QUESTIONS:
+        return JsonResponse({
+            'success': False,
+            'error': f'No se pueden crear más de {MAX_BATCH_QUESTIONS} preguntas a la vez.'
+        }, status=400)
+
+    # Si alguna fila es inválida no se guarda ninguna
+    errors = []
+    for line_number, row in rows:
+        try:
+            clean_row(row)
+        except ValueError as e:
+            errors.append({'row': line_number, 'error': str(e)})
+    if errors:
+        return JsonResponse({'success': False, 'errors': errors}, status=400)
+
+    # Las imágenes se suben antes de bloquear el tema para asignar el orden
+    for line_number, row in rows:
+        if row['image']:
+            row['image'] = store_image(row['image'])
+
+    with transaction.atomic():
+        report = QuestionImporter(exam, batch_size=MAX_BATCH_QUESTIONS).run(rows)
+        questions = list(exam.questions.with_answers().select_related('analysis').order_by('-order', '-id')[:report.created])
+
+    html = ''.join(
+        render_to_string('partials/question_row.html', {
+            'question': question,
+            'exam': exam,
+            'order_by': request.POST.get('order_by', '-id'),
+        }, request=request)
+        for question in questions
+    )
+    similar = find_similar_many(questions)
+    duplicates = [
+        {'question': question.id, 'similar': [other.id for other, _ in similar[question.id]]}
+        for question in questions if similar.get(question.id)
+    ]
+    return JsonResponse({
+        'success': True,
+        'created': report.created,
+        'total_questions': Exam.objects.values_list('question_count', flat=True).get(pk=exam.pk),
+        'html': html,
+        'duplicates': duplicates,
+    })
+
+
+@login_required
+@require_POST
+@ratelimit(key='user', rate='300/h', method='POST', block=True)
+def question_reorder(request, exam_id):
+    """Vista para guardar el nuevo orden de las preguntas (arrastrar y soltar)"""
+    if not request.user.is_admin():
+        return JsonResponse({'success': False, 'error': 'No autorizado'}, status=403)
+
+    exam = get_object_or_404(Exam.objects.not_deleted(), pk=exam_id)
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'JSON inválido.'}, status=400)
+
+    try:
+        question_ids = data.get('question_ids')
+        if not isinstance(question_ids, list) or not question_ids:
+            raise ValueError('Debes enviar la lista "question_ids".')
+        updated = reorder_questions(exam, question_ids)
+    except (TypeError, ValueError, AttributeError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    return JsonResponse({'success': True, 'updated': updated})
+
+
+@login_required
+@ratelimit(key='user', rate='30/h', method='POST', block=True)
+def question_import(request, exam_id):
+    """Vista para importar preguntas masivamente desde un archivo"""
+    if not request.user.is_admin():
+        messages.error(request, 'No tienes permisos para acceder a esta página.')
+        return redirect('accounts:dashboard')
+
+    exam = get_object_or_404(Exam.objects.not_deleted(), pk=exam_id)
+    report = None
+
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        dry_run = request.POST.get('dry_run') == '1'
+
+        if not upload:
+            messages.error(request, 'Selecciona un archivo para importar.')
+        else:
+            try:
+                file_format = detect_format(upload.name)
+                report = QuestionImporter(exam, dry_run=dry_run).run(read_rows(upload, file_format))
+            except ImportFormatError as e:
+                messages.error(request, str(e))
+            else:
+                if report.created:
+                    messages.success(request, f'{report.created} preguntas importadas exitosamente.')
+
+    context = {
+        'exam': exam,
+        'report': report,
+        'errors': report.errors[:200] if report else [],
+    }
+    return render(request, 'exams/question_import.html', context)
+
+
+def _export_response(questions, file_format, filename, include_exam=False):
+    response = StreamingHttpResponse(
+        stream_export(questions, file_format, include_exam=include_exam),
+        content_type=EXPORT_CONTENT_TYPES[file_format]
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{file_format}"'
+    return response
+
+
+@login_required
+def exam_export(request, pk):
+    """Vista para descargar el banco de preguntas de un tema (CSV o JSONL)"""
+    if not request.user.is_admin():
+        messages.error(request, 'No tienes permisos para realizar esta acción.')
+        return redirect('accounts:dashboard')
+
+    exam = get_object_or_404(Exam.objects.not_deleted(), pk=pk)
+    file_format = request.GET.get('format', 'csv')
+    if file_format not in EXPORT_FORMATS:
+        file_format = 'csv'
+
+    questions = Question.objects.filter(exam=exam)
+    return _export_response(questions, file_format, f'tema-{exam.id}-preguntas')
+
+
+@login_required
+def course_export(request, pk):
+    """Vista para descargar el banco de preguntas de todos los temas de un curso"""
+    if not request.user.is_admin():
+        messages.error(request, 'No tienes permisos para realizar esta acción.')
+        return redirect('accounts:dashboard')
+
+    course = get_object_or_404(Course.objects.not_deleted(), pk=pk)
+    file_format = request.GET.get('format', 'csv')
+    if file_format not in EXPORT_FORMATS:
+        file_format = 'csv'
+
+    questions = Question.objects.filter(exam__course=course, exam__deleted_at__isnull=True)
+    return _export_response(questions, file_format, f'curso-{course.id}-preguntas', include_exam=True)
+
+
 @login_required
 def question_edit(request, pk):
     if not request.user.is_admin():
         messages.error(request, 'No tienes permisos para acceder a esta página.')
         return redirect('accounts:dashboard')
 
-    question = get_object_or_404(Question, pk=pk)
+    question = get_object_or_404(
+        Question, pk=pk, exam__deleted_at__isnull=True, exam__course__deleted_at__isnull=True
+    )
     exam = question.exam
 
     if request.method == 'POST':
@@ -300,7 +706,7 @@ def question_edit(request, pk):
         # Actualizar o crear la respuesta
         answer_text = request.POST.get('answer_text')
         if answer_text:
-            answer = question.answers.first()
+            answer = question.primary_answer
             if answer:
                 answer.answer_text = answer_text
                 answer.save()
@@ -316,7 +722,7 @@ def question_edit(request, pk):
         return redirect('exams:question_manage', exam_id=exam.id)
 
     # Obtener la respuesta existente
-    answer = question.answers.first()
+    answer = question.primary_answer
     context = {
         'exam': exam,
         'question': question,
@@ -331,7 +737,9 @@ def question_delete(request, pk):
         messages.error(request, 'No tienes permisos para realizar esta acción.')
         return redirect('accounts:dashboard')
 
-    question = get_object_or_404(Question, pk=pk)
+    question = get_object_or_404(
+        Question, pk=pk, exam__deleted_at__isnull=True, exam__course__deleted_at__isnull=True
+    )
     exam_id = question.exam.id
     question.delete()
     messages.success(request, 'Pregunta eliminada exitosamente.')
@@ -340,9 +748,10 @@ def question_delete(request, pk):
 
 # ============ STUDENT VIEWS ============
 @login_required
+@conditional_page(course_exams_etag, course_exams_last_modified)
 def student_course_exams(request, course_id):
     from .models import CourseEnrollment
-    course = get_object_or_404(Course, pk=course_id)
+    course = get_object_or_404(Course.objects.active(), pk=course_id)
 
     # Verificar que el estudiante esté inscrito en el curso
     if request.user.is_student():
@@ -351,17 +760,46 @@ def student_course_exams(request, course_id):
             messages.error(request, 'No estás inscrito en este curso.')
             return redirect('accounts:dashboard')
 
-    exams = course.exams.filter(is_active=True)
+    exams = course.exams.active()
     context = {'course': course, 'exams': exams}
     return render(request, 'exams/student_exams.html', context)
 
 
+PDF_SEARCH_MAX_RESULTS = 50
+
+
 @login_required
-def student_take_exam(request, exam_id):
-    from django.core.paginator import Paginator
-    from django.db.models import Q
+def student_course_search(request, course_id):
+    """Vista para buscar en el texto de los PDF de los temas de un curso"""
+    from .models import CourseEnrollment
+    course = get_object_or_404(Course.objects.active(), pk=course_id)
+
+    if request.user.is_student():
+        if not CourseEnrollment.objects.filter(course=course, student=request.user).exists():
+            messages.error(request, 'No estás inscrito en este curso.')
+            return redirect('accounts:dashboard')
 
-    exam = get_object_or_404(Exam, pk=exam_id, is_active=True)
+    query = request.GET.get('q', '').strip()[:200]
+    results = []
+    if query:
+        pages = ExamPdfPage.objects.filter(exam__in=course.exams.active()).select_related('exam')
+        results = list(search_pdf_pages(pages, query)[:PDF_SEARCH_MAX_RESULTS])
+        for result in results:
+            result.snippet = pdf_snippet(result.text, query)
+
+    context = {
+        'course': course,
+        'query': query,
+        'results': results,
+        'max_results': PDF_SEARCH_MAX_RESULTS,
+    }
+    return render(request, 'exams/student_course_search.html', context)
+
+
+@login_required
+@conditional_page(take_exam_etag, take_exam_last_modified)
+def student_take_exam(request, exam_id):
+    exam = get_object_or_404(Exam.objects.active(), pk=exam_id)
 
     # Verificar inscripción
     if request.user.is_student():
@@ -371,33 +809,184 @@ def student_take_exam(request, exam_id):
             messages.error(request, 'No estás inscrito en este curso.')
             return redirect('accounts:dashboard')
 
-    # Obtener todas las preguntas y respuestas
-    questions = exam.questions.all().prefetch_related('answers').order_by('order')
+    # Obtener todas las preguntas y respuestas (en el orden propio del
+    # estudiante si el tema lo tiene activado)
+    questions = exam.questions.with_answers()
+    ordering = ('order', 'id')
+    total = exam.question_count
+    seed = None
+    if exam.shuffle_questions and request.user.is_student():
+        seed = shuffle_seed(request.user.pk, exam.pk)
+        questions = shuffled(questions, seed)
+        ordering = SHUFFLE_ORDERING
+
+    fragment_cache = caches[settings.EXAM_FRAGMENT_CACHE]
 
-    # Búsqueda
+    # Búsqueda (texto completo en pregunta, respuesta y explicación)
     search_query = request.GET.get('search', '').strip()
     if search_query:
-        # Buscar solo por texto de pregunta
-        questions = questions.filter(question_text__icontains=search_query)
+        questions = search_questions(questions, search_query)
+        ordering = SEARCH_ORDERING
+        # El total de la búsqueda se cachea por revisión del contenido
+        count_key = 'exam_search_count:{}:{}:{}'.format(
+            exam.id, exam.content_revision, hashlib.md5(search_query.encode()).hexdigest()
+        )
+        total = functools.partial(
+            fragment_cache.get_or_set, count_key, questions.count, settings.EXAM_FRAGMENT_CACHE_TIMEOUT
+        )
 
-    # Paginación - 40 preguntas por página
-    paginator = Paginator(questions, 40)
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
+    # Paginación por cursor - 40 preguntas por página (se evalúa solo si el
+    # fragmento no está en caché)
+    cursor = request.GET.get('cursor', '')
+    paginator = KeysetPaginator(questions, 40, ordering=ordering, count=total)
+    page_obj = paginator.get_page(cursor)
 
     context = {
         'exam': exam,
         'questions': page_obj,
         'page_obj': page_obj,
+        'cursor': cursor,
         'search_query': search_query,
-        'total_questions': questions.count(),
+        'total_questions': page_obj.count,
+        'fragment_cache': settings.EXAM_FRAGMENT_CACHE,
+        'fragment_cache_timeout': settings.EXAM_FRAGMENT_CACHE_TIMEOUT,
+        # El fragmento cacheado depende del orden del estudiante
+        'shuffle_cache_key': '{}.{}.{}.{}'.format(*seed) if seed else '',
+        'shuffle_seed': seed_data(seed) if seed else None,
     }
     return render(request, 'exams/student_view_exam.html', context)
 
 
+@login_required
+def student_exam_snapshot(request, exam_id, revision):
+    """Vista para descargar el snapshot JSON (gzip) de todas las preguntas de un tema"""
+    exam = get_object_or_404(Exam.objects.active(), pk=exam_id)
+
+    if request.user.is_student():
+        from .models import CourseEnrollment
+        if not CourseEnrollment.objects.filter(course=exam.course, student=request.user).exists():
+            return JsonResponse({'error': 'No autorizado'}, status=403)
+
+    # Una revisión antigua redirige a la actual (las URLs versionadas son inmutables)
+    if revision != exam.content_revision:
+        return redirect('exams:student_exam_snapshot', exam_id=exam.id, revision=exam.content_revision)
+
+    data = get_snapshot(exam)
+    if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+        response = HttpResponse(data, content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(gzip.decompress(data), content_type='application/json')
+    patch_vary_headers(response, ('Accept-Encoding',))
+    patch_cache_control(
+        response,
+        max_age=settings.EXAM_SNAPSHOT_MAX_AGE,
+        immutable=True,
+        **({'public': True} if settings.EXAM_SNAPSHOT_PUBLIC else {'private': True})
+    )
+    return response
+
+
+def _posted_deltas(request):
+    """Convierte los campos del formulario del examen en deltas de respuestas"""
+    items = {}
+    for key, value in request.POST.items():
+        field, _, question_id = key.partition('_')
+        if field not in ('question', 'text') or not question_id.isdigit():
+            continue
+        item = items.setdefault(question_id, {'question': question_id})
+        item['answer' if field == 'question' else 'text'] = value
+    return list(items.values())
+
+
+@login_required
+def student_attempt_exam(request, exam_id):
+    """Vista para rendir un tema como examen (con guardado automático)"""
+    if not request.user.is_student():
+        messages.error(request, 'Solo los estudiantes pueden rendir exámenes.')
+        return redirect('accounts:dashboard')
+
+    from .models import CourseEnrollment
+    exam = get_object_or_404(Exam.objects.active().select_related('course'), pk=exam_id)
+    if not CourseEnrollment.objects.filter(course=exam.course, student=request.user).exists():
+        messages.error(request, 'No estás inscrito en este curso.')
+        return redirect('accounts:dashboard')
+
+    exam_result, _ = ExamResult.objects.get_or_create(exam=exam, student=request.user)
+    exam_result.exam = exam
+    if exam_result.status != 'pending':
+        messages.info(request, 'Ya enviaste este examen.')
+        return redirect('exams:student_course_exams', course_id=exam.course_id)
+
+    if request.method == 'POST':
+        try:
+            deltas = _posted_deltas(request)
+            submit_attempt(exam_result, clean_deltas(exam, deltas) if deltas else None)
+        except ValueError as e:
+            messages.error(request, f'No se pudo enviar el examen: {e}')
+            return redirect('exams:student_attempt_exam', exam_id=exam.id)
+        except AttemptClosed as e:
+            messages.info(request, str(e))
+        else:
+            messages.success(request, 'Examen enviado correctamente.')
+        return redirect('exams:student_course_exams', course_id=exam.course_id)
+
+    saved = saved_answers(exam_result)
+    questions = exam.questions.with_answers()
+    ordering = ('order', 'id')
+    if exam.shuffle_questions:
+        # Cada intento tiene su propio orden
+        questions = shuffled(questions, shuffle_seed(request.user.pk, exam.pk, exam_result.pk))
+        ordering = SHUFFLE_ORDERING
+    questions = list(questions.order_by(*ordering))
+    for question in questions:
+        question.saved_answer_id, question.saved_text = saved.get(question.id, (None, None))
+
+    context = {
+        'exam': exam,
+        'exam_result': exam_result,
+        'questions': questions,
+        'remaining_seconds': remaining_seconds(exam_result),
+    }
+    return render(request, 'exams/student_take_exam.html', context)
+
+
+@login_required
+@require_POST
+@ratelimit(key='user', rate='1200/h', method='POST', block=True)
+def student_autosave_answers(request, exam_result_id):
+    """Vista para guardar automáticamente un lote de respuestas del examen"""
+    if not request.user.is_student():
+        return JsonResponse({'success': False, 'error': 'No autorizado'}, status=403)
+
+    exam_result = get_object_or_404(
+        ExamResult.objects.select_related('exam'), pk=exam_result_id, student=request.user,
+        exam__is_active=True, exam__deleted_at__isnull=True,
+        exam__course__is_active=True, exam__course__deleted_at__isnull=True,
+    )
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'JSON inválido.'}, status=400)
+
+    try:
+        deltas = clean_deltas(exam_result.exam, data.get('answers'))
+        saved = save_answers(exam_result, deltas)
+    except (ValueError, AttributeError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    except AttemptClosed as e:
+        return JsonResponse({'success': False, 'error': str(e), 'closed': True}, status=409)
+
+    return JsonResponse({
+        'success': True,
+        'saved': saved,
+        'remaining_seconds': remaining_seconds(exam_result),
+    })
+
+
 @login_required
 def student_exam_result(request, exam_result_id):
-    exam_result = get_object_or_404(ExamResult, pk=exam_result_id, student=request.user)
+    exam_result = get_object_or_404(ExamResult.objects.with_scores(), pk=exam_result_id, student=request.user)
     student_answers = exam_result.student_answers.all().select_related('question', 'selected_answer')
 
     context = {
@@ -409,7 +998,7 @@ def student_exam_result(request, exam_result_id):
 
 @login_required
 def student_view_pdf(request, exam_id):
-    exam = get_object_or_404(Exam, pk=exam_id, is_active=True)
+    exam = get_object_or_404(Exam.objects.active(), pk=exam_id)
 
     # Verificar inscripción
     if request.user.is_student():
@@ -424,7 +1013,33 @@ def student_view_pdf(request, exam_id):
         messages.error(request, 'Este tema no tiene un archivo PDF disponible.')
         return redirect('exams:student_take_exam', exam_id=exam.id)
 
+    # Página inicial (enlaces desde la búsqueda en el curso)
+    try:
+        page = max(int(request.GET.get('page', '')), 1)
+    except ValueError:
+        page = None
+
     context = {
         'exam': exam,
+        'pdf_version': file_version(exam.pdf_file),
+        'page': page,
     }
     return render(request, 'exams/student_view_pdf.html', context)
+
+
+@login_required
+@require_safe
+@xframe_options_sameorigin
+def student_pdf_file(request, exam_id):
+    """Vista para entregar el PDF del tema por rangos (lo pide el visor de student_view_pdf)"""
+    exam = get_object_or_404(Exam.objects.active(), pk=exam_id)
+
+    if request.user.is_student():
+        from .models import CourseEnrollment
+        if not CourseEnrollment.objects.filter(course_id=exam.course_id, student=request.user).exists():
+            return HttpResponseForbidden('No estás inscrito en este curso.')
+
+    if not exam.pdf_file:
+        raise Http404('Este tema no tiene un archivo PDF disponible.')
+
+    return ranged_file_response(request, exam.pdf_file, 'application/pdf', settings.PDF_CACHE_MAX_AGE)